@@ -0,0 +1,133 @@
+"""
+Runs `process` against the same synthetic database with each SQLite profile (--db-profile).
+
+The database holds `repos` repositories with `workflows` downloaded workflows each, every workflow having a few jobs
+and steps full of expressions so the variable extraction has something to do.
+
+As `process` already batches its commits, a second run measures the cost of small transactions on their own (one
+commit per write, like the download phase with --db-debug-auto-commit).
+
+    python -m benchmarks.bench_db_profile [repos] [workflows] [threads] [transactions]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+from src.commands.process.process import ServiceProcess
+from src.database.database import Database
+from src.libs.components.org import OrgComponent
+from src.libs.components.repo import RepoComponent
+from src.libs.components.workflow import WorkflowComponent
+from src.libs.constants import DatabaseProfile, GitHubRefType, RepoStatus, RepoVisibility, WorkflowStatus
+from src.libs.utils import Utils
+
+
+def _workflow_data(index: int) -> dict:
+    steps = [
+        {'name': 'Checkout', 'uses': 'actions/checkout@v4', 'with': {'ref': '${{ github.ref }}'}},
+        {'name': 'Build', 'run': 'make build VERSION=${{ inputs.version }}', 'env': {'TOKEN': '${{ secrets.TOKEN }}'}},
+        {'name': 'Test', 'run': 'make test', 'env': {'MATRIX_OS': '${{ matrix.os }}', 'LEVEL': 'debug'}},
+        {'name': 'Upload', 'uses': 'actions/upload-artifact@v4', 'with': {'name': 'build-${{ github.sha }}', 'path': 'dist/'}},
+    ]
+    jobs = {
+        f"job-{job}": {
+            'name': f"Job {job}",
+            'runs-on': '${{ matrix.os }}',
+            'permissions': {'contents': 'read'},
+            'env': {'NAME': f"workflow-{index}", 'REGISTRY': '${{ vars.REGISTRY }}'},
+            'strategy': {'matrix': {'os': ['ubuntu-latest', 'windows-latest']}},
+            'steps': steps
+        }
+        for job in range(3)
+    }
+    return {
+        'name': f"Workflow {index}",
+        'on': {'push': {'branches': ['main']}, 'workflow_dispatch': {'inputs': {'version': {'required': True}}}},
+        'env': {'GLOBAL': '${{ vars.GLOBAL }}'},
+        'jobs': jobs
+    }
+
+
+def build_database(db_file: str, repos: int, workflows: int) -> None:
+    database = Database(db_file)
+    org = database.orgs().create(OrgComponent('bench'))
+    for repo_index in range(repos):
+        repo = RepoComponent(f"bench/repo-{repo_index}")
+        repo.org.id = org.id
+        repo.visibility = RepoVisibility.PUBLIC
+        repo.ref_type = GitHubRefType.BRANCH
+        repo.commit = 'abcdef'
+        repo.status = RepoStatus.OK
+        repo.id = database.repos().create(repo).id
+
+        for workflow_index in range(workflows):
+            workflow = WorkflowComponent(f"bench/repo-{repo_index}/.github/workflows/workflow-{workflow_index}.yml")
+            workflow.repo = repo
+            workflow.data = _workflow_data(workflow_index)
+            workflow.contents = ''
+            workflow.status = WorkflowStatus.DOWNLOADED
+            database.workflows().create(workflow)
+        database.commit()
+    database.close()
+
+
+def run(db_file: str, profile: DatabaseProfile, threads: int) -> float:
+    database = Database(db_file, profile=profile)
+    log = Utils.init_logger(False, False)
+    log.remove()
+    service = ServiceProcess(log, database)
+    service.threads = threads
+
+    start = time.perf_counter()
+    service.run()
+    database.commit()
+    elapsed = time.perf_counter() - start
+
+    database.close()
+    return elapsed
+
+
+def run_transactions(db_file: str, profile: DatabaseProfile, count: int) -> float:
+    database = Database(db_file, profile=profile)
+
+    start = time.perf_counter()
+    for index in range(count):
+        database.workflows().set_data(1, 'env', {'NAME': f"value-{index}"})
+        database.commit()
+    elapsed = time.perf_counter() - start
+
+    database.close()
+    return elapsed
+
+
+def _remove(db_file: str) -> None:
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.isfile(db_file + suffix):
+            os.remove(db_file + suffix)
+
+
+if __name__ == '__main__':
+    repos = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workflows = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    transactions = int(sys.argv[4]) if len(sys.argv) > 4 else 2000
+
+    template = os.path.join(tempfile.gettempdir(), 'butler-bench-profile-template.db')
+    if os.path.isfile(template):
+        os.remove(template)
+    build_database(template, repos, workflows)
+
+    print(f"repos={repos} workflows={repos * workflows} threads={threads}")
+    for profile in [DatabaseProfile.SAFE, DatabaseProfile.FAST]:
+        db_file = os.path.join(tempfile.gettempdir(), f"butler-bench-profile-{profile.name.lower()}.db")
+        shutil.copyfile(template, db_file)
+        elapsed = run(db_file, profile, threads)
+        print(f"process       {profile.name.lower():6} {elapsed:8.2f}s {repos * workflows / elapsed:8.1f} workflows/sec")
+        _remove(db_file)
+
+        shutil.copyfile(template, db_file)
+        elapsed = run_transactions(db_file, profile, transactions)
+        print(f"transactions  {profile.name.lower():6} {elapsed:8.2f}s {transactions / elapsed:8.1f} commits/sec")
+        _remove(db_file)
+    os.remove(template)
@@ -0,0 +1,96 @@
+"""
+Lock contention of the old "global lock around every database call" pattern against the DatabaseWriter thread.
+
+Each item simulates a network call (sleep) followed by a few data inserts for a workflow.
+
+    python -m benchmarks.bench_db_writer [items] [threads] [latency_ms]
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+import concurrent.futures
+from src.database.database import Database
+from src.database.writer import DatabaseWriter
+from src.libs.utils import Utils
+
+
+class TimedLock:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.waited = 0.0
+        self.acquisitions = 0
+        self.contended = 0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        if not self._lock.acquire(blocking=False):
+            self._lock.acquire()
+            with self._stats_lock:
+                self.contended += 1
+        with self._stats_lock:
+            self.waited += time.perf_counter() - start
+            self.acquisitions += 1
+
+    def __exit__(self, *args):
+        self._lock.release()
+
+
+def _write(database: Database, id: int) -> None:
+    database.workflows().set_data(id, 'env', {'NAME': '${{ secrets.TOKEN }}', 'OTHER': 'value'})
+    database.workflows().set_data(id, 'on', 'push')
+    database.workflows().set_data(id, 'permissions', {'contents': 'read'})
+
+
+def run_lock(database: Database, items: int, threads: int, latency: float) -> dict:
+    lock = TimedLock()
+
+    def worker(id: int) -> None:
+        time.sleep(latency)
+        with lock:
+            _write(database, id)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        for batch in Utils.split_list(range(1, items + 1), threads):
+            list(executor.map(worker, batch))
+            with lock:
+                database.commit()
+    elapsed = time.perf_counter() - start
+    return {'elapsed': elapsed, 'waited': lock.waited, 'contended': lock.contended, 'acquisitions': lock.acquisitions}
+
+
+def run_writer(database: Database, items: int, threads: int, latency: float) -> dict:
+    with DatabaseWriter(database, Utils.init_logger(False, False)) as writer:
+        def worker(id: int) -> None:
+            time.sleep(latency)
+            writer.submit(_write, database, id)
+
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, range(1, items + 1)))
+    elapsed = time.perf_counter() - start
+    stats = writer.stats
+    return {'elapsed': elapsed, 'waited': stats['blocked'], 'transactions': stats['transactions'], 'max_queue': stats['max_queue']}
+
+
+if __name__ == '__main__':
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 20
+
+    results = {}
+    for name, function in {'lock': run_lock, 'writer': run_writer}.items():
+        db_file = os.path.join(tempfile.gettempdir(), f"butler-bench-{name}.db")
+        if os.path.isfile(db_file):
+            os.remove(db_file)
+        results[name] = function(Database(db_file), items, threads, latency)
+        os.remove(db_file)
+
+    print(f"items={items} threads={threads} latency={latency * 1000:.0f}ms")
+    lock = results['lock']
+    writer = results['writer']
+    print(f"global lock  {items / lock['elapsed']:8.1f} items/sec, waited on lock {lock['waited']:.2f}s, contended {lock['contended']}/{lock['acquisitions']}")
+    print(f"writer       {items / writer['elapsed']:8.1f} items/sec, waited on writer {writer['waited']:.2f}s, {writer['transactions']} transactions, max queue {writer['max_queue']}")
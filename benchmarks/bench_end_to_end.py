@@ -0,0 +1,330 @@
+"""
+Runs `download`, `process` and `report` end to end against a local stub of the GitHub API and reports the time, API
+calls, SQL queries and memory of every phase (from their --profile reports), so regressions show up without a token or
+network access.
+
+The stub either serves a synthetic organisation of `repos` repositories with `workflows` workflows each, all using a
+handful of shared actions, or replays one of the recorded fixture sets in src/tests/mock_responses.py. Every request
+for api.github.com and raw.githubusercontent.com is sent to the stub, which waits `latency_ms` before answering.
+
+    python -m benchmarks.bench_end_to_end synthetic [repos] [workflows] [threads] [latency_ms]
+    python -m benchmarks.bench_end_to_end replay <fixtures> <repo> [threads] [latency_ms]
+
+For example `replay download_vscode microsoft/vscode`.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import argparse
+from urllib.parse import urlsplit, parse_qsl
+from requests.adapters import HTTPAdapter
+from benchmarks.stub_server import StubServer
+from src.commands.download.command import CommandDownload
+from src.commands.process.command import CommandProcess
+from src.commands.report.command import CommandReport
+from src.github.session import HttpSession
+from src.libs.utils import Utils
+from src.tests import mock_responses
+from src.tests.helpers import _args_download, _args_process
+
+
+class RedirectAdapter(HTTPAdapter):
+    """
+    Sends https://<host>/<path> to <target>/<host>/<path> instead, so the code under test keeps using the real URLs.
+    """
+    def __init__(self, target: str, **kwargs):
+        super().__init__(**kwargs)
+        self.target = target
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = f"{self.target}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else '')
+        return super().send(request, **kwargs)
+
+
+class GitHubStub(StubServer):
+    reset: int = None
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.reset = int(time.time()) + 3600
+
+    def _headers(self, extra: dict | None = None) -> dict:
+        headers = {
+            'Content-Type': 'application/json',
+            'X-RateLimit-Limit': '1000000',
+            'X-RateLimit-Remaining': '999999',
+            'X-RateLimit-Reset': str(self.reset),
+            'X-RateLimit-Resource': 'core'
+        }
+        headers.update(extra or {})
+        return headers
+
+    def _json(self, data, status: int = 200, headers: dict | None = None) -> tuple[int, dict, bytes]:
+        return status, self._headers(headers), json.dumps(data).encode()
+
+    def _not_found(self) -> tuple[int, dict, bytes]:
+        return self._json({'message': 'Not Found', 'status': '404'}, 404)
+
+    def route(self, path: str) -> tuple[int, dict, bytes]:
+        host, _, rest = path.lstrip('/').partition('/')
+        parts = urlsplit('/' + rest)
+        if parts.path == '/rate_limit':
+            return self._json({'resources': {'core': {'limit': 1000000, 'remaining': 999999, 'reset': self.reset}}})
+        return self.resolve(host, parts.path, dict(parse_qsl(parts.query)))
+
+    def resolve(self, host: str, path: str, query: dict) -> tuple[int, dict, bytes]:
+        raise NotImplementedError("GitHubStub.resolve() not implemented")
+
+
+class SyntheticOrg(GitHubStub):
+    org: str = 'bench'
+    actions_org: str = 'bench-actions'
+    actions: list = ['checkout', 'setup-node', 'setup-python', 'cache', 'upload-artifact', 'deploy']
+    per_page: int = 100
+
+    def __init__(self, repos: int, workflows: int, latency: float = 0.0):
+        super().__init__(latency)
+        self.repos = repos
+        self.workflows = workflows
+
+    @staticmethod
+    def _sha(value: str) -> str:
+        return hashlib.sha1(value.encode()).hexdigest()
+
+    def _repo(self, org: str, name: str, index: int = 0) -> dict:
+        return {
+            'id': index + 1,
+            'name': name,
+            'full_name': f"{org}/{name}",
+            'private': False,
+            'fork': False,
+            'archived': False,
+            'default_branch': 'main',
+            'stargazers_count': index % 1000
+        }
+
+    def workflow(self, repo: int, index: int) -> str:
+        # Every workflow is a little different, with the kind of expressions, matrices and actions real ones have.
+        first, second = self.actions[(repo + index) % len(self.actions)], self.actions[(repo + index + 3) % len(self.actions)]
+        return f"""name: Workflow {index} of repo-{repo}
+on:
+  push:
+    branches: [main, 'release/**']
+  pull_request:
+    types: [opened, synchronize]
+  workflow_dispatch:
+    inputs:
+      version:
+        description: Version to build
+        required: true
+permissions:
+  contents: read
+env:
+  REGISTRY: ${{{{ vars.REGISTRY }}}}
+  BUILD_ID: build-{repo}-{index}
+jobs:
+  build:
+    name: Build ${{{{ matrix.os }}}}
+    runs-on: ${{{{ matrix.os }}}}
+    strategy:
+      matrix:
+        os: [ubuntu-latest, windows-latest, macos-latest]
+        node: [18, 20]
+    steps:
+      - uses: {self.actions_org}/checkout@v1
+        with:
+          ref: ${{{{ github.head_ref }}}}
+      - uses: {self.actions_org}/{first}@v1
+        with:
+          version: ${{{{ matrix.node }}}}
+      - name: Build
+        run: |
+          echo "Building ${{{{ inputs.version }}}} for ${{{{ github.event.pull_request.title }}}}"
+          make build VERSION=${{{{ inputs.version }}}}
+        env:
+          TOKEN: ${{{{ secrets.NPM_TOKEN }}}}
+  test:
+    needs: build
+    runs-on: ubuntu-latest
+    if: github.event_name == 'push'
+    steps:
+      - uses: {self.actions_org}/checkout@v1
+      - run: make test SUITE=${{{{ github.event.inputs.version }}}}
+      - uses: {self.actions_org}/{second}@v1
+        with:
+          name: results-${{{{ github.sha }}}}
+"""
+
+    def action(self, name: str) -> str:
+        return f"""name: {name}
+description: Synthetic {name} action
+inputs:
+  version:
+    description: Version to use
+    required: false
+    default: latest
+  name:
+    description: Artifact name
+    required: false
+runs:
+  using: node20
+  main: dist/index.js
+"""
+
+    def resolve(self, host: str, path: str, query: dict) -> tuple[int, dict, bytes]:
+        segments = path.strip('/').split('/')
+        if host == 'raw.githubusercontent.com':
+            # /{org}/{repo}/refs/{heads|tags}/{ref}/{path}
+            org, name, file = segments[0], segments[1], '/'.join(segments[5:])
+            if org == self.org and file.startswith('.github/workflows/workflow-'):
+                repo, index = int(name.split('-')[1]), int(file.split('-')[-1].split('.')[0])
+                return 200, {'Content-Type': 'text/plain'}, self.workflow(repo, index).encode()
+            elif org == self.actions_org and file == 'action.yml':
+                return 200, {'Content-Type': 'text/plain'}, self.action(name).encode()
+            return 404, {'Content-Type': 'text/plain'}, b'404: Not Found'
+
+        if segments[0] == 'users' and len(segments) == 2:
+            return self._json({'login': segments[1], 'type': 'Organization'})
+        elif segments[0] == 'orgs' and segments[2:] == ['repos']:
+            page = int(query.get('page', 1))
+            pages = max((self.repos + self.per_page - 1) // self.per_page, 1)
+            first = (page - 1) * self.per_page
+            repos = [self._repo(self.org, f"repo-{index}", index) for index in range(first, min(first + self.per_page, self.repos))]
+            link = f'/orgs/{self.org}/repos?per_page={self.per_page}&sort=full_name&page='
+            links = []
+            if page < pages:
+                links.append(f'<https://api.github.com{link}{page + 1}>; rel="next"')
+                links.append(f'<https://api.github.com{link}{pages}>; rel="last"')
+            return self._json(repos, headers={'Link': ', '.join(links)} if links else None)
+        elif segments[0] != 'repos' or len(segments) < 3:
+            return self._not_found()
+
+        org, name, rest = segments[1], segments[2], segments[3:]
+        if org not in [self.org, self.actions_org]:
+            return self._not_found()
+        elif org == self.actions_org and name not in self.actions:
+            return self._not_found()
+        elif org == self.org and not (name.startswith('repo-') and int(name.split('-')[1]) < self.repos):
+            return self._not_found()
+
+        if len(rest) == 0:
+            index = int(name.split('-')[1]) if org == self.org else 0
+            return self._json(self._repo(org, name, index))
+        elif rest[:3] == ['git', 'ref', 'heads'] and org == self.org and rest[3:] == ['main']:
+            return self._json({'ref': 'refs/heads/main', 'object': {'sha': self._sha(f"{org}/{name}"), 'type': 'commit'}})
+        elif rest[:3] == ['git', 'ref', 'tags'] and org == self.actions_org and rest[3:] == ['v1']:
+            return self._json({'ref': 'refs/tags/v1', 'object': {'sha': self._sha(f"{org}/{name}@v1"), 'type': 'commit'}})
+        elif rest == ['contents', '.github', 'workflows'] and org == self.org:
+            listing = [
+                {'name': f"workflow-{index}.yml", 'path': f".github/workflows/workflow-{index}.yml", 'type': 'file'}
+                for index in range(self.workflows)
+            ]
+            return self._json(listing)
+        return self._not_found()
+
+
+class Replay(GitHubStub):
+    """
+    Serves one of the recorded fixture sets, the same way the tests' mock_requests_get fixture does.
+    """
+    def __init__(self, fixtures: dict, latency: float = 0.0):
+        super().__init__(latency)
+        self.fixtures = fixtures
+
+    def route(self, path: str) -> tuple[int, dict, bytes]:
+        host, _, rest = path.lstrip('/').partition('/')
+        rest = '/' + rest
+        keys = [f"https://{host}{rest}", f"https://{host}{urlsplit(rest).path}"] if host != 'api.github.com' else [rest, urlsplit(rest).path]
+        for key in keys:
+            if key in self.fixtures:
+                fixture = self.fixtures[key]
+                headers = self._headers(fixture.headers)
+                # The body is decoded by requests, the recorded encoding and length don't apply any more.
+                for name in ['Content-Encoding', 'Content-Length', 'Transfer-Encoding']:
+                    headers.pop(name, None)
+                return fixture.status_code, headers, fixture.contents.encode()
+        return self._not_found()
+
+
+def run_command(command, args: argparse.Namespace, profile: str) -> dict:
+    started = time.perf_counter()
+    assert command.run(args), f"{type(command).__name__} failed"
+    elapsed = time.perf_counter() - started
+    with open(profile) as f:
+        report = json.load(f)
+    report['elapsed'] = elapsed
+    return report
+
+
+def run(server: GitHubStub, repo: str, threads: int) -> list[dict]:
+    os.environ['GITHUB_TOKEN'] = 'ghp_bench'
+    server.start()
+    # Sized up front, so the commands don't replace the session and its adapters.
+    HttpSession.configure(threads)
+    adapter = RedirectAdapter(server.url, pool_connections=4, pool_maxsize=max(threads, HttpSession._pool_size), max_retries=0)
+    for host in ['https://api.github.com', 'https://raw.githubusercontent.com']:
+        HttpSession.session().mount(host, adapter)
+
+    log = Utils.init_logger(False, False)
+    log.remove()
+
+    directory = tempfile.mkdtemp(prefix='butler-bench-')
+    database = os.path.join(directory, 'bench.db')
+    profile = os.path.join(directory, 'profile.json')
+    try:
+        reports = [
+            run_command(CommandDownload(log), _args_download(repo=[repo], database=database, threads=threads, all_repos=True, profile=profile), profile),
+            run_command(CommandProcess(log), _args_process(database=database, threads=threads, profile=profile), profile),
+            run_command(CommandReport(log), argparse.Namespace(
+                database=database, repo=repo.split('/')[0], output=os.path.join(directory, 'report'), config=None,
+                custom_query_path=None, token=[], gh_app_key='', gh_app_client_id='', db_debug=False,
+                db_debug_auto_commit=False, db_profile='fast', profile=profile, profile_cpu=False,
+                verbose=False, very_verbose=False
+            ), profile)
+        ]
+        # With the WAL journal part of the data can still be in bench.db-wal.
+        reports[0]['database_mb'] = sum(os.path.getsize(database + suffix) for suffix in ['', '-wal'] if os.path.isfile(database + suffix)) / 1024 / 1024
+    finally:
+        server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    return reports
+
+
+def show(reports: list[dict], repos: int, workflows: int) -> None:
+    print(f"{'phase':<40} {'wall':>9} {'cpu':>9} {'api':>8} {'sql':>9} {'rss mb':>8}")
+    for report in reports:
+        for phase in report['phases']:
+            name = f"{report['command']}/{phase['name']}"
+            print(f"{name:<40} {phase['wall_seconds']:>8.2f}s {phase['cpu_seconds']:>8.2f}s {phase.get('api_calls', 0):>8} {phase['sql_queries']:>9} {phase['peak_rss_mb'] or 0:>8.1f}")
+
+    print()
+    for report in reports:
+        total = report['total']
+        throughput = f", {repos / report['elapsed']:.1f} repos/sec, {workflows / report['elapsed']:.1f} workflows/sec" if repos else ''
+        print(f"{report['command']:<10} {report['elapsed']:8.2f}s, {total.get('api_calls', 0)} API calls, {total['sql_queries']} SQL queries{throughput}")
+    print(f"database   {reports[0]['database_mb']:8.1f} MB")
+
+
+if __name__ == '__main__':
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'synthetic'
+    if mode == 'replay':
+        fixtures = getattr(mock_responses, sys.argv[2])()
+        repo = sys.argv[3]
+        threads = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+        latency = float(sys.argv[5]) / 1000 if len(sys.argv) > 5 else 0.0
+        reports = run(Replay(fixtures, latency), repo, threads)
+        print(f"replay={sys.argv[2]} repo={repo} threads={threads} latency={latency * 1000:.0f}ms")
+        show(reports, 0, 0)
+    else:
+        repos = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+        workflows = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+        threads = int(sys.argv[4]) if len(sys.argv) > 4 else 16
+        latency = float(sys.argv[5]) / 1000 if len(sys.argv) > 5 else 20.0 / 1000
+        reports = run(SyntheticOrg(repos, workflows, latency), SyntheticOrg.org, threads)
+        print(f"repos={repos} workflows={repos * workflows} threads={threads} latency={latency * 1000:.0f}ms")
+        show(reports, repos, repos * workflows)
@@ -0,0 +1,100 @@
+"""
+API calls needed to list and download the workflows of a synthetic org, REST against GraphQL (--graphql).
+
+Responses are served from the recorded test fixtures (microsoft/vscode's copilot-setup-steps.yml is used as the
+contents of every workflow), so only the number of calls is meaningful, not timings.
+
+    python -m benchmarks.bench_graphql [repos] [workflows]
+"""
+import sys
+import json
+from unittest.mock import patch
+from requests.models import Response
+from src.github.client import GitHubClient
+from src.libs.components.repo import RepoComponent
+from src.libs.components.workflow import WorkflowComponent
+from src.libs.constants import GitHubRefType, RepoVisibility
+from src.libs.utils import Utils
+from src.tests.mock_responses import default, download_vscode
+
+
+def _response(body: str, status_code: int = 200) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.encoding = 'utf-8'
+    response._content = body.encode()
+    return response
+
+
+class SyntheticOrg:
+    def __init__(self, repos: int, workflows: int):
+        self.repos = repos
+        self.workflows = workflows
+        self.contents = download_vscode()['https://raw.githubusercontent.com/microsoft/vscode/refs/heads/main/.github/workflows/copilot-setup-steps.yml'].response().text
+
+    def components(self) -> list[RepoComponent]:
+        components = []
+        for index in range(self.repos):
+            repo = RepoComponent(f"bench/repo-{index}@main")
+            repo.visibility = RepoVisibility.PUBLIC
+            repo.ref_type = GitHubRefType.BRANCH
+            components.append(repo)
+        return components
+
+    def paths(self) -> list[str]:
+        return [f".github/workflows/workflow-{index}.yml" for index in range(self.workflows)]
+
+    def get(self, url: str, *args, **kwargs) -> Response:
+        if url.endswith('/rate_limit'):
+            return default()['/rate_limit'].response()
+        elif url.endswith('/contents/.github/workflows'):
+            listing = [{'name': path.split('/')[-1], 'path': path, 'type': 'file'} for path in self.paths()]
+            return _response(json.dumps(listing))
+        elif url.startswith('https://raw.githubusercontent.com/'):
+            return _response(self.contents)
+        raise ValueError(f"Unmocked URL: {url}")
+
+    def post(self, url: str, *args, **kwargs) -> Response:
+        data = {}
+        for name in kwargs['json']['variables']:
+            if not name.startswith('owner'):
+                continue
+            entries = [
+                {'path': path, 'type': 'blob', 'object': {'text': self.contents, 'isBinary': False, 'isTruncated': False}}
+                for path in self.paths()
+            ]
+            data[f"r{name[len('owner'):]}"] = {'object': {'entries': entries}}
+        return _response(json.dumps({'data': data}))
+
+
+def run(org: SyntheticOrg, graphql: bool) -> tuple[int, int]:
+    log = Utils.init_logger(False, False)
+    log.remove()
+    client = GitHubClient(['ghp_bench'], log, 1, graphql=graphql)
+
+    repos = org.components()
+    if graphql:
+        client.prefetch_workflows(repos)
+
+    downloaded = 0
+    for repo in repos:
+        for path in client.ls(repo, '.github/workflows'):
+            workflow = WorkflowComponent(f"{repo.org.name}/{repo.name}/{path}@{repo.ref}")
+            workflow.repo = repo
+            if client.download_workflow(workflow):
+                downloaded += 1
+    return client._api.total_requests, downloaded
+
+
+if __name__ == '__main__':
+    repos = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workflows = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    org = SyntheticOrg(repos, workflows)
+    with patch('requests.Session.get', side_effect=org.get), patch('requests.Session.post', side_effect=org.post):
+        rest_calls, rest_files = run(org, False)
+        graphql_calls, graphql_files = run(org, True)
+
+    print(f"repos={repos} workflows={repos * workflows} batch={GitHubClient.graphql_batch_size}")
+    print(f"rest     {rest_calls:8} calls, {rest_files} files")
+    print(f"graphql  {graphql_calls:8} calls, {graphql_files} files")
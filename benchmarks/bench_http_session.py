@@ -0,0 +1,41 @@
+"""
+Compare calls/sec of a bare requests.get() per call against the pooled HttpSession.
+
+    python -m benchmarks.bench_http_session [calls] [threads] [latency_ms]
+"""
+import sys
+import time
+import requests
+import concurrent.futures
+from benchmarks.stub_server import StubServer
+from src.github.session import HttpSession
+
+
+def run(get: callable, url: str, calls: int, threads: int) -> float:
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(get, f"{url}/repos/org/repo-{i}", timeout=(5, None)) for i in range(calls)]
+        for future in concurrent.futures.as_completed(futures):
+            future.result().raise_for_status()
+    return calls / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0
+
+    server = StubServer(latency).start()
+    HttpSession.configure(threads)
+
+    # Warm up both paths so the first connection isn't counted.
+    run(requests.get, server.url, threads, threads)
+    run(HttpSession.get, server.url, threads, threads)
+
+    before = run(requests.get, server.url, calls, threads)
+    after = run(HttpSession.get, server.url, calls, threads)
+    server.stop()
+
+    print(f"calls={calls} threads={threads} latency={latency * 1000:.0f}ms")
+    print(f"requests.get      {before:10.1f} calls/sec")
+    print(f"HttpSession.get   {after:10.1f} calls/sec ({after / before:.2f}x)")
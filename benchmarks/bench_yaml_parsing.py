@@ -0,0 +1,101 @@
+"""
+Parsing speed of Utils.load_yaml over a corpus of real workflows and actions, against the loader it replaced.
+
+The corpus is either the YAML files in a directory, the contents of the workflows in a database created by `download`,
+or by default the workflows and actions in the test assets.
+
+    python -m benchmarks.bench_yaml_parsing [directory | database.db] [rounds]
+"""
+import os
+import sys
+import time
+import yaml
+from src.database.database import Database
+from src.libs.compressor import Compressor
+from src.libs.constants import WorkflowType
+from src.libs.utils import Utils, YamlTextLoader
+from src.tests import mock_responses
+
+
+class LegacyLoader(yaml.loader.Loader):
+    """The pure Python, full loader Utils.load_yaml used before, with the same text constructors."""
+
+
+LegacyLoader.add_constructor('tag:yaml.org,2002:bool', lambda loader, node: loader.construct_scalar(node))
+LegacyLoader.add_constructor('tag:yaml.org,2002:timestamp', lambda loader, node: loader.construct_scalar(node))
+
+
+class PythonTextLoader(yaml.SafeLoader):
+    """The new loader without libyaml, to tell the C parser apart from the constructor changes."""
+
+
+PythonTextLoader.add_constructor('tag:yaml.org,2002:bool', lambda loader, node: loader.construct_scalar(node))
+PythonTextLoader.add_constructor('tag:yaml.org,2002:timestamp', lambda loader, node: loader.construct_scalar(node))
+
+
+def load_directory(path: str) -> list[str]:
+    documents = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if Utils.is_yaml_extension(name):
+                documents.append(Utils.read_file(os.path.join(root, name)))
+    return documents
+
+
+def load_database(path: str) -> list[str]:
+    database = Database(path)
+    sql = """
+        SELECT COALESCE(b.contents, w.contents) AS contents
+        FROM workflows w
+        LEFT JOIN blobs b ON b.id = w.blob_id
+        WHERE w.type != :type AND COALESCE(b.contents, w.contents) != ''
+    """
+    rows = database.select(sql, {'type': WorkflowType.DOCKER})
+    database.close()
+    return [Compressor.decompress(row['contents']) for row in rows]
+
+
+def load_assets() -> list[str]:
+    documents = load_directory(os.path.join(Utils.get_tests_assets_folder(), 'runners'))
+    documents += load_directory(os.path.join(Utils.get_tests_assets_folder(), 'microsoft'))
+    # Raw files the download tests are served, real workflows and actions from GitHub.
+    for fixture in [mock_responses.download_vscode, mock_responses.renamed_branch]:
+        for url, response in fixture().items():
+            if 'raw.githubusercontent.com' in url and response.status_code == 200 and response.contents not in documents:
+                documents.append(response.contents)
+    return documents
+
+
+def run(documents: list[str], loader: type, rounds: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for document in documents:
+            yaml.load(document, loader)
+    elapsed = time.perf_counter() - start
+    return {'elapsed': elapsed, 'documents_per_second': len(documents) * rounds / elapsed}
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else ''
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    if source.endswith('.db') or source.endswith('.sqlite3'):
+        documents = load_database(source)
+    elif source:
+        documents = load_directory(source)
+    else:
+        documents = load_assets()
+
+    # Every loader has to give the same result, or the comparison is meaningless.
+    mismatches = sum(1 for document in documents if yaml.load(document, LegacyLoader) != Utils.load_yaml(document))
+    size = sum(len(document) for document in documents)
+    print(f"documents={len(documents)} size={size / 1024:.0f}KB rounds={rounds} libyaml={yaml.__with_libyaml__} mismatches={mismatches}")
+
+    results = {
+        'legacy (Loader)': run(documents, LegacyLoader, rounds),
+        'safe (Python)': run(documents, PythonTextLoader, rounds),
+        f"load_yaml ({YamlTextLoader.__mro__[1].__name__})": run(documents, YamlTextLoader, rounds),
+    }
+    baseline = results['legacy (Loader)']['elapsed']
+    for name, result in results.items():
+        print(f"{name:28} {result['documents_per_second']:10.1f} documents/sec, {size * rounds / result['elapsed'] / 1024 / 1024:6.2f} MB/sec, {baseline / result['elapsed']:5.2f}x")
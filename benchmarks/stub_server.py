@@ -0,0 +1,55 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive is only possible with HTTP/1.1 and a Content-Length on every response.
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, avoid waiting on delayed ACKs.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+        status, headers, body = self.server.route(self.path)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Silence the default stderr access log.
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    latency: float = 0.0
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.latency = latency
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def route(self, path: str) -> tuple[int, dict, bytes]:
+        # Override to serve something more interesting.
+        body = json.dumps({'path': path}).encode()
+        return 200, {'Content-Type': 'application/json'}, body
+
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -1,8 +1,11 @@
 import os
 import argparse
 from loguru import logger
+from src.database.database import Database
 from src.github.api import GitHubApi
+from src.libs.constants import DatabaseProfile
 from src.libs.exceptions import InvalidCommandLine
+from src.libs.profiler import Profiler
 
 
 class Command:
@@ -33,6 +36,9 @@ class Command:
         subparser.add_argument("--gh-app-client-id", default="", help="GitHub App Client ID")
         subparser.add_argument("--db-debug", action="store_true", default=False, help="Enable Database Debug Stats")
         subparser.add_argument("--db-debug-auto-commit", action="store_true", default=False, help="Enable Database Auto-Commit")
+        subparser.add_argument("--db-profile", default="fast", choices=["fast", "safe"], help="SQLite profile: fast (WAL, relaxed fsync, large cache) or safe (SQLite defaults)")
+        subparser.add_argument("--profile", default="", type=str, help="File to write the wall time, CPU time, SQL queries, API calls and peak memory of every phase to (JSON)")
+        subparser.add_argument("--profile-cpu", action="store_true", default=False, help="Also save a cProfile dump of every phase next to the --profile report")
 
     def __init__(self, log: logger):
         self.log = log
@@ -80,9 +86,25 @@ class Command:
 
         return {
             'db_debug': arguments.db_debug or False,
-            'db_debug_auto_commit': arguments.db_debug or False
+            'db_debug_auto_commit': arguments.db_debug or False,
+            'db_profile': DatabaseProfile[arguments.db_profile.upper()] if 'db_profile' in arguments else DatabaseProfile.FAST,
+            'profile': os.path.realpath(arguments.profile.strip()) if 'profile' in arguments and arguments.profile and len(arguments.profile.strip()) > 0 else '',
+            'profile_cpu': arguments.profile_cpu if 'profile_cpu' in arguments else False
         }
 
+    def create_profiler(self, arguments: dict, command: str, database: Database, api: GitHubApi | None = None) -> Profiler | None:
+        if len(arguments['profile']) == 0:
+            if arguments['profile_cpu']:
+                raise InvalidCommandLine("--profile-cpu requires --profile")
+            return None
+
+        database.count_queries()
+        profiler = Profiler(arguments['profile'], command, self.log, arguments['profile_cpu'])
+        profiler.track('sql_queries', lambda: database.total_queries)
+        if api is not None:
+            profiler.track('api_calls', lambda: api.total_requests)
+        return profiler
+
     def validate_default_arguments(self) -> bool:
         # Override if required.
         return True
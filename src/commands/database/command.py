@@ -3,6 +3,9 @@ import argparse
 from src.commands.command import Command
 from src.commands.database.database import ServiceDatabase
 from src.database.database import Database
+from src.libs.compressor import Compressor
+from src.libs.exceptions import InvalidCommandLine
+from src.libs.serializer import DataSerializer
 
 
 class CommandDatabase(Command):
@@ -16,6 +19,8 @@ class CommandDatabase(Command):
         subparser.add_argument("--purge", default=False, action="store_true", help="Purge entire database")
         subparser.add_argument("--reprocess", default=False, action="store_true", help="Reset all processed data")
         subparser.add_argument("--list-orgs", default=False, action="store_true", help="List downloaded orgs")
+        subparser.add_argument("--compress", default=None, choices=[Compressor.NONE, Compressor.ZLIB, Compressor.ZSTD], help="Compress the contents of downloaded workflows in place, 'none' decompresses them")
+        subparser.add_argument("--data-format", default=None, choices=[DataSerializer.JSON, DataSerializer.JSON_ZLIB, DataSerializer.JSON_ZSTD, DataSerializer.MSGPACK], help="Also convert the parsed workflows to this format when compressing")
 
         Command.define_shared_arguments(subparser)
 
@@ -25,13 +30,26 @@ class CommandDatabase(Command):
             'purge': arguments.purge or False,
             'reprocess': arguments.reprocess or False,
             'list_orgs': arguments.list_orgs or False,
+            'compress': arguments.compress or None,
+            'data_format': arguments.data_format or None,
         }
 
+    def validate_command_arguments(self, arguments: dict) -> None:
+        if arguments['compress'] and arguments['compress'] not in Compressor.codecs():
+            raise InvalidCommandLine(f"--compress {arguments['compress']} is not available, install the zstandard package to use it")
+        elif arguments['data_format'] and arguments['data_format'] not in DataSerializer.formats():
+            raise InvalidCommandLine(f"--data-format {arguments['data_format']} is not available, install the msgpack or zstandard package to use it")
+        elif arguments['data_format'] and not arguments['compress']:
+            raise InvalidCommandLine("--data-format can only be used together with --compress")
+
     def execute(self, arguments: dict) -> bool:
-        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'], False)
+        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'], False, profile=arguments['db_profile'])
 
         service = ServiceDatabase(self.log, database)
         service.purge = arguments['purge']
         service.reprocess = arguments['reprocess']
         service.list_orgs = arguments['list_orgs']
+        service.compress = arguments['compress']
+        service.data_format = arguments['data_format']
+        service.profiler = self.create_profiler(arguments, 'database', database)
         return service.run()
@@ -8,17 +8,26 @@ class ServiceDatabase(Service):
     purge: bool = None
     reprocess: bool = None
     list_orgs: bool = None
+    compress: str = None
+    data_format: str = None
 
     def run(self) -> bool:
         if self.purge:
             self.log.info("Purging database")
-            return self._purge_database()
+            with self.phase('purge'):
+                return self._purge_database()
         elif self.reprocess:
             self.log.info("Resetting processed data")
-            return self._reprocess_database()
+            with self.phase('reprocess'):
+                return self._reprocess_database()
         elif self.list_orgs:
             self.log.info("Listing orgs")
-            return self._list_orgs()
+            with self.phase('list_orgs'):
+                return self._list_orgs()
+        elif self.compress:
+            self.log.info(f"Compressing workflow contents with {self.compress}")
+            with self.phase('compress'):
+                return self._compress_database()
         else:
             raise InvalidCommandLine("No valid arguments passed")
 
@@ -58,6 +67,18 @@ class ServiceDatabase(Service):
 
         return True
 
+    def _compress_database(self) -> bool:
+        size = self.database.file_size()
+        total = self.database.workflows().recompress(self.compress, self.data_format)
+        self.log.info(f"Rewrote {total} workflow files, reclaiming free space")
+        self.database.vacuum()
+
+        stats = self.database.workflows().storage_stats()
+        self.log.success(f"Database size {size / 1048576:.1f}MB -> {self.database.file_size() / 1048576:.1f}MB")
+        self.log.success(f"Workflow contents {stats['contents_original'] / 1048576:.1f}MB stored in {stats['contents_stored'] / 1048576:.1f}MB, data {stats['data_original'] / 1048576:.1f}MB stored in {stats['data_stored'] / 1048576:.1f}MB")
+        self.log.success(f"{stats['blob_references']} workflows share {stats['blobs']} distinct files")
+        return True
+
     def _list_orgs(self) -> bool:
         sql = """
             SELECT
@@ -3,8 +3,14 @@ import argparse
 from src.commands.command import Command
 from src.commands.download.download import ServiceDownload
 from src.database.database import Database
+from src.libs.blob_store import BlobStore
+from src.libs.compressor import Compressor
+from src.libs.constants import Engine, ArchiveMode
 from src.libs.exceptions import InvalidCommandLine
+from src.libs.serializer import DataSerializer
 from src.libs.utils import Utils
+from src.github.cache import ResponseCache
+from src.github.ref_cache import RefCache
 from src.github.client import GitHubClient
 
 
@@ -23,6 +29,21 @@ class CommandDownload(Command):
         subparser.add_argument("--include-archived", default=False, action="store_true", help="Include archived repos when --repo is an org")
         subparser.add_argument("--all-repos", default=False, action="store_true", help="Download all repos, including archived and forks")
         subparser.add_argument("--threads", default=1, type=int, help="Enable multithreading")
+        subparser.add_argument("--engine", default="threads", choices=["threads", "async"], help="Download engine, 'async' keeps up to --threads requests in flight without waiting for each batch")
+        subparser.add_argument("--http-cache", default="", type=str, help="Directory to cache GitHub responses in, re-runs then send conditional requests that don't count against the rate limit")
+        subparser.add_argument("--http-cache-size", default=512, type=int, help="Maximum size of --http-cache in MB")
+        subparser.add_argument("--blob-store", default="", type=str, help="Directory to keep downloaded files in by commit, can be shared between databases")
+        subparser.add_argument("--blob-store-size", default=1024, type=int, help="Maximum size of --blob-store in MB")
+        subparser.add_argument("--archive", default="auto", choices=["never", "auto", "always"], help="Download workflows and actions from the repository's tarball, 'auto' only does it for repositories with many workflows that aren't larger than --archive-max-size")
+        subparser.add_argument("--archive-max-size", default=100, type=int, help="Largest repository in MB --archive auto downloads the tarball of")
+        subparser.add_argument("--graphql", default=False, action="store_true", help="Fetch workflow listings and files for many repositories per request using the GraphQL API")
+        subparser.add_argument("--incremental", default=False, action="store_true", help="Check repositories that were already scanned for new commits and only download the workflows that changed")
+        subparser.add_argument("--ref-cache", default="", type=str, help="File to keep resolved refs in between runs")
+        subparser.add_argument("--ref-cache-ttl", default=3600, type=int, help="Seconds repository details and resolved branches or tags are reused for, resolved commits never expire")
+        subparser.add_argument("--api-metrics", default="", type=str, help="File to write per endpoint API call counts, latencies, retries and token usage to (JSON)")
+        subparser.add_argument("--api-metrics-prometheus", default="", type=str, help="File to write the API metrics to in the Prometheus textfile format")
+        subparser.add_argument("--data-format", default=DataSerializer.default, choices=[DataSerializer.JSON, DataSerializer.JSON_ZLIB, DataSerializer.JSON_ZSTD, DataSerializer.MSGPACK], help="Format to store the parsed workflows in, 'json-zstd' requires the zstandard package and 'msgpack' the msgpack package")
+        subparser.add_argument("--compress", default=Compressor.NONE, choices=[Compressor.NONE, Compressor.ZLIB, Compressor.ZSTD], help="Compress the contents of downloaded workflows, 'zstd' requires the zstandard package")
 
         Command.define_shared_arguments(subparser)
 
@@ -39,6 +60,21 @@ class CommandDownload(Command):
             'include_archived': arguments.include_archived or False,
             'all_repos': arguments.all_repos or False,
             'threads': int(arguments.threads),
+            'http_cache': '' if not arguments.http_cache or len(arguments.http_cache.strip()) == 0 else os.path.realpath(arguments.http_cache.strip()),
+            'http_cache_size': int(arguments.http_cache_size),
+            'blob_store': '' if not arguments.blob_store or len(arguments.blob_store.strip()) == 0 else os.path.realpath(arguments.blob_store.strip()),
+            'blob_store_size': int(arguments.blob_store_size),
+            'ref_cache': '' if not arguments.ref_cache or len(arguments.ref_cache.strip()) == 0 else os.path.realpath(arguments.ref_cache.strip()),
+            'ref_cache_ttl': int(arguments.ref_cache_ttl),
+            'api_metrics': '' if not arguments.api_metrics or len(arguments.api_metrics.strip()) == 0 else os.path.realpath(arguments.api_metrics.strip()),
+            'api_metrics_prometheus': '' if not arguments.api_metrics_prometheus or len(arguments.api_metrics_prometheus.strip()) == 0 else os.path.realpath(arguments.api_metrics_prometheus.strip()),
+            'graphql': arguments.graphql or False,
+            'incremental': arguments.incremental or False,
+            'archive': ArchiveMode[arguments.archive.upper()] if arguments.archive else ArchiveMode.AUTO,
+            'archive_max_size': int(arguments.archive_max_size),
+            'engine': Engine[arguments.engine.upper()] if arguments.engine else Engine.THREADS,
+            'data_format': arguments.data_format or DataSerializer.default,
+            'compress': arguments.compress or Compressor.NONE,
         }
 
     def validate_command_arguments(self, arguments: dict) -> None:
@@ -75,15 +111,40 @@ class CommandDownload(Command):
         if arguments['threads'] <= 0:
             arguments['threads'] = 1
 
+        if arguments['http_cache_size'] <= 0:
+            raise InvalidCommandLine(f"--http-cache-size must be greater than 0")
+        elif arguments['blob_store_size'] <= 0:
+            raise InvalidCommandLine(f"--blob-store-size must be greater than 0")
+        elif arguments['archive_max_size'] <= 0:
+            raise InvalidCommandLine(f"--archive-max-size must be greater than 0")
+        elif arguments['ref_cache_ttl'] < 0:
+            raise InvalidCommandLine(f"--ref-cache-ttl cannot be negative")
+        elif arguments['data_format'] not in DataSerializer.formats():
+            raise InvalidCommandLine(f"--data-format {arguments['data_format']} is not available, install the msgpack or zstandard package to use it")
+        elif arguments['compress'] not in Compressor.codecs():
+            raise InvalidCommandLine(f"--compress {arguments['compress']} is not available, install the zstandard package to use it")
+
         if arguments['all_repos']:
             arguments['include_forks'] = True
             arguments['include_archived'] = True
 
     def execute(self, arguments: dict) -> bool:
-        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'])
+        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'], profile=arguments['db_profile'])
+        database.workflows().data_format = arguments['data_format']
+        database.workflows().contents_compression = arguments['compress']
 
         service = ServiceDownload(self.log, database)
-        service.github_client = GitHubClient(self.tokens, self.log)
+        cache = None
+        if len(arguments['http_cache']) > 0:
+            cache = ResponseCache(arguments['http_cache'], arguments['http_cache_size'] * 1024 * 1024)
+
+        blobs = None
+        if len(arguments['blob_store']) > 0:
+            blobs = BlobStore(arguments['blob_store'], arguments['blob_store_size'] * 1024 * 1024)
+
+        refs = RefCache(arguments['ref_cache_ttl'], arguments['ref_cache'] or None)
+
+        service.github_client = GitHubClient(self.tokens, self.log, arguments['threads'], cache, blobs, refs, arguments['graphql'])
         service.repos = arguments['repos']
         service.resume_next = arguments['resume_next']
         service.all_tags = arguments['all_tags']
@@ -91,5 +152,12 @@ class CommandDownload(Command):
         service.include_forks = arguments['include_forks']
         service.include_archived = arguments['include_archived']
         service.threads = arguments['threads']
+        service.engine = arguments['engine']
+        service.archive = arguments['archive']
+        service.archive_max_size = arguments['archive_max_size']
+        service.incremental = arguments['incremental']
         service.only_workflows = arguments['workflows']
+        service.api_metrics = arguments['api_metrics']
+        service.api_metrics_prometheus = arguments['api_metrics_prometheus']
+        service.profiler = self.create_profiler(arguments, 'download', database, service.github_client._api)
         return service.run()
@@ -1,20 +1,21 @@
-import threading
-from contextlib import nullcontext
+from collections.abc import Callable
 from src.commands.download.download_helper import DownloadHelper
 from src.commands.service import Service
+from src.database.writer import DatabaseWriter
 from src.github.client import GitHubClient
 from src.github.exceptions import TooManyRequests, ApiRateLimitExceeded, OrgNotFound, RefNotFound, RepoNotFound
+from src.libs.async_engine import AsyncEngine
 from src.libs.components.org import OrgComponent
 from src.libs.components.repo import RepoComponent
 from src.libs.components.workflow import WorkflowComponent
-from src.libs.constants import PollStatus, RepoStatus, GitHubRefType, WorkflowStatus, WorkflowType, OrgStatus
+from src.libs.constants import PollStatus, RepoStatus, GitHubRefType, WorkflowStatus, WorkflowType, OrgStatus, Engine, ArchiveMode
 from src.libs.exceptions import InvalidCommandLine
 from src.libs.utils import Utils
+from src.libs.worker_pool import WorkerPool
 
 
 class ServiceDownload(Service, DownloadHelper):
     repos: list = None
-    lock: threading.Lock = None
     resume_next: bool = None
     github_client: GitHubClient = None
     all_branches: bool = None
@@ -22,28 +23,46 @@ class ServiceDownload(Service, DownloadHelper):
     include_forks: bool = None
     include_archived: bool = None
     threads: int = None
+    engine: Engine = None
+    archive: ArchiveMode = None
+    # A tarball costs a single API call but is a much larger download, only worth it from this many files.
+    archive_threshold: int = 10
+    # In MB, past it a tarball costs far more to transfer than the downloads it replaces.
+    archive_max_size: int = 100
+    incremental: bool = None
+    # GitHub stops listing the files of a comparison after this many, past it the changes are incomplete.
+    compare_files_limit: int = 300
     only_workflows: list = None
+    api_metrics: str = None
+    api_metrics_prometheus: str = None
 
     def run(self) -> bool:
-        # Thanks SQLite3 :>
-        self.lock = threading.Lock() if self.threads > 1 else nullcontext()
-
         while True:
             try:
                 self.log.info("Collecting repositories...")
-                self._collect_targets()
+                with self.phase('collect_targets'):
+                    self._collect_targets()
+
+                if self.incremental:
+                    self.log.info("Checking scanned repositories for changes")
+                    with self.phase('refresh_repos'):
+                        self._refresh_repos()
 
                 self.log.info("Scanning for workflows")
-                self._scan_workflows()
+                with self.phase('scan_workflows'):
+                    self._scan_workflows()
 
                 self.log.info("Loading repository details")
-                self._load_repository_details()
+                with self.phase('load_repository_details'):
+                    self._load_repository_details()
 
                 self.log.info("Downloading workflows")
-                self._download_workflows()
+                with self.phase('download_workflows'):
+                    self._download_workflows()
 
                 self.log.info("Resolving commits to tags/branches")
-                self._resolve_commits()
+                with self.phase('resolve_commits'):
+                    self._resolve_commits()
 
                 break
             except (TooManyRequests, ApiRateLimitExceeded) as e:
@@ -61,8 +80,34 @@ class ServiceDownload(Service, DownloadHelper):
             self.log.info(f"Total SQL Queries: {self.database.total_queries}")
 
         self.log.info(f"Total API Calls: {self.github_client._api.total_requests}")
+        limits = self.github_client._api.limiter.stats
+        self.log.info(f"API Concurrency: {limits['concurrency']} of {limits['max_concurrency']} (Throttle Events: {limits['throttle_events']}, Waited: {limits['throttle_wait_seconds']}s)")
+        self._show_api_metrics()
+        if self.github_client._api.recorder:
+            stats = self.github_client._api.recorder.stats
+            self.log.info(f"Recorded API Responses: {stats['recorded']} (dropped {stats['dropped']})")
+        if self.github_client.refs:
+            stats = self.github_client.refs.stats
+            self.log.info(f"Ref Cache Hit Rate: {self.github_client.refs.hit_rate:.1f}% ({stats['hits']} of {stats['hits'] + stats['misses']} lookups)")
+            self.github_client.refs.save()
+        if self.github_client._api.cache:
+            self.log.info(f"Not Modified (served from --http-cache): {self.github_client._api.cache.stats['hits']}")
+        if self.github_client.blobs:
+            self.log.info(f"Files Loaded from --blob-store: {self.github_client.blobs.stats['hits']}")
         return True
 
+    def _show_api_metrics(self) -> None:
+        summary = self.github_client._api.metrics_summary()
+        # Sorted by the total time spent on them, which is where a long scan goes.
+        for template, endpoint in list(summary['endpoints'].items())[:5]:
+            latency = endpoint['latency']
+            self.log.info(f"API {template}: {endpoint['requests']} calls, {endpoint['seconds']:.1f}s total, p50 {latency['p50']:.2f}s, p99 {latency['p99']:.2f}s, {endpoint['retries']} retries")
+        if summary['tokens'].get('waited_seconds'):
+            self.log.info(f"Waited for Token Resets: {summary['tokens']['waited_seconds']}s")
+
+        if self.api_metrics or self.api_metrics_prometheus:
+            self.github_client._api.save_metrics(self.api_metrics, self.api_metrics_prometheus)
+
     def _collect_targets(self) -> None:
         orgs, repos = Utils.filter_orgs_and_repos(self.repos)
         self.log.debug(f"Input has {len(orgs)} organisations and {len(repos)} repositories")
@@ -113,7 +158,7 @@ class ServiceDownload(Service, DownloadHelper):
             org_db = self._create_org(org)
             org.id = org_db.id
 
-            if org_db.poll_status == PollStatus.SCANNED:
+            if org_db.poll_status == PollStatus.SCANNED and not self.incremental:
                 self.log.debug(f"Organisation {org_db.name} already scanned - skipping")
                 continue
             elif org_db.poll_status == PollStatus.NONE:
@@ -139,192 +184,298 @@ class ServiceDownload(Service, DownloadHelper):
 
     def _collect_repos(self, repos: list[RepoComponent]) -> None:
         count = 0
-        batch_size = 100
-        i = 0
-        for batch in Utils.split_list(repos, self.threads):
-            count += len(batch)
-            i += len(batch)
-
-            self.log.info(f"Processing ({count}/{len(repos)}) repositories")
-            if len(batch) == 1:
-                self._save_repo(batch[0])
-            else:
-                arguments = [(repo,) for repo in batch]
-                Utils.multithread(self._save_repo, arguments)
 
-            if i >= batch_size:
-                i = 0
-                self.log.trace(f"Writing to database...")
-                self.database.commit()
+        def saved(repo: RepoComponent, result: None) -> None:
+            nonlocal count
+            count += 1
+            self.log.info(f"Processed ({count}/{len(repos)}) repositories")
 
-        self.log.trace(f"Writing to database...")
-        self.database.commit()
+        with DatabaseWriter(self.database, self.log) as writer:
+            pool = WorkerPool(self.threads, self.log)
+            pool.run(repos, lambda repo: self._save_repo(repo, writer), saved, writer.commit, key=id)
 
-    def _resolve_commits(self) -> None:
-        while True:
-            batch = self.database.next_commit_to_resolve(self.threads)
-            if not batch:
-                break
+    def _refresh_repos(self) -> None:
+        repos = self.database.repos_to_refresh()
+        summary = {'unchanged': 0, 'changed': 0, 'rescanned': 0}
 
-            if self.threads == 1:
-                self._resolve_commit(batch)
+        def refreshed(repo: RepoComponent, changes: dict) -> None:
+            if changes['rescan']:
+                summary['rescanned'] += 1
+            elif changes['head'] is None or changes['head'] == repo.ref_commit:
+                summary['unchanged'] += 1
+            else:
+                summary['changed'] += 1
+            writer.submit(self._save_repo_changes, repo, changes)
+
+        with DatabaseWriter(self.database, self.log) as writer:
+            WorkerPool(self.threads, self.log).run(repos, self._fetch_repo_changes, refreshed, writer.commit)
+
+        self.log.info(f"Checked {len(repos)} repositories: {summary['unchanged']} unchanged, {summary['changed']} changed, {summary['rescanned']} to scan again")
+
+    def _fetch_repo_changes(self, repo: RepoComponent) -> dict:
+        self.log.info(f"Checking {repo}@{repo.ref} for changes")
+        changes = {'head': self.github_client.get_branch_commit(repo), 'rescan': False, 'files': []}
+        if changes['head'] is None:
+            self.log.warning(f"Branch {repo.ref} not found in {repo} - skipping")
+        elif len(repo.ref_commit) == 0:
+            # There is no commit to compare against.
+            changes['rescan'] = True
+        elif changes['head'] != repo.ref_commit:
+            comparison = self.github_client.compare_commits(repo, repo.ref_commit, changes['head'])
+            files = (comparison or {}).get('files', [])
+            if comparison is None or comparison.get('status') != 'ahead' or len(files) >= self.compare_files_limit:
+                # The history was rewritten or the list of files is truncated, neither can be trusted.
+                changes['rescan'] = True
             else:
-                arguments = [(repo,) for repo in batch]
-                Utils.multithread(self._resolve_commit, arguments)
+                changes['files'] = [
+                    file for file in files
+                    if Utils.is_yaml_extension(file['filename']) or Utils.is_yaml_extension(file.get('previous_filename', ''))
+                ]
+        return changes
+
+    def _save_repo_changes(self, repo: RepoComponent, changes: dict) -> None:
+        if changes['head'] is None or changes['head'] == repo.ref_commit:
+            return None
 
-            self.database.commit()
+        if changes['rescan']:
+            self.log.info(f"Scanning {repo} again")
+            for workflow in self.database.workflows().all(repo.id):
+                self.database.workflows().reset(workflow.id, WorkflowStatus.NONE)
+            if repo.status == RepoStatus.NO_WORKFLOWS:
+                self.database.repos().set_status(repo.id, RepoStatus.NONE)
+            self.database.repos().set_poll_status(repo.id, PollStatus.PENDING)
+        else:
+            for file in changes['files']:
+                if file['status'] == 'renamed':
+                    self._save_file_change(repo, file['previous_filename'], True)
+                if file['status'] != 'unchanged':
+                    self._save_file_change(repo, file['filename'], file['status'] == 'removed')
 
-    def _resolve_commit(self, repo: RepoComponent) -> None:
+        self.database.repos().set_ref_commit(repo.id, changes['head'])
+        return None
+
+    def _save_file_change(self, repo: RepoComponent, path: str, removed: bool) -> None:
+        # Anything already stored for this path is dropped, whether it's a workflow or a local action.
+        workflow_db = self.database.workflows().find(repo.id, path)
+        if workflow_db:
+            self.log.info(f"{'Removed' if removed else 'Changed'} {path} in {repo}")
+            self.database.workflows().reset(workflow_db.id, WorkflowStatus.MISSING if removed else WorkflowStatus.NONE)
+            return None
+        elif removed or path.rsplit('/', 1)[0] != self.github_client.workflows_path:
+            return None
+        elif len(self._filter_workflows([path], self.only_workflows)) == 0:
+            return None
+
+        self.log.info(f"Added {path} in {repo}")
+        workflow = WorkflowComponent(f"{repo.org.name}/{repo.name}/{path}@{repo.ref}")
+        workflow.status = WorkflowStatus.NONE
+        workflow.repo = repo
+        self._create_workflow(workflow)
+        if repo.status == RepoStatus.NO_WORKFLOWS:
+            self.database.repos().set_status(repo.id, RepoStatus.NONE)
+        return None
+
+    def _resolve_commits(self) -> None:
+        self._run_phase(self.database.next_commit_to_resolve, self._fetch_commit_ref, self._save_commit_ref)
+
+    def _fetch_commit_ref(self, repo: RepoComponent) -> tuple[str, GitHubRefType]:
         # First search for a tag (most likely).
         self.log.info(f"Trying to find a tag with commit {repo.ref} in {repo}")
         ref = self.github_client.get_tag_from_commit(repo, repo.ref_commit)
-        ref_type = GitHubRefType.TAG
-        if not ref:
-            self.log.info(f"Trying to find a branch with commit {repo.ref} in {repo}")
-            ref = self.github_client.get_branch_from_commit(repo, repo.ref_commit)
-            ref_type = GitHubRefType.BRANCH
-            if not ref:
-                self.log.warning(f"Could not resolve commit {repo.ref} in {repo}")
-                with self.lock:
-                    self.database.repos().set_ref_resolved_fields(repo.id, '', GitHubRefType.MISSING)
-                return None
-            else:
-                self.log.info(f"Found branch {ref} with commit {repo.ref} in {repo}")
-        else:
+        if ref:
             self.log.info(f"Found tag {ref} with commit {repo.ref} in {repo}")
+            return ref, GitHubRefType.TAG
 
-        with self.lock:
-            self.database.repos().set_ref_resolved_fields(repo.id, ref, ref_type)
-        return None
+        self.log.info(f"Trying to find a branch with commit {repo.ref} in {repo}")
+        ref = self.github_client.get_branch_from_commit(repo, repo.ref_commit)
+        if ref:
+            self.log.info(f"Found branch {ref} with commit {repo.ref} in {repo}")
+            return ref, GitHubRefType.BRANCH
 
-    def _scan_workflows(self) -> None:
-        while True:
-            batch = self.database.next_repo_to_scan(self.threads)
-            if not batch:
-                break
+        self.log.warning(f"Could not resolve commit {repo.ref} in {repo}")
+        return '', GitHubRefType.MISSING
 
-            if self.threads == 1:
-                self._scan_repo_workflows(batch)
-            else:
-                arguments = [(repo,) for repo in batch]
-                Utils.multithread(self._scan_repo_workflows, arguments)
+    def _save_commit_ref(self, repo: RepoComponent, resolved: tuple[str, GitHubRefType]) -> None:
+        ref, ref_type = resolved
+        self.database.repos().set_ref_resolved_fields(repo.id, ref, ref_type)
 
-            self.database.commit()
+    def _scan_workflows(self) -> None:
+        if self.github_client.graphql:
+            self._run_phase(
+                self.database.next_repo_to_scan, self._fetch_repo_workflows, self._save_repo_workflows,
+                self.github_client.prefetch_workflows, self.github_client.graphql_batch_size
+            )
+            return None
+        self._run_phase(self.database.next_repo_to_scan, self._fetch_repo_workflows, self._save_repo_workflows)
 
-    def _scan_repo_workflows(self, repo: RepoComponent) -> None:
+    def _fetch_repo_workflows(self, repo: RepoComponent) -> list[WorkflowComponent]:
         self.log.info(f"Searching for workflows in {repo}")
-        workflows = self._ls_workflows(repo, self.only_workflows)
+        workflows = []
+        try:
+            workflows = self._find_repo_workflows(repo)
+        finally:
+            self.github_client.release_prefetched(repo, [workflow.path for workflow in workflows])
+        return workflows
+
+    def _find_repo_workflows(self, repo: RepoComponent) -> list[WorkflowComponent]:
+        if self.archive == ArchiveMode.ALWAYS:
+            self.github_client.prefetch_archive(repo)
+            return self._ls_workflows(repo, self.only_workflows)
 
-        with self.lock:
-            if len(workflows) > 0:
-                for workflow in workflows:
-                    self.log.debug(f"\tSaving {workflow}")
-                    workflow_db = self._create_workflow(workflow)
+        workflows = self._ls_workflows(repo, self.only_workflows)
+        if self.archive == ArchiveMode.AUTO:
+            # One archive replaces a download per workflow, and brings along the repo's local actions as well.
+            pending = [workflow for workflow in workflows if not self.github_client.is_prefetched(workflow)]
+            if len(pending) < self.archive_threshold:
+                return workflows
+
+            size = self.github_client.repo_size(repo)
+            if size is None or size > self.archive_max_size * 1024:
+                self.log.debug(f"Not fetching the archive of {repo}, it's {'of unknown size' if size is None else f'{size / 1024:.0f}MB'}")
             else:
-                self.database.repos().set_status(repo.id, RepoStatus.NO_WORKFLOWS)
+                self.log.info(f"Fetching {len(pending)} workflows for {repo} from its archive")
+                self.github_client.prefetch_archive(repo)
+        return workflows
+
+    def _save_repo_workflows(self, repo: RepoComponent, workflows: list[WorkflowComponent]) -> None:
+        if len(workflows) > 0:
+            for workflow in workflows:
+                self.log.debug(f"\tSaving {workflow}")
+                self._create_workflow(workflow)
+        else:
+            self.database.repos().set_status(repo.id, RepoStatus.NO_WORKFLOWS)
 
-            self.database.repos().set_poll_status(repo.id, PollStatus.SCANNED)
+        self.database.repos().set_poll_status(repo.id, PollStatus.SCANNED)
 
     def _download_workflows(self) -> None:
-        while True:
-            batch = self.database.next_workflow_to_download(self.threads)
-            if not batch:
-                break
-
-            if self.threads == 1:
-                self._download_single_workflow(batch)
-            else:
-                arguments = [(workflow,) for workflow in batch]
-                Utils.multithread(self._download_single_workflow, arguments)
-
+        self._run_phase(self.database.next_workflow_to_download, self._fetch_workflow, self._save_workflow)
+        self.github_client.clear_prefetched()
+        if self.incremental:
+            # Files that changed since the last run may not be used by any workflow anymore.
+            self.log.info(f"Removed {self.database.workflows().prune_blobs()} unused workflow files")
             self.database.commit()
 
-    def _download_single_workflow(self, workflow: WorkflowComponent) -> None:
+    def _fetch_workflow(self, workflow: WorkflowComponent) -> dict:
         self.log.info(f"Downloading {workflow}")
-        if not self._fulfill_repo(workflow.repo):
-            with self.lock:
-                self._mark_missing(workflow)
-            return None
+        result = {
+            'repo_found': self._fetch_repo_details(workflow.repo),
+            'moved': False,
+            'contents': None,
+            'submodule': None,
+            'data': None,
+            'instance': None,
+            'error': ''
+        }
+        if result['repo_found'] is False:
+            return result
 
         previous_type = workflow.type
         previous_path = workflow.path
-        contents = self._download(workflow)
-        if previous_type != workflow.type or previous_path != workflow.path:
-            with self.lock:
-                self.database.workflows().update_type_and_path(workflow)
+        result['contents'] = self._download(workflow)
+        result['moved'] = previous_type != workflow.type or previous_path != workflow.path
 
-        if contents is None:
+        if result['contents'] is None:
             # Could not download file - could happen for many reasons, one of which
             # is that it's a submodule.
             self.log.info(f"Could not find {workflow} - checking if it's a submodule")
-            submodule = self.github_client.get_submodule(workflow)
+            result['submodule'] = self.github_client.get_submodule(workflow)
+            return result
+
+        result['data'] = {} if result['contents'] else None
+        if workflow.type != WorkflowType.DOCKER:
+            debug = {'error': ''}
+            result['data'], result['instance'] = self._parse_contents(workflow, result['contents'], debug)
+            result['error'] = debug['error']
+        return result
+
+    def _save_workflow(self, workflow: WorkflowComponent, result: dict) -> None:
+        self._save_repo_details(workflow.repo, result['repo_found'])
+        if result['repo_found'] is False:
+            self._mark_missing(workflow)
+            return None
+
+        if result['moved']:
+            self.database.workflows().update_type_and_path(workflow)
+
+        if result['contents'] is None:
+            submodule = result['submodule']
             if submodule is None:
                 self.log.warning(f"Workflow {workflow} not found")
-                with self.lock:
-                    self._mark_missing(workflow)
+                self._mark_missing(workflow)
                 return None
 
             self.log.info(f"Found submodule {submodule}")
-            with self.lock:
-                # Mark the workflow as 'submodule'.
-                self.database.workflows().update_status(workflow.id, WorkflowStatus.SUBMODULE)
+            # Mark the workflow as 'submodule'.
+            self.database.workflows().update_status(workflow.id, WorkflowStatus.SUBMODULE)
 
-                # Create the new submodule workflow.
-                submodule_org = self._create_org(submodule.repo.org)
-                submodule.repo.org.id = submodule_org.id
+            # Create the new submodule workflow.
+            submodule_org = self._create_org(submodule.repo.org)
+            submodule.repo.org.id = submodule_org.id
 
-                submodule_repo = self._create_repo(submodule.repo)
-                submodule.repo.id = submodule_repo.id
+            submodule_repo = self._create_repo(submodule.repo)
+            submodule.repo.id = submodule_repo.id
 
-                submodule_workflow = self._create_workflow(submodule)
+            submodule_workflow = self._create_workflow(submodule)
 
-                # Set the parent workflow's redirect_id to the new submodule workflow.
-                workflow.redirect_id = submodule_workflow.id
-                self.database.workflows().update_redirect_id(workflow.id, workflow.redirect_id)
-                return None
+            # Set the parent workflow's redirect_id to the new submodule workflow.
+            workflow.redirect_id = submodule_workflow.id
+            self.database.workflows().update_redirect_id(workflow.id, workflow.redirect_id)
+            return None
 
-        data = {} if contents else None
-        debug = {'error': ''}
-        if workflow.type != WorkflowType.DOCKER:
-            data = self._process_contents(workflow, contents, debug)
+        if result['instance'] is not None:
+            self._save_child_workflows(workflow, result['instance'])
 
-        with self.lock:
-            if data is None:
-                self.database.workflows().update_contents(workflow.id, contents, debug['error'])
-                self.database.workflows().update_status(workflow.id, WorkflowStatus.ERROR)
-            else:
-                self.database.workflows().update_contents(workflow.id, contents, data)
-                self.database.workflows().update_status(workflow.id, WorkflowStatus.DOWNLOADED)
+        if result['data'] is None:
+            self.database.workflows().update_contents(workflow.id, result['contents'], result['error'])
+            self.database.workflows().update_status(workflow.id, WorkflowStatus.ERROR)
+        else:
+            self.database.workflows().update_contents(workflow.id, result['contents'], result['data'])
+            self.database.workflows().update_status(workflow.id, WorkflowStatus.DOWNLOADED)
 
         return None
 
     def _load_repository_details(self) -> None:
-        while True:
-            batch = self.database.next_repo_to_fulfill(self.threads)
-            if not batch:
-                break
-
-            if self.threads == 1:
-                self._fulfill_repo(batch)
-            else:
-                arguments = [(repo,) for repo in batch]
-                Utils.multithread(self._fulfill_repo, arguments)
-
-            self.database.commit()
+        self._run_phase(self.database.next_repo_to_fulfill, self._fetch_repo_details, self._save_repo_details)
 
-    def _fulfill_repo(self, repo: RepoComponent) -> bool:
+    def _fetch_repo_details(self, repo: RepoComponent) -> bool | None:
+        # None means there was nothing to fetch.
         if repo.is_fulfilled():
-            return True
+            return None
 
         try:
             self.log.info(f"Validating repo {repo}")
             self.github_client.fulfill_component(repo)
-
-            with self.lock:
-                self.database.repos().update(repo)
             return True
         except (RefNotFound, RepoNotFound) as e:
             self.log.error(f"Repo {repo}@{repo.ref} not found")
-            with self.lock:
-                self.database.repos().set_status(repo.id, RepoStatus.MISSING)
         return False
+
+    def _save_repo_details(self, repo: RepoComponent, found: bool | None) -> None:
+        if found is None:
+            return None
+        elif found:
+            self.database.repos().update(repo)
+        else:
+            self.database.repos().set_status(repo.id, RepoStatus.MISSING)
+        return None
+
+    def _run_phase(self, next_batch: Callable, worker: Callable, consumer: Callable, prefetch: Callable | None = None, prefetch_size: int | None = None) -> None:
+        """
+        Network calls run in `worker` (threaded), database reads and writes run on the database writer's thread.
+        `prefetch` receives every batch before it's queued, to fetch what it can for all of its items at once.
+        """
+        engine = AsyncEngine if self.engine == Engine.ASYNC else WorkerPool
+        with DatabaseWriter(self.database, self.log) as writer:
+            def produce(count: int) -> list | None:
+                batch = writer.call(next_batch, count)
+                if prefetch and batch:
+                    prefetch(batch if isinstance(batch, list) else [batch])
+                return batch
+
+            engine(self.threads, self.log, prefetch_size).run(
+                produce,
+                worker,
+                lambda item, result: writer.submit(consumer, item, result),
+                writer.commit
+            )
+        return None
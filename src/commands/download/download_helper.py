@@ -1,5 +1,6 @@
 from src.libs.constants import PollStatus
 from src.database.models import OrganisationModel, RepositoryModel
+from src.database.writer import DatabaseWriter
 from src.github.exceptions import HttpNotFound
 from src.libs.components.org import OrgComponent
 from src.libs.components.repo import RepoComponent
@@ -99,19 +100,20 @@ class DownloadHelper:
     def _mark_missing(self, workflow: WorkflowComponent) -> None:
         self.database.workflows().update_status(workflow.id, WorkflowStatus.MISSING)
 
-    def _process_contents(self, workflow: WorkflowComponent, contents: str, debug_result: dict) -> dict | None:
+    def _parse_contents(self, workflow: WorkflowComponent, contents: str, debug_result: dict) -> tuple[dict | None, WorkflowInstance | None]:
         data = Utils.load_yaml(contents, debug=debug_result)
         if not data or isinstance(data, str):
             self.log.warning(f"Could not load YAML")
-            return None
+            return None, None
 
-        instance = WorkflowInstance(data, workflow.repo)
+        return data, WorkflowInstance(data, workflow.repo)
+
+    def _save_child_workflows(self, workflow: WorkflowComponent, instance: WorkflowInstance) -> None:
         for job in instance.jobs:
             if job.uses:
-                with self.lock:
-                    child_org, child_repo, child_workflow = self._create_child_workflow_from_workflow(job.uses, instance)
-                    # Create a relationship between the 2 workflows
-                    self.database.workflows().link_workflows(workflow, child_workflow)
+                child_org, child_repo, child_workflow = self._create_child_workflow_from_workflow(job.uses, instance)
+                # Create a relationship between the 2 workflows
+                self.database.workflows().link_workflows(workflow, child_workflow)
 
             for step in job.steps:
                 uses = step.uses
@@ -120,13 +122,10 @@ class DownloadHelper:
                 elif uses.startswith('${{'):
                     continue
 
-                with self.lock:
-                    child_org, child_repo, child_workflow = self._create_child_workflow_from_action(uses)
-
-                    # Create a relationship between the 2 workflows
-                    self.database.workflows().link_workflows(workflow, child_workflow)
+                child_org, child_repo, child_workflow = self._create_child_workflow_from_action(uses)
 
-        return data
+                # Create a relationship between the 2 workflows
+                self.database.workflows().link_workflows(workflow, child_workflow)
 
     def _create_child_workflow_from_action(self, uses: str) -> (OrgComponent, RepoComponent, WorkflowComponent):
         org = OrgComponent(uses)
@@ -169,40 +168,51 @@ class DownloadHelper:
             org, repo, workflow = self._create_child_workflow_from_action(uses)
         return org, repo, workflow
 
-    def _save_repo(self, repo: RepoComponent) -> None:
-        with self.lock:
-            self.log.info(f"Saving repository {repo}")
-            if repo.org.id == 0:
-                repo.org.id = self._create_org(repo.org).id
-
-            if len(repo.ref) > 0:
-                repo.poll_status = PollStatus.PENDING
-                repo_db = self.database.repos().create(repo)
-                return
+    def _save_repo(self, repo: RepoComponent, writer: DatabaseWriter | None = None) -> None:
+        # Without a writer the database is used directly by the calling thread.
+        call = writer.call if writer else (lambda function, *args: function(*args))
+        submit = writer.submit if writer else call
 
-            # At this point, there is no `ref` in the object.
-            # Search if the repo is already in the database.
-            repo_db = self.database.repos().find(repo.org.id, repo.name, None)
-            if self._repo_already_stored(repo_db):
-                return
+        needs_fetch, repo_db_id = call(self._prepare_repo, repo)
+        if not needs_fetch:
+            return
 
         # Either there's no database record, or the stored one also has an empty ref.
         fresh_repo = self._fetch_repo(repo)
-        with self.lock:
-            if fresh_repo.org.name.lower() == repo.org.name.lower() and fresh_repo.name.lower() == repo.name.lower():
-                fresh_repo.org.id = repo.org.id
-                fresh_repo.poll_status = PollStatus.SCANNED if repo.status == RepoStatus.MISSING else PollStatus.PENDING
-                if repo_db:
-                    fresh_repo.id = repo_db.id
-                    self.database.repos().update(fresh_repo)
-                else:
-                    self.database.repos().create(fresh_repo)
-                return
-
-            # Here, the fetched repo is different to the one passed to the function, this happens when a repo is redirected.
-            fresh_repo.org.id = self._create_org(fresh_repo.org).id
-            fresh_repo_db = self.database.repos().create(fresh_repo)
-
-            repo.redirect_id = fresh_repo_db.id
-            repo.status = RepoStatus.REDIRECT
+        submit(self._store_repo, repo, fresh_repo, repo_db_id)
+
+    def _prepare_repo(self, repo: RepoComponent) -> tuple[bool, int]:
+        self.log.info(f"Saving repository {repo}")
+        if repo.org.id == 0:
+            repo.org.id = self._create_org(repo.org).id
+
+        if len(repo.ref) > 0:
+            repo.poll_status = PollStatus.PENDING
             self.database.repos().create(repo)
+            return False, 0
+
+        # At this point, there is no `ref` in the object.
+        # Search if the repo is already in the database.
+        repo_db = self.database.repos().find(repo.org.id, repo.name, None)
+        if self._repo_already_stored(repo_db):
+            return False, 0
+        return True, repo_db.id if repo_db else 0
+
+    def _store_repo(self, repo: RepoComponent, fresh_repo: RepoComponent, repo_db_id: int) -> None:
+        if fresh_repo.org.name.lower() == repo.org.name.lower() and fresh_repo.name.lower() == repo.name.lower():
+            fresh_repo.org.id = repo.org.id
+            fresh_repo.poll_status = PollStatus.SCANNED if repo.status == RepoStatus.MISSING else PollStatus.PENDING
+            if repo_db_id:
+                fresh_repo.id = repo_db_id
+                self.database.repos().update(fresh_repo)
+            else:
+                self.database.repos().create(fresh_repo)
+            return
+
+        # Here, the fetched repo is different to the one passed to the function, this happens when a repo is redirected.
+        fresh_repo.org.id = self._create_org(fresh_repo.org).id
+        fresh_repo_db = self.database.repos().create(fresh_repo)
+
+        repo.redirect_id = fresh_repo_db.id
+        repo.status = RepoStatus.REDIRECT
+        self.database.repos().create(repo)
@@ -3,6 +3,7 @@ import argparse
 from src.commands.command import Command
 from src.commands.process.process import ServiceProcess
 from src.database.database import Database
+from src.libs.constants import Engine
 from src.libs.exceptions import InvalidCommandLine
 
 
@@ -15,6 +16,7 @@ class CommandProcess(Command):
 
         subparser.add_argument("--database", default="database.db", type=str, help="Path to SQLite database to create or connect to")
         subparser.add_argument("--threads", default=1, type=int, help="Enable multithreading")
+        subparser.add_argument("--engine", default="threads", choices=["threads", "processes"], help="Processing engine, 'processes' parses workflows in --threads worker processes and scales with CPU cores")
 
         Command.define_shared_arguments(subparser)
 
@@ -23,6 +25,7 @@ class CommandProcess(Command):
             # Strip, remove empty, and duplicates.
             'database': '' if arguments.database is None or len(arguments.database.strip()) == 0 else os.path.realpath(arguments.database.strip()),
             'threads': int(arguments.threads),
+            'engine': Engine[arguments.engine.upper()] if arguments.engine else Engine.THREADS,
         }
 
     def validate_command_arguments(self, arguments: dict) -> None:
@@ -38,9 +41,11 @@ class CommandProcess(Command):
             arguments['threads'] = 1
 
     def execute(self, arguments: dict) -> bool:
-        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'])
+        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'], profile=arguments['db_profile'])
 
         service = ServiceProcess(self.log, database)
         service.threads = arguments['threads']
+        service.engine = arguments['engine']
+        service.profiler = self.create_profiler(arguments, 'process', database)
 
         return service.run()
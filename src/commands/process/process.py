@@ -1,83 +1,148 @@
 import threading
-from contextlib import nullcontext
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import Row
 from src.commands.process.process_helper import ProcessHelper
+from src.commands.process.process_worker import ProcessWorker
 from src.commands.service import Service
-from src.database.models import WorkflowDataModel, JobDataModel, StepDataModel
+from src.database.writer import DatabaseWriter
 from src.libs.components.workflow import WorkflowComponent
-from src.libs.constants import WorkflowStatus, WorkflowType
-from src.libs.exceptions import UnknownWorkflowType
-from src.libs.instances.action import ActionInstance
-from src.libs.instances.workflow import WorkflowInstance
-from src.libs.utils import Utils
+from src.libs.constants import WorkflowStatus, WorkflowType, Engine
+from src.libs.worker_pool import WorkerPool
 
 
 class ServiceProcess(Service, ProcessHelper):
-    lock: threading.Lock = None
     threads: int = None
+    engine: Engine = Engine.THREADS
+    variables_chunk_size: int = 5000
+    # Parsed rows kept per blob, copies of a file are processed one after the other.
+    blob_cache_size: int = 1000
 
-    def run(self) -> bool:
-        # Thanks SQLite3 :>
-        self.lock = threading.Lock() if self.threads > 1 else nullcontext()
+    _worker: ProcessWorker = None
+    _pool: ProcessPoolExecutor | None = None
+    _blob_rows: OrderedDict = None
+    _blob_lock: threading.Lock = None
+    _blob_hits: int = 0
 
+    def run(self) -> bool:
+        self._worker = ProcessWorker()
+        self._blob_rows = OrderedDict()
+        self._blob_lock = threading.Lock()
+        self._blob_hits = 0
+        if self.engine == Engine.PROCESSES:
+            # Spawned rather than forked, the parent has the database open and threads running.
+            self._pool = ProcessPoolExecutor(self.threads, mp_context=multiprocessing.get_context('spawn'))
+            self.log.info(f"Started {self.threads} worker processes")
+
+        try:
+            return self._run()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def _run(self) -> bool:
         self.log.info(f"Processing workflows")
-        self._process_workflows()
+        with self.phase('process_workflows'):
+            self._process_workflows()
+        self.log.info(f"Reused the parsed rows of a shared file for {self._blob_hits} workflows")
 
         self.log.info("Extracting variables")
-        self._extract_variables()
+        with self.phase('extract_variables'):
+            self._extract_variables()
 
         self.log.info("Populating variable value mappings")
-        self._populate_variable_value_mappings()
+        with self.phase('populate_variable_value_mappings'):
+            self._populate_variable_value_mappings()
 
         return True
 
     def _process_workflows(self) -> None:
-        while True:
-            batch = self.database.next_to_process(self.threads)
-            if not batch:
-                break
+        # Data rows are buffered per workflow and written in one INSERT per table by _save_workflow().
+        self.database.set_bulk_mode(True)
+        try:
+            with DatabaseWriter(self.database, self.log) as writer:
+                if self._pool is None:
+                    WorkerPool(self.threads, self.log).run(
+                        lambda count: writer.call(self.database.next_to_process, count),
+                        self._parse_workflow,
+                        lambda workflow, rows: writer.submit(self._save_workflow, workflow, rows),
+                        writer.commit
+                    )
+                else:
+                    # The threads only hand the raw JSON to the worker processes and wait for their rows.
+                    WorkerPool(self.threads, self.log).run(
+                        lambda count: writer.call(self.database.next_raw_to_process, count),
+                        self._parse_workflow_in_pool,
+                        lambda item, rows: writer.submit(self._save_workflow, item[0], rows),
+                        writer.commit,
+                        key=lambda item: item[0].id
+                    )
+        finally:
+            self.database.set_bulk_mode(False)
+
+    def _parse_workflow(self, workflow: WorkflowComponent) -> tuple | None:
+        self.log.info(f"Processing workflow {workflow}")
+        rows = self._cached_rows(workflow)
+        if rows is not None:
+            return rows
 
-            if self.threads == 1:
-                self._process_workflow(batch)
-            else:
-                arguments = [(workflow,) for workflow in batch]
-                Utils.multithread(self._process_workflow, arguments)
+        if not workflow.data and workflow.type != WorkflowType.DOCKER:
+            self.log.error(f"Could not load JSON for {workflow}")
+            return None
 
-            self.database.commit()
+        rows, shared = self._parse_rows(workflow.type, workflow.data, workflow.repo)
+        if shared:
+            self._cache_rows(workflow, rows)
+        return rows
 
-    def _process_workflow(self, workflow: WorkflowComponent) -> bool:
+    def _parse_workflow_in_pool(self, item: tuple[WorkflowComponent, str]) -> tuple | None:
+        workflow, data = item
         self.log.info(f"Processing workflow {workflow}")
-        if not workflow.data and workflow.type != WorkflowType.DOCKER:
+        rows = self._cached_rows(workflow)
+        if rows is not None:
+            return rows
+
+        rows, shared = self._pool.submit(self._worker.parse, workflow.type, data, workflow.repo).result()
+        if rows is None and workflow.type != WorkflowType.DOCKER:
             self.log.error(f"Could not load JSON for {workflow}")
-            with self.lock:
-                self.database.workflows().update_status(workflow.id, WorkflowStatus.ERROR)
+        elif shared:
+            self._cache_rows(workflow, rows)
+        return rows
+
+    def _cached_rows(self, workflow: WorkflowComponent) -> tuple | None:
+        if workflow.blob_id == 0:
+            return None
+
+        key = (workflow.blob_id, workflow.type)
+        with self._blob_lock:
+            rows = self._blob_rows.get(key)
+            if rows is not None:
+                self._blob_rows.move_to_end(key)
+                self._blob_hits += 1
+        return rows
+
+    def _cache_rows(self, workflow: WorkflowComponent, rows: tuple | None) -> None:
+        # The rows are never changed once parsed, every workflow using the blob saves the same ones.
+        if workflow.blob_id == 0 or rows is None:
+            return
+
+        with self._blob_lock:
+            self._blob_rows[(workflow.blob_id, workflow.type)] = rows
+            if len(self._blob_rows) > self.blob_cache_size:
+                self._blob_rows.popitem(last=False)
+
+    def _save_workflow(self, workflow: WorkflowComponent, rows: tuple | None) -> bool:
+        if rows is None and workflow.type != WorkflowType.DOCKER:
+            self.database.workflows().update_status(workflow.id, WorkflowStatus.ERROR)
             return False
 
-        if workflow.type == WorkflowType.WORKFLOW:
-            instance = WorkflowInstance(workflow.data, workflow.repo)
-            with self.lock:
-                for trigger, properties in instance.on_data.items():
-                    self.database.workflows().set_data(workflow.id, 'on', trigger)
-                    for name, value in properties.items():
-                        self.database.workflows().set_data(workflow.id, f"on-{trigger}-{name}", value)
-
-                for name, data in instance.properties(['on', 'jobs']):
-                    self.database.workflows().set_data(workflow.id, name, data)
-
-                for job in instance.jobs:
-                    self._index_job(job, workflow)
-        elif workflow.type == WorkflowType.ACTION:
-            instance = ActionInstance(workflow.data, workflow.repo)
-            with self.lock:
-                self.database.workflows().set_data(workflow.id, 'name', instance.name)
-                self._index_action(instance, workflow)
-
-        elif workflow.type == WorkflowType.DOCKER:
-            pass
-        else:
-            raise UnknownWorkflowType(f"Unknown workflow type for {workflow}")
-
-        with self.lock:
-            self.database.workflows().update_status(workflow.id, WorkflowStatus.PROCESSED)
+        if rows is not None:
+            self._save_rows(workflow, rows)
+
+        self.database.flush_bulk()
+        self.database.workflows().update_status(workflow.id, WorkflowStatus.PROCESSED)
         return True
 
     def _extract_variables(self) -> bool:
@@ -87,33 +152,34 @@ class ServiceProcess(Service, ProcessHelper):
             'step': self.database.steps
         }
 
-        for name, component in items.items():
-            self.log.info(f"Extracting {name} variables")
+        self.database.set_bulk_mode(True)
+        try:
+            for name, component in items.items():
+                self._extract_component_variables(name, component)
+        finally:
+            self.database.set_bulk_mode(False)
+        return True
 
-            id = 0
-            while True:
-                batch = component().find_next_data(id, self.threads)
-                if not batch or len(batch) == 0:
-                    break
+    def _extract_component_variables(self, name: str, component: callable) -> None:
+        self.log.info(f"Extracting {name} variables")
 
-                if self.threads == 1:
-                    self._extract_variables_item(batch[0], name)
-                else:
-                    arguments = [(record, name,) for record in batch]
-                    Utils.multithread(self._extract_variables_item, arguments)
+        # Only rows added since the last run, so re-running after `download --incremental` doesn't duplicate variables.
+        after_id = self.database.vars().last_data_id(name)
 
-                # Get the id of the last item, as it's all returned sorted it'd be the highest one for the next lookup.
-                id = batch[-1].id
+        # Parsing is CPU bound, so without worker processes this runs on the calling thread in large chunks rather than
+        # across --threads.
+        for chunk in component().stream_data(self.variables_chunk_size, after_id):
+            for id, variables in self._chunk_variables(chunk):
+                self.database.vars().create_variables(name, id, variables)
 
-                self.database.commit()
+            self.database.flush_bulk()
+            self.database.commit()
 
-        return True
+    def _chunk_variables(self, chunk: list[Row]) -> list[tuple[int, list]]:
+        rows = [tuple(record) for record in chunk]
+        if self._pool is None:
+            return self._worker.extract_variables(rows)
 
-    def _extract_variables_item(self, data: WorkflowDataModel | JobDataModel | StepDataModel, name: str) -> None:
-        variables = self._extract_variables_from_text(data.value)
-        if data.property == 'env':
-            variables.append(f"env.{data.name}")
-        if len(variables) > 0:
-            with self.lock:
-                self.database.vars().create_variables(name, data.id, variables)
-        return None
+        size = -(-len(rows) // self.threads)
+        results = self._pool.map(self._worker.extract_variables, [rows[i:i + size] for i in range(0, len(rows), size)])
+        return [result for items in results for result in items]
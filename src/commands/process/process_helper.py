@@ -1,72 +1,137 @@
 import re
+from src.database.helpers.db_base import DBBase
+from src.libs.components.repo import RepoComponent
 from src.libs.components.workflow import WorkflowComponent
-from src.libs.constants import VariableMappingType, VariableMappingGroupType
+from src.libs.constants import VariableMappingType, VariableMappingGroupType, WorkflowType
+from src.libs.exceptions import UnknownWorkflowType
 from src.libs.instances.action import ActionInstance
 from src.libs.instances.job import JobInstance
 from src.libs.instances.step import StepInstance
+from src.libs.instances.workflow import WorkflowInstance
 
 
 class ProcessHelper:
-    def _index_action(self, action: ActionInstance, workflow: WorkflowComponent) -> bool:
-        job_db = self.database.jobs().create(workflow.id, 'type', action.type)
-        action.id = job_db.id
+    _expression_pattern: re.Pattern = re.compile(r'\{\{\s*(.*?)\s*\}\}')
+    _unwanted_pattern: re.Pattern = re.compile(r'[!(),\'\"]')
+    _separator_pattern: re.Pattern = re.compile(r'[| ]+')
+    _variable_prefixes: tuple = ('github.', 'secrets.', 'vars.', 'env.', 'inputs.', 'outputs.', 'steps.', 'matrix.', 'needs.', 'runner.')
 
+    def _workflow_rows(self, workflow_type: WorkflowType, data: dict | list, repo: RepoComponent) -> tuple | None:
+        """
+        Parses a workflow or action into plain (property, name, value) rows, so it can run anywhere (threads or worker
+        processes) and only _save_rows() has to touch the database. Returns the workflow rows and a list of
+        (name, shortname, job rows, [(step number, step rows), ...]) for its jobs.
+        """
+        if workflow_type == WorkflowType.WORKFLOW:
+            instance = WorkflowInstance(data, repo)
+            rows = []
+            for trigger, properties in instance.on_data.items():
+                rows += self._data_rows('on', trigger)
+                for name, value in properties.items():
+                    rows += self._data_rows(f"on-{trigger}-{name}", value)
+
+            for name, value in instance.properties(['on', 'jobs']):
+                rows += self._data_rows(name, value)
+
+            return rows, [self._job_rows(job) for job in instance.jobs]
+        elif workflow_type == WorkflowType.ACTION:
+            instance = ActionInstance(data, repo)
+            return self._data_rows('name', instance.name), [self._action_rows(instance)]
+        elif workflow_type == WorkflowType.DOCKER:
+            return None
+        raise UnknownWorkflowType(f"Unknown workflow type {workflow_type}")
+
+    def _parse_rows(self, workflow_type: WorkflowType, data: dict | list, repo: RepoComponent) -> tuple[tuple | None, bool]:
+        """
+        Returns _workflow_rows() and whether they can be shared with every copy of the same file. Local actions
+        (`uses: ./path`) are expanded with the repository and ref of the workflow, so files using them can't be shared.
+        """
+        shared = not self._uses_local_paths(data)
+        return self._workflow_rows(workflow_type, data, repo), shared
+
+    @classmethod
+    def _uses_local_paths(cls, data: any) -> bool:
+        if isinstance(data, dict):
+            for name, value in data.items():
+                if name == 'uses' and isinstance(value, str) and value.startswith('./'):
+                    return True
+                elif cls._uses_local_paths(value):
+                    return True
+        elif isinstance(data, list):
+            return any(cls._uses_local_paths(item) for item in data)
+        return False
+
+    def _action_rows(self, action: ActionInstance) -> tuple:
+        rows = []
         for name, properties in action.inputs.items():
-            self.database.jobs().set_data(action.id, 'input', {'name': name})
-            self.database.jobs().set_data(action.id, f"input-{name}", properties)
+            rows += self._data_rows('input', {'name': name})
+            rows += self._data_rows(f"input-{name}", properties)
 
         for name, properties in action.outputs.items():
-            self.database.jobs().set_data(action.id, 'output', {'name': name})
-            self.database.jobs().set_data(action.id, f"output-{name}", properties)
+            rows += self._data_rows('output', {'name': name})
+            rows += self._data_rows(f"output-{name}", properties)
 
         for name, data in action.properties(['inputs', 'outputs']):
-            self.database.jobs().set_data(action.id, name, data)
-
-        for step in action.steps:
-            self._index_step(step, action)
-
-        return True
-
-    def _index_job(self, job: JobInstance, workflow: WorkflowComponent) -> bool:
-        job_db = self.database.jobs().create(workflow.id, job.name, job.shortname)
-        job.id = job_db.id
+            rows += self._data_rows(name, data)
 
-        self.database.jobs().set_data(job.id, 'runner', job.runners)
+        return 'type', action.type, rows, [self._step_rows(step) for step in action.steps]
 
+    def _job_rows(self, job: JobInstance) -> tuple:
+        rows = self._data_rows('runner', job.runners)
         for name, data in job.properties(['steps']):
-            self.database.jobs().set_data(job.id, name, data)
+            rows += self._data_rows(name, data)
 
-        for step in job.steps:
-            self._index_step(step, job)
+        return job.name, job.shortname, rows, [self._step_rows(step) for step in job.steps]
 
-        return True
+    def _step_rows(self, step: StepInstance) -> tuple:
+        rows = []
+        for name, data in step.properties([]):
+            rows += self._data_rows(name, data)
+        return step.number, rows
 
-    def _index_step(self, step: StepInstance, job: JobInstance | ActionInstance) -> bool:
-        step_db = self.database.steps().create(job.id, step.number)
-        step.id = step_db.id
+    @staticmethod
+    def _data_rows(property: str, data: any) -> list[tuple[str, str, str]]:
+        return [(property, name, value) for name, value in DBBase.expand_data(data)]
 
-        for name, data in step.properties([]):
-            self.database.steps().set_data(step.id, name, data)
+    def _save_rows(self, workflow: WorkflowComponent, rows: tuple) -> None:
+        workflow_rows, jobs = rows
+        self.database.workflows().add_data(workflow.id, workflow_rows)
+
+        for name, shortname, job_rows, steps in jobs:
+            job_id = self.database.jobs().create(workflow.id, name, shortname).id
+            self.database.jobs().add_data(job_id, job_rows)
 
-        return True
+            for number, step_rows in steps:
+                step_id = self.database.steps().create(job_id, number).id
+                self.database.steps().add_data(step_id, step_rows)
 
     def _extract_variables_from_text(self, text: str) -> list:
-        pattern = r'\{\{\s*(.*?)\s*\}\}'
-        variables = re.findall(pattern, text)
+        if '{{' not in text:
+            return []
+
         all_variables = []
-        for variable in variables:
+        for variable in self._expression_pattern.findall(text):
             # Replace any unwanted characters.
             # variable = re.sub(r'[!()\[\],\'\"]', ' ', variable)
-            variable = re.sub(r'[!(),\'\"]', ' ', variable)
+            variable = self._unwanted_pattern.sub(' ', variable)
             # The + ensures that consecutive spaces or pipes are treated as a single separator.
-            parts = re.split(r'[| ]+', variable)
+            parts = self._separator_pattern.split(variable)
             for part in parts:
-                if part.lower().startswith(('github.', 'secrets.', 'vars.', 'env.', 'inputs.', 'outputs.', 'steps.', 'matrix.', 'needs.', 'runner.')):
+                if part.lower().startswith(self._variable_prefixes):
                     all_variables.append(part.strip())
 
         return sorted(set(all_variables))
 
+    def _extract_variables_item(self, property: str, name: str, value: str) -> list:
+        variables = self._extract_variables_from_text(value)
+        if property == 'env':
+            variables.append(f"env.{name}")
+        return variables
+
     def _populate_variable_value_mappings(self) -> None:
+        # The mappings are derived from the variables table, rebuild them rather than appending duplicates.
+        self.database.execute("DELETE FROM variables_value_mapping")
+
         # Write variables from steps.
         sql = f"""
             INSERT INTO variables_value_mapping (
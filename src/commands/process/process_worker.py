@@ -0,0 +1,30 @@
+from src.commands.process.process_helper import ProcessHelper
+from src.libs.components.repo import RepoComponent
+from src.libs.constants import WorkflowType
+from src.libs.serializer import DataSerializer
+
+
+class ProcessWorker(ProcessHelper):
+    """
+    The CPU bound part of `process`, run in worker processes by `--engine processes`. Takes and returns plain values
+    only, so the parent keeps the database to itself and little more than the serialized data and the rows cross the
+    pipe.
+    """
+
+    def parse(self, workflow_type: WorkflowType, data: str | bytes, repo: RepoComponent) -> tuple[tuple | None, bool]:
+        data = DataSerializer.loads(data)
+        if not data and workflow_type != WorkflowType.DOCKER:
+            return None, False
+        return self._parse_rows(workflow_type, data, repo)
+
+    def extract_variables(self, rows: list[tuple[int, str, str, str]]) -> list[tuple[int, list]]:
+        # Workflows sharing a file have the same rows, each distinct one is only parsed once per chunk.
+        cache = {}
+        results = []
+        for id, property, name, value in rows:
+            key = (property, name, value)
+            if key not in cache:
+                cache[key] = self._extract_variables_item(property, name, value)
+            if len(cache[key]) > 0:
+                results.append((id, cache[key]))
+        return results
@@ -20,6 +20,7 @@ class CommandReport(Command):
         subparser.add_argument("--output", required=True, default='', type=str, help="Location to store output files")
         subparser.add_argument("--config", default=None, type=str, help="Configuration file (defaults to default_config.yaml)")
         subparser.add_argument("--custom-query-path", action="append", type=str, help="Path to custom query yaml files")
+        subparser.add_argument("--storage-stats", action="store_true", help="Show the space workflow files take in the database, reads every one of them")
 
         Command.define_shared_arguments(subparser)
 
@@ -31,7 +32,8 @@ class CommandReport(Command):
             'repo': '' if arguments.repo is None or len(arguments.repo.strip()) == 0 else arguments.repo.strip(),
             'config': '' if arguments.config is None else os.path.realpath(arguments.config.strip()),
             'custom_query_paths': [] if arguments.custom_query_path is None else Utils.strip_and_clean_list(arguments.custom_query_path),
-            'custom_queries': []
+            'custom_queries': [],
+            'storage_stats': arguments.storage_stats
         }
 
     def validate_command_arguments(self, arguments: dict) -> None:
@@ -72,12 +74,14 @@ class CommandReport(Command):
             self.log.info(f"Loaded {len(arguments['custom_queries'])} custom queries: {', '.join(arguments['custom_queries'])}")
 
     def execute(self, arguments: dict) -> bool:
-        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'])
+        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'], profile=arguments['db_profile'])
 
         service = ServiceReport(self.log, database)
         service.output_path = arguments['output']
         service.repo = arguments['repo']
         service.config = arguments['config']
         service.custom_queries = arguments['custom_queries']
+        service.storage_stats = arguments['storage_stats']
+        service.profiler = self.create_profiler(arguments, 'report', database)
 
         return service.run()
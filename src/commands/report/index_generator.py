@@ -11,12 +11,35 @@ class IndexGenerator(ReportHelper):
         self.log = log
         self.org = org
 
-    def run(self, outputs: list, output_file: str):
+    def run(self, outputs: list, output_file: str, storage: dict | None = None):
         data = {
             'outputs': outputs,
             'org': self.org.name,
+            'storage': self._storage(storage) if storage else None,
             'template_to_load': 'index'
         }
         html = self.render(data)
         with open(output_file, 'w') as file:
             file.write(html)
+
+    @staticmethod
+    def _size(size: int) -> str:
+        return f"{size / 1048576:,.1f} MB"
+
+    def _storage(self, stats: dict) -> dict:
+        rows = []
+        for name, key in [('Workflow files', 'contents'), ('Parsed workflows', 'data')]:
+            original = stats.get(f"{key}_original", 0)
+            stored = stats.get(f"{key}_stored", 0)
+            rows.append({
+                'name': name,
+                'original': self._size(original),
+                'stored': self._size(stored),
+                'saved': f"{(1 - stored / original) * 100:.0f}%" if original > 0 else '-'
+            })
+        return {
+            'rows': rows,
+            'file_size': self._size(stats.get('file_size', 0)),
+            'blobs': stats.get('blobs', 0),
+            'blob_references': stats.get('blob_references', 0)
+        }
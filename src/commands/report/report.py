@@ -11,6 +11,7 @@ class ServiceReport(Service):
     repo: str = None
     config: dict = None
     custom_queries: list = None
+    storage_stats: bool = False
 
     def run(self) -> bool:
         # First create the output folder if it does not exist.
@@ -29,12 +30,22 @@ class ServiceReport(Service):
 
         outputs = []
         for query_file in (query_files + self.custom_queries):
-            instance = QueryProcessor(self.log, self.database, org, self.output_path, self.config, query_file)
-            output = instance.run()
+            with self.phase(f"query:{os.path.basename(query_file)}"):
+                instance = QueryProcessor(self.log, self.database, org, self.output_path, self.config, query_file)
+                output = instance.run()
             outputs.append(output)
 
+        # Decodes every workflow to get its original size, too slow to do for every report.
+        storage = None
+        if self.storage_stats:
+            with self.phase('storage'):
+                storage = self.database.workflows().storage_stats()
+                storage['file_size'] = self.database.file_size()
+            self.log.info(f"Workflow contents {storage['contents_original']} bytes stored in {storage['contents_stored']}, data {storage['data_original']} bytes stored in {storage['data_stored']}")
+
         index_path = os.path.join(self.output_path, 'index.html')
-        index_generator = IndexGenerator(self.log, org)
-        index_generator.run(outputs, index_path)
+        with self.phase('index'):
+            index_generator = IndexGenerator(self.log, org)
+            index_generator.run(outputs, index_path, storage)
         self.log.success(f"Report generated and saved at {index_path}")
         return True
@@ -4,6 +4,7 @@ from src.commands.secrets_and_variables.secrets_and_variables import ServiceSecr
 from src.commands.command import Command
 from src.database.database import Database
 from src.libs.exceptions import InvalidCommandLine
+from src.github.cache import ResponseCache
 from src.github.client import GitHubClient
 
 
@@ -16,6 +17,8 @@ class CommandSecretsAndVariables(Command):
         subparser.add_argument("--database", default="database.db", type=str, help="Path to SQLite database to create or connect to")
         subparser.add_argument("--resume-next", default=True, action="store_true", help="Resume downloads on server errors")
         subparser.add_argument("--threads", default=1, type=int, help="Enable multithreading")
+        subparser.add_argument("--http-cache", default="", type=str, help="Directory to cache GitHub responses in, re-runs then send conditional requests that don't count against the rate limit")
+        subparser.add_argument("--http-cache-size", default=512, type=int, help="Maximum size of --http-cache in MB")
 
         Command.define_shared_arguments(subparser)
 
@@ -25,6 +28,8 @@ class CommandSecretsAndVariables(Command):
             'database': '' if arguments.database is None or len(arguments.database.strip()) == 0 else os.path.realpath(arguments.database.strip()),
             'resume_next': arguments.resume_next or False,
             'threads': int(arguments.threads),
+            'http_cache': '' if not arguments.http_cache or len(arguments.http_cache.strip()) == 0 else os.path.realpath(arguments.http_cache.strip()),
+            'http_cache_size': int(arguments.http_cache_size),
         }
 
     def validate_command_arguments(self, arguments: dict) -> None:
@@ -40,12 +45,20 @@ class CommandSecretsAndVariables(Command):
         if arguments['threads'] <= 0:
             arguments['threads'] = 1
 
+        if arguments['http_cache_size'] <= 0:
+            raise InvalidCommandLine(f"--http-cache-size must be greater than 0")
+
     def execute(self, arguments: dict) -> bool:
-        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'])
+        database = Database(arguments['database'], arguments['db_debug'], arguments['db_debug_auto_commit'], profile=arguments['db_profile'])
 
         service = ServiceSecretsAndVariables(self.log, database)
-        service.github_client = GitHubClient(self.tokens, self.log)
+        cache = None
+        if len(arguments['http_cache']) > 0:
+            cache = ResponseCache(arguments['http_cache'], arguments['http_cache_size'] * 1024 * 1024)
+
+        service.github_client = GitHubClient(self.tokens, self.log, arguments['threads'], cache)
         service.org = arguments['org']
         service.resume_next = arguments['resume_next']
         service.threads = arguments['threads']
+        service.profiler = self.create_profiler(arguments, 'secrets_and_vars', database, service.github_client._api)
         return service.run()
@@ -1,22 +1,21 @@
-import threading
-import concurrent.futures
-from contextlib import nullcontext
-from src.database.models import OrganisationModel, RepositoryModel
+from src.database.models import OrganisationModel
 from src.libs.constants import SecretVariableCategory, SecretVariableType, SecretVariableVisibility
 from src.libs.components.secvar import SecretVariableComponent
 from src.commands.download.download_helper import DownloadHelper
 from src.commands.service import Service
+from src.database.writer import DatabaseWriter
 from src.github.client import GitHubClient
 from src.github.exceptions import TooManyRequests, ApiRateLimitExceeded, OrgNotFound
 from src.libs.components.org import OrgComponent
+from src.libs.components.repo import RepoComponent
 from src.libs.constants import PollStatus, OrgStatus
 from src.libs.exceptions import InvalidCommandLine
 from src.libs.utils import Utils
+from src.libs.worker_pool import WorkerPool
 
 
 class ServiceSecretsAndVariables(Service, DownloadHelper):
     org: str = None
-    lock: threading.Lock = None
     resume_next: bool = None
     github_client: GitHubClient = None
     threads: int = None
@@ -30,20 +29,19 @@ class ServiceSecretsAndVariables(Service, DownloadHelper):
     ]
 
     def run(self) -> bool:
-        # Thanks SQLite3 :>
-        self.lock = threading.Lock() if self.threads > 1 else nullcontext()
-
         while True:
             try:
                 self.log.info(f"Collecting repositories for {self.org}...")
-                self._collect_targets()
+                with self.phase('collect_targets'):
+                    self._collect_targets()
 
                 org = self.database.orgs().find(self.org)
                 if not org:
                     raise InvalidCommandLine(f"Organisation {self.org} not found")
 
                 self.log.info(f"Collecting secrets and variables for {org.name}")
-                self._collect_secrets_and_variables(org)
+                with self.phase('collect_secrets_and_variables'):
+                    self._collect_secrets_and_variables(org)
 
                 break
             except (TooManyRequests, ApiRateLimitExceeded) as e:
@@ -61,6 +59,8 @@ class ServiceSecretsAndVariables(Service, DownloadHelper):
             self.log.info(f"Total SQL Queries: {self.database.total_queries}")
 
         self.log.info(f"Total API Calls: {self.github_client._api.total_requests}")
+        if self.github_client._api.cache:
+            self.log.info(f"Not Modified (served from --http-cache): {self.github_client._api.cache.stats['hits']}")
         return True
 
     def _collect_targets(self) -> None:
@@ -118,43 +118,48 @@ class ServiceSecretsAndVariables(Service, DownloadHelper):
         self.database.commit()
 
         self.log.info(f"Getting organisation repos")
-        repos = self.database.repos().all(org.id)
+        repos = []
+        for record in self.database.repos().all(org.id):
+            # Workers only get plain components, models expire on commit and would query the database when read.
+            repo = RepoComponent(f"{org.name}/{record.name}")
+            repo.id = record.id
+            repos.append(repo)
         self.log.info(f"Got {len(repos)} repos")
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
-            # Submit all repositories to the executor
-            future_to_repo = {executor.submit(self._fetch_secvar_repo_single, org, repo): repo for repo in repos}
-
-            for future in concurrent.futures.as_completed(future_to_repo):
-                repo = future_to_repo[future]
-                try:
-                    # Retrieve the data returned by fetch_repo_data
-                    returned_repo, components = future.result()
-
-                    # 3. Write to the database safely in the main thread
-                    if components:
-                        self.log.info(f"Writing {len(components)} components to database for {returned_repo.name}")
-                        with self.lock:
-                            for component in components:
-                                self.database.secvars().create(repo.id, component)
-
-                            self.database.commit()
-
-                except Exception as e:
-                    self.log.error(f"Unhandled exception processing repo {repo.name}: {e}")
-
-    def _fetch_secvar_repo_single(self, org: OrganisationModel, repo: RepositoryModel) -> tuple[object, list]:
-        components = []
+        org = OrgComponent.from_model(org)
+        with DatabaseWriter(self.database, self.log) as writer:
+            WorkerPool(self.threads, self.log).run(
+                repos,
+                lambda repo: self._fetch_secvar_repo_single(org, repo),
+                lambda repo, results: writer.submit(self._save_secvar_repo_single, org, repo, results),
+                writer.commit
+            )
+
+    def _fetch_secvar_repo_single(self, org: OrgComponent, repo: RepoComponent) -> list[tuple[dict, list]]:
+        results = []
         self.log.info(f"Getting secrets and variables for {repo.name}")
         for item in self._combinations:
             self.log.info(f"Getting data for repo {repo.name} and {item['label']}")
             try:
-                results = self.github_client.get_secrets(org.name, item['category'], item['type'], None, repo.name)
-                components.extend(self._create_components(org.id, results, item['category'], item['type']))
+                results.append((item, self.github_client.get_secrets(org.name, item['category'], item['type'], None, repo.name)))
             except Exception as e:
                 self.log.warning(f"Could not get {item['label']} for {repo.name}")
 
-        return repo, components
+        return results
+
+    def _save_secvar_repo_single(self, org: OrgComponent, repo: RepoComponent, results: list[tuple[dict, list]]) -> None:
+        try:
+            components = []
+            for item, items in results:
+                components.extend(self._create_components(org.id, items, item['category'], item['type']))
+
+            if components:
+                self.log.info(f"Writing {len(components)} components to database for {repo.name}")
+                for component in components:
+                    self.database.secvars().create(repo.id, component)
+
+        except Exception as e:
+            self.log.error(f"Unhandled exception processing repo {repo.name}: {e}")
 
     def _create_components(self, org_id: int, items: list, category: SecretVariableCategory, type: SecretVariableType) -> list[SecretVariableComponent]:
         components = []
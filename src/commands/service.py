@@ -1,14 +1,21 @@
+from contextlib import nullcontext
 from loguru import logger
 from src.database.database import Database
+from src.libs.profiler import Profiler
 
 
 class Service:
     database: Database = None
     log: logger = None
+    profiler: Profiler = None
 
     def __init__(self, log: logger, database: Database):
         self.log = log
         self.database = database
 
+    def phase(self, name: str):
+        # Without --profile phases cost nothing.
+        return self.profiler.phase(name) if self.profiler else nullcontext()
+
     def run(self) -> bool:
         raise NotImplementedError("Service.run() not implemented")
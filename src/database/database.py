@@ -11,11 +11,12 @@ from src.database.models import Base
 from sqlalchemy import create_engine, Engine, text, MetaData, event
 from sqlalchemy.orm import sessionmaker
 from src.database.helpers.db_orgs import DBOrg
+from src.libs.constants import DatabaseProfile
 from src.libs.exceptions import DatabaseVersionMismatch
 
 
 class Database(DatabaseHelper):
-    __VERSION__: str = '2.0.0'
+    __VERSION__: str = '2.1.0'
     _engine: Engine = None
     _sessionmaker: sessionmaker = None
     _session = None
@@ -29,7 +30,27 @@ class Database(DatabaseHelper):
     _config: DBConfig | None = None
     _secvars: DBSecretsAndVariables | None = None
 
+    # Applied to every new connection. "safe" keeps SQLite's own defaults (rollback journal, fsync on every commit),
+    # "fast" uses WAL with synchronous=NORMAL which only risks the last transactions on an OS crash or power loss.
+    _profiles: dict = {
+        DatabaseProfile.SAFE: {
+            'journal_mode': 'DELETE',
+            'synchronous': 'FULL',
+            'mmap_size': 0,
+            'cache_size': -2000,
+            'temp_store': 'DEFAULT',
+        },
+        DatabaseProfile.FAST: {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 268435456,
+            'cache_size': -65536,
+            'temp_store': 'MEMORY',
+        },
+    }
+
     _total_queries: int = 0
+    _counting_queries: bool = False
     _debug: bool = False
     _auto_commit: bool = False
 
@@ -49,26 +70,51 @@ class Database(DatabaseHelper):
     def auto_commit(self) -> bool:
         return self._auto_commit
 
-    def __init__(self, sqlite_file, debug: bool = False, auto_commit: bool = False, check_version: bool = True):
+    def __init__(self, sqlite_file, debug: bool = False, auto_commit: bool = False, check_version: bool = True, profile: DatabaseProfile = DatabaseProfile.FAST):
         is_new_database = not os.path.exists(sqlite_file)
+        if is_new_database:
+            # A WAL file left behind by a deleted database would otherwise be replayed into the new one.
+            for suffix in ['-wal', '-shm']:
+                if os.path.isfile(sqlite_file + suffix):
+                    os.remove(sqlite_file + suffix)
+
         self._debug = debug
         self._auto_commit = auto_commit
         self._engine = create_engine(f"sqlite:///{sqlite_file}")
+        self._apply_profile(self._engine, self._profiles[profile])
         self._sessionmaker = sessionmaker(bind=self._engine)
         self._session = self._sessionmaker()
 
         if is_new_database:
             self._create_tables()
+        else:
+            self._upgrade_tables()
         self._update_views()
 
         if self.debug:
-            @event.listens_for(Engine, "before_cursor_execute")
-            def count_queries(conn, cursor, statement, parameters, context, executemany):
-                self._total_queries += 1
+            self.count_queries()
 
         if check_version:
             self._check_database_version(self.__VERSION__)
 
+    def count_queries(self) -> None:
+        if self._counting_queries:
+            return
+        self._counting_queries = True
+
+        @event.listens_for(self._engine, "before_cursor_execute")
+        def count_queries(conn, cursor, statement, parameters, context, executemany):
+            self._total_queries += 1
+
+    @staticmethod
+    def _apply_profile(engine: Engine, pragmas: dict) -> None:
+        @event.listens_for(engine, "connect")
+        def set_pragmas(connection, record):
+            cursor = connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+
     def _check_database_version(self, version: str) -> None:
         current_version = self.config().get('db_version')
         if not current_version:
@@ -79,6 +125,17 @@ class Database(DatabaseHelper):
     def _create_tables(self) -> None:
         Base.metadata.create_all(self._engine)
 
+    def _upgrade_tables(self) -> None:
+        if self.config().get('db_version') != '2.0.0':
+            return
+
+        # 2.1.0 keeps the workflow files in `blobs`, shared by every workflow with the same contents.
+        Base.metadata.create_all(self._engine)
+        self.execute("ALTER TABLE workflows ADD COLUMN blob_id INTEGER DEFAULT 0")
+        self.execute("CREATE INDEX ix_workflows_blob_id ON workflows (blob_id)")
+        self.config().set('db_version', self.__VERSION__)
+        self.commit()
+
     def _update_views(self) -> None:
         sql = "DROP VIEW IF EXISTS workflow_tree"
         self.execute(sql)
@@ -140,9 +197,34 @@ class Database(DatabaseHelper):
             self._secvars = DBSecretsAndVariables(self.session, self.auto_commit)
         return self._secvars
 
+    def set_bulk_mode(self, enabled: bool) -> None:
+        # Data rows are buffered and only written on flush_bulk().
+        for helper in [self.workflows(), self.jobs(), self.steps(), self.vars()]:
+            if not enabled:
+                helper.flush_rows()
+            helper.bulk = enabled
+
+    def flush_bulk(self) -> int:
+        return sum(helper.flush_rows() for helper in [self.workflows(), self.jobs(), self.steps(), self.vars()])
+
     def commit(self) -> None:
         self.session.commit()
 
+    def file_size(self) -> int:
+        page_count = self.session.execute(text("PRAGMA page_count")).scalar()
+        page_size = self.session.execute(text("PRAGMA page_size")).scalar()
+        return page_count * page_size
+
+    def vacuum(self) -> None:
+        # Rewritten rows leave free pages behind, only a VACUUM gives them back. It can't run inside a transaction.
+        self.session.commit()
+        with self._engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql("VACUUM")
+
+    def close(self) -> None:
+        self.session.close()
+        self._engine.dispose()
+
     def refresh_record(self, record: any) -> None:
         self.session.refresh(record)
 
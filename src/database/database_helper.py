@@ -84,6 +84,47 @@ class DatabaseHelper:
             return RepoComponent.from_dict(rows[0])
         return [RepoComponent.from_dict(row) for row in rows]
 
+    def repos_to_refresh(self) -> list[RepoComponent]:
+        # Only branches can move, commits never change and tags are treated as immutable.
+        sql = f"""
+            SELECT
+                o.id			AS org_id,
+                o.name			AS org_name,
+                r.id			AS repo_id,
+                r.visibility	AS repo_visibility,
+                r.default_branch    AS repo_default_branch,
+                r.name			AS repo_name,
+                r.ref			AS repo_ref,
+                r.ref_type		AS repo_ref_type,
+                r.resolved_ref	AS repo_resolved_ref,
+                r.resolved_ref_type	AS repo_resolved_ref_type,
+                r.ref_commit	AS repo_ref_commit,
+                r.status		AS repo_status,
+                r.poll_status	AS repo_poll_status,
+                r.redirect_id	AS repo_redirect_id,
+                r.stars         AS repo_stars,
+                r.fork          AS repo_fork,
+                r.archive		AS repo_archive
+            FROM repositories r
+            JOIN organisations o ON o.id = r.org_id
+            WHERE
+                r.poll_status = :poll_status
+                AND r.ref_type = :ref_type
+                AND r.status IN (:ok, :no_workflows)
+            ORDER BY o.name, r.name, r.ref
+        """
+
+        rows = self.select(
+            sql,
+            {
+                'poll_status': PollStatus.SCANNED,
+                'ref_type': GitHubRefType.BRANCH,
+                'ok': RepoStatus.OK,
+                'no_workflows': RepoStatus.NO_WORKFLOWS
+            }
+        )
+        return [RepoComponent.from_dict(row) for row in rows]
+
     def next_workflow_to_download(self, count: int) -> WorkflowComponent | list[WorkflowComponent] | None:
         sql = f"""
             SELECT
@@ -109,11 +150,12 @@ class DatabaseHelper:
                 w.path			AS workflow_path,
                 w.type			AS workflow_type,
                 w.status		AS workflow_status,
-                w.data			AS workflow_data,
-                w.contents      AS workflow_contents
+                w.blob_id		AS workflow_blob_id,
+                COALESCE(b.data, w.data)	AS workflow_data
             FROM workflows      w
             JOIN repositories   r ON r.id = w.repo_id
             JOIN organisations  o ON o.id = r.org_id
+            LEFT JOIN blobs     b ON b.id = w.blob_id
             WHERE
                 w.status = :status
                 AND w.type != :docker
@@ -127,7 +169,8 @@ class DatabaseHelper:
             return WorkflowComponent.from_dict(rows[0])
         return [WorkflowComponent.from_dict(row) for row in rows]
 
-    def next_to_process(self, count: int) -> WorkflowComponent | list[WorkflowComponent] | None:
+    def _select_to_process(self, count: int) -> list:
+        # Copies of the same file come one after the other, so processing only has to remember a few of them.
         sql = f"""
             SELECT
                 o.id			AS org_id,
@@ -152,24 +195,32 @@ class DatabaseHelper:
                 w.path			AS workflow_path,
                 w.type			AS workflow_type,
                 w.status		AS workflow_status,
-                w.data			AS workflow_data,
-                w.contents      AS workflow_contents
+                w.blob_id		AS workflow_blob_id,
+                COALESCE(b.data, w.data)	AS workflow_data
             FROM workflows w
             JOIN repositories   r ON r.id = w.repo_id
             JOIN organisations  o ON o.id = r.org_id
+            LEFT JOIN blobs     b ON b.id = w.blob_id
             WHERE
                 w.status = :status
-            ORDER BY r.id
+            ORDER BY w.blob_id, r.id
             LIMIT {int(count)}
         """
 
-        rows = self.select(sql, {'status': WorkflowStatus.DOWNLOADED})
+        return self.select(sql, {'status': WorkflowStatus.DOWNLOADED})
+
+    def next_to_process(self, count: int) -> WorkflowComponent | list[WorkflowComponent] | None:
+        rows = self._select_to_process(count)
         if len(rows) == 0:
             return None
         elif count == 1:
             return WorkflowComponent.from_dict(rows[0])
         return [WorkflowComponent.from_dict(row) for row in rows]
 
+    def next_raw_to_process(self, count: int) -> list[tuple[WorkflowComponent, str]]:
+        # The data is left as JSON, for worker processes to parse.
+        return [(WorkflowComponent.from_dict(row, includes_contents=False), row['workflow_data']) for row in self._select_to_process(count)]
+
     def next_commit_to_resolve(self, count: int) -> RepoComponent | list[RepoComponent] | None:
         sql = f"""
             SELECT
@@ -231,11 +282,13 @@ class DatabaseHelper:
                 w.path			        AS workflow_path,
                 w.type			        AS workflow_type,
                 w.status		        AS workflow_status,
-                w.data			        AS workflow_data,
-                w.contents			    AS workflow_contents
+                w.blob_id		        AS workflow_blob_id,
+                COALESCE(b.data, w.data)	        AS workflow_data,
+                COALESCE(b.contents, w.contents)    AS workflow_contents
             FROM workflows w
             JOIN repositories r ON r.id = w.repo_id
             JOIN organisations o ON o.id = r.org_id
+            LEFT JOIN blobs b ON b.id = w.blob_id
             WHERE
                 w.id = :workflow_id
         """
@@ -1,14 +1,29 @@
+from collections.abc import Iterator
+from sqlalchemy import insert, or_, select, Row
+
+
 class DBBase:
     _session: any = None
     _auto_commit: bool = False
+    _bulk: bool = False
+    _pending_rows: dict = None
 
     @property
     def session(self):
         return self._session
 
+    @property
+    def bulk(self) -> bool:
+        return self._bulk
+
+    @bulk.setter
+    def bulk(self, value: bool):
+        self._bulk = value
+
     def __init__(self, session: any, auto_commit: bool):
         self._session = session
         self._auto_commit = auto_commit
+        self._pending_rows = {}
 
     def save(self) -> None:
         self.session.flush()
@@ -22,3 +37,49 @@ class DBBase:
         result = self.session.execute(statement)
         self.save()
         return result.rowcount
+
+    def add_rows(self, model: any, rows: list[dict]) -> None:
+        # In bulk mode rows are kept until flush_rows() is called, and then written with one INSERT per table.
+        self._pending_rows.setdefault(model, []).extend(rows)
+        if not self.bulk:
+            self.flush_rows()
+
+    def flush_rows(self) -> int:
+        total = 0
+        for model, rows in self._pending_rows.items():
+            if len(rows) == 0:
+                continue
+            self.session.execute(insert(model), rows)
+            total += len(rows)
+        self._pending_rows = {}
+
+        if total > 0:
+            self.save()
+        return total
+
+    @staticmethod
+    def expand_data(data: any) -> list[tuple[str, str]]:
+        # Dicts are stored as name/value pairs, lists and scalars as values without a name.
+        if isinstance(data, dict):
+            return [(name, str(value)) for name, value in data.items()]
+        elif isinstance(data, list):
+            return [('', str(value)) for value in data]
+        return [('', str(data))]
+
+    def _stream_data(self, model: any, chunk_size: int, after_id: int = 0) -> Iterator[list[Row]]:
+        # Keyset pagination over the rows that may hold variables. Every chunk is read in full before it's yielded, so
+        # the caller is free to write and commit in between chunks.
+        last_id = after_id
+        while True:
+            statement = (
+                select(model.id, model.property, model.name, model.value)
+                .where(model.id > last_id, or_(model.property == 'env', model.value.like('%{{%')))
+                .order_by(model.id)
+                .limit(chunk_size)
+                .execution_options(yield_per=min(chunk_size, 1000))
+            )
+            rows = [row for partition in self.session.execute(statement).partitions() for row in partition]
+            if len(rows) == 0:
+                return
+            yield rows
+            last_id = rows[-1].id
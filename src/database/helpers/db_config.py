@@ -4,14 +4,17 @@ from src.database.models import ConfigModel
 
 
 class DBConfig(DBBase):
-    def get(self, name: str, default: any = None) -> ConfigModel:
-        record = self.session.query(ConfigModel).filter(
+    def find(self, name: str) -> ConfigModel | None:
+        return self.session.query(ConfigModel).filter(
             func.lower(ConfigModel.name) == func.lower(name)
         ).first()
+
+    def get(self, name: str, default: any = None) -> ConfigModel:
+        record = self.find(name)
         return record.value if record else default
 
     def set(self, name: str, value: str | int) -> None:
-        record = self.get(name)
+        record = self.find(name)
         if not record:
             record = ConfigModel(name=name, value=value)
             self.add(record)
@@ -1,4 +1,5 @@
-from sqlalchemy import and_, or_
+from collections.abc import Iterator
+from sqlalchemy import and_, or_, Row
 from src.database.helpers.db_base import DBBase
 from src.database.models import JobModel, JobDataModel
 from src.libs.exceptions import MissingComponentDetails
@@ -29,18 +30,11 @@ class DBJob(DBBase):
         return record
 
     def set_data(self, id: int, property: str, data: any) -> None:
-        if isinstance(data, dict):
-            for name, value in data.items():
-                item = JobDataModel(job_id=id, property=property, name=name, value=str(value))
-                self.add(item)
-        elif isinstance(data, list):
-            for value in data:
-                item = JobDataModel(job_id=id, property=property, name='', value=str(value))
-                self.add(item)
-        else:
-            item = JobDataModel(job_id=id, property=property, name='', value=str(data))
-            self.add(item)
-        self.save()
+        rows = [{'job_id': id, 'property': property, 'name': name, 'value': value} for name, value in self.expand_data(data)]
+        self.add_rows(JobDataModel, rows)
+
+    def add_data(self, id: int, rows: list[tuple[str, str, str]]) -> None:
+        self.add_rows(JobDataModel, [{'job_id': id, 'property': property, 'name': name, 'value': value} for property, name, value in rows])
 
     def delete_data(self, id: int) -> None:
         self.session.query(JobDataModel).filter_by(job_id=id).delete()
@@ -59,6 +53,9 @@ class DBJob(DBBase):
                 ).order_by(JobDataModel.id).limit(count).all()
             )
 
+    def stream_data(self, chunk_size: int, after_id: int = 0) -> Iterator[list[Row]]:
+        return self._stream_data(JobDataModel, chunk_size, after_id)
+
     def count(self) -> int:
         return self.session.query(JobModel).count()
 
@@ -64,6 +64,12 @@ class DBRepo(DBBase):
         ).values(poll_status=poll_status)
         self.update_statement(statement)
 
+    def set_ref_commit(self, id: int, ref_commit: str) -> None:
+        statement = update(RepositoryModel).where(
+            RepositoryModel.id == id
+        ).values(ref_commit=ref_commit)
+        self.update_statement(statement)
+
     def update(self, repo: RepoComponent) -> None:
         if repo.id == 0:
             raise MissingComponentDetails("Missing component details: repo.id")
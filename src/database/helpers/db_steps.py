@@ -1,4 +1,5 @@
-from sqlalchemy import and_, or_
+from collections.abc import Iterator
+from sqlalchemy import and_, or_, Row
 from src.database.helpers.db_base import DBBase
 from src.database.models import StepModel, StepDataModel
 from src.libs.exceptions import MissingComponentDetails
@@ -25,18 +26,11 @@ class DBStep(DBBase):
         return record
 
     def set_data(self, id: int, property: str, data: any) -> None:
-        if isinstance(data, dict):
-            for name, value in data.items():
-                item = StepDataModel(step_id=id, property=property, name=name, value=str(value))
-                self.add(item)
-        elif isinstance(data, list):
-            for value in data:
-                item = StepDataModel(step_id=id, property=property, name='', value=str(value))
-                self.add(item)
-        else:
-            item = StepDataModel(step_id=id, property=property, name='', value=str(data))
-            self.add(item)
-        self.save()
+        rows = [{'step_id': id, 'property': property, 'name': name, 'value': value} for name, value in self.expand_data(data)]
+        self.add_rows(StepDataModel, rows)
+
+    def add_data(self, id: int, rows: list[tuple[str, str, str]]) -> None:
+        self.add_rows(StepDataModel, [{'step_id': id, 'property': property, 'name': name, 'value': value} for property, name, value in rows])
 
     def delete_data(self, id: int) -> None:
         self.session.query(StepDataModel).filter_by(step_id=id).delete()
@@ -55,6 +49,9 @@ class DBStep(DBBase):
                 ).order_by(StepDataModel.id).limit(count).all()
             )
 
+    def stream_data(self, chunk_size: int, after_id: int = 0) -> Iterator[list[Row]]:
+        return self._stream_data(StepDataModel, chunk_size, after_id)
+
     def count(self) -> int:
         return self.session.query(StepModel).count()
 
@@ -1,3 +1,4 @@
+from sqlalchemy import func
 from src.database.helpers.db_base import DBBase
 from src.database.models import VariableModel
 
@@ -25,12 +26,24 @@ class DBVars(DBBase):
         if workflow_data_id <= 0 and job_data_id <= 0 and step_data_id <= 0:
             raise ValueError("All of workflow, job, and step data ids are empty")
 
-        for name in variables:
-            variable = VariableModel(name=name, workflow_data_id=workflow_data_id, job_data_id=job_data_id, step_data_id=step_data_id)
-            self.add(variable)
-
-        self.save()
+        rows = [
+            {'name': name, 'workflow_data_id': workflow_data_id, 'job_data_id': job_data_id, 'step_data_id': step_data_id}
+            for name in variables
+        ]
+        self.add_rows(VariableModel, rows)
         return True
 
+    def last_data_id(self, name: str) -> int:
+        """
+        Highest data id that has variables. New data rows always get a higher id than the existing ones, so the rows past it
+        haven't been extracted yet.
+        """
+        columns = {
+            'workflow': VariableModel.workflow_data_id,
+            'job': VariableModel.job_data_id,
+            'step': VariableModel.step_data_id
+        }
+        return self.session.query(func.max(columns[name.rstrip('s')])).scalar() or 0
+
     def count(self) -> int:
         return self.session.query(VariableModel).count()
@@ -1,20 +1,35 @@
-import json
-from sqlalchemy import and_, or_
-from sqlalchemy import func, update
+from collections.abc import Iterator
+from sqlalchemy import and_, or_, Row
+from sqlalchemy import func, update, delete, select
 from src.database.helpers.db_base import DBBase
-from src.database.models import WorkflowModel, WorkflowRelationshipModel, WorkflowDataModel
+from src.database.models import (
+    WorkflowModel, BlobModel, WorkflowRelationshipModel, WorkflowDataModel, JobModel, JobDataModel, StepModel, StepDataModel, VariableModel
+)
 from src.libs.components.workflow import WorkflowComponent
+from src.libs.compressor import Compressor
 from src.libs.constants import WorkflowStatus, WorkflowType
+from src.libs.serializer import DataSerializer
 from src.libs.exceptions import MissingComponentDetails
+from src.libs.utils import Utils
 
 
 class DBWorkflow(DBBase):
+    data_format: str = DataSerializer.default
+    contents_compression: str = Compressor.NONE
+
     def find(self, repo_id: int, path: str) -> WorkflowModel | None:
         return self.session.query(WorkflowModel).filter(
             WorkflowModel.repo_id == repo_id,
             func.lower(WorkflowModel.path) == func.lower(path)
         ).first()
 
+    def find_action(self, repo_id: int, path: str) -> WorkflowModel | None:
+        paths = [f"{path}/{name}" if path else name for name in ['action.yml', 'action.yaml', 'Dockerfile']]
+        return self.session.query(WorkflowModel).filter(
+            WorkflowModel.repo_id == repo_id,
+            func.lower(WorkflowModel.path).in_([path.lower() for path in paths])
+        ).first()
+
     def create(self, workflow: WorkflowComponent) -> WorkflowModel:
         if workflow.repo.id == 0:
             raise MissingComponentDetails("Missing component details: workflow.repo.id")
@@ -22,14 +37,17 @@ class DBWorkflow(DBBase):
             raise MissingComponentDetails("Missing component details: workflow.repo.org.id")
 
         record = self.find(workflow.repo.id, workflow.path)
+        if not record and workflow.type == WorkflowType.ACTION:
+            # Actions get their file name appended once downloaded, look for that so they're not stored twice.
+            record = self.find_action(workflow.repo.id, workflow.path)
         if not record:
             record = WorkflowModel(
                 repo_id=workflow.repo.id,
                 redirect_id=workflow.redirect_id,
                 path=workflow.path,
                 type=workflow.type,
-                contents=workflow.contents,
-                data=workflow.data_string,
+                contents=Compressor.compress(workflow.contents, self.contents_compression),
+                data=DataSerializer.dumps(workflow.data, self.data_format) if workflow.data else '',
                 status=workflow.status
             )
             self.add(record)
@@ -77,14 +95,45 @@ class DBWorkflow(DBBase):
         if not data:
             data = {}
 
+        if contents:
+            # The same file on other branches, tags and forks is only stored once.
+            values = {'contents': None, 'data': None, 'blob_id': self.store_blob(contents, data)}
+        else:
+            values = {'contents': contents, 'data': DataSerializer.dumps(data, self.data_format), 'blob_id': 0}
+
         statement = update(WorkflowModel).where(
             WorkflowModel.id == id
-        ).values(
-            contents=contents,
-            data=json.dumps(data)
-        )
+        ).values(**values)
         self.update_statement(statement)
 
+    def store_blob(self, contents: str, data: dict | str) -> int:
+        """
+        Returns the id of the blob holding `contents`, storing it with its parsed `data` when it's new. Blobs are keyed by
+        the hash of the contents, the data of a file is the same wherever it was found.
+        """
+        hash = Utils.sha256(contents)
+        blob_id = self.session.execute(select(BlobModel.id).where(BlobModel.hash == hash)).scalar()
+        if blob_id is None:
+            record = BlobModel(
+                hash=hash,
+                contents=Compressor.compress(contents, self.contents_compression),
+                data=DataSerializer.dumps(data, self.data_format)
+            )
+            self.add(record)
+            self.save()
+            blob_id = record.id
+        return blob_id
+
+    def prune_blobs(self) -> int:
+        # Blobs left behind by workflows that were reset or changed since.
+        statement = delete(BlobModel).where(
+            ~select(WorkflowModel.id).where(WorkflowModel.blob_id == BlobModel.id).exists()
+        )
+        return self.update_statement(statement)
+
+    def blob_count(self) -> int:
+        return self.session.query(BlobModel).count()
+
     def update_redirect_id(self, id: int, redirect_id: int) -> None:
         if id == 0:
             raise MissingComponentDetails("Missing workflow component details: id")
@@ -112,20 +161,46 @@ class DBWorkflow(DBBase):
         self.save()
         return True
 
-    def set_data(self, id: int, property: str, data: any) -> None:
-        if isinstance(data, dict):
-            for name, value in data.items():
-                item = WorkflowDataModel(workflow_id=id, property=property, name=name, value=str(value))
-                self.add(item)
-        elif isinstance(data, list):
-            for value in data:
-                item = WorkflowDataModel(workflow_id=id, property=property, name='', value=str(value))
-                self.add(item)
-        else:
-            item = WorkflowDataModel(workflow_id=id, property=property, name='', value=str(data))
-            self.add(item)
+    def reset(self, id: int, status: WorkflowStatus) -> None:
+        """
+        Removes everything downloaded and processed for a workflow, so it's fetched again when `status` is NONE.
+        """
+        if id == 0:
+            raise MissingComponentDetails("Missing workflow component details: id")
+
+        job_ids = select(JobModel.id).where(JobModel.workflow_id == id)
+        step_ids = select(StepModel.id).where(StepModel.job_id.in_(job_ids))
+        workflow_data_ids = select(WorkflowDataModel.id).where(WorkflowDataModel.workflow_id == id)
+        job_data_ids = select(JobDataModel.id).where(JobDataModel.job_id.in_(job_ids))
+        step_data_ids = select(StepDataModel.id).where(StepDataModel.step_id.in_(step_ids))
+
+        # Children first, every subquery above depends on the rows of its parent table.
+        for statement in [
+            delete(VariableModel).where(
+                or_(
+                    VariableModel.workflow_data_id.in_(workflow_data_ids),
+                    VariableModel.job_data_id.in_(job_data_ids),
+                    VariableModel.step_data_id.in_(step_data_ids)
+                )
+            ),
+            delete(StepDataModel).where(StepDataModel.step_id.in_(step_ids)),
+            delete(StepModel).where(StepModel.job_id.in_(job_ids)),
+            delete(JobDataModel).where(JobDataModel.job_id.in_(job_ids)),
+            delete(JobModel).where(JobModel.workflow_id == id),
+            delete(WorkflowDataModel).where(WorkflowDataModel.workflow_id == id),
+            delete(WorkflowRelationshipModel).where(WorkflowRelationshipModel.parent_id == id),
+            update(WorkflowModel).where(WorkflowModel.id == id).values(contents=None, data=None, blob_id=0, status=status)
+        ]:
+            self.session.execute(statement)
         self.save()
 
+    def set_data(self, id: int, property: str, data: any) -> None:
+        rows = [{'workflow_id': id, 'property': property, 'name': name, 'value': value} for name, value in self.expand_data(data)]
+        self.add_rows(WorkflowDataModel, rows)
+
+    def add_data(self, id: int, rows: list[tuple[str, str, str]]) -> None:
+        self.add_rows(WorkflowDataModel, [{'workflow_id': id, 'property': property, 'name': name, 'value': value} for property, name, value in rows])
+
     def delete_data(self, id: int) -> None:
         self.session.query(WorkflowDataModel).filter_by(workflow_id=id).delete()
         self.save()
@@ -143,8 +218,102 @@ class DBWorkflow(DBBase):
                 ).order_by(WorkflowDataModel.id).limit(count).all()
             )
 
+    def stream_data(self, chunk_size: int, after_id: int = 0) -> Iterator[list[Row]]:
+        return self._stream_data(WorkflowDataModel, chunk_size, after_id)
+
+    def _stream_storage(self, model: any, chunk_size: int) -> Iterator[list[Row]]:
+        last_id = 0
+        while True:
+            statement = (
+                select(model.id, model.contents, model.data)
+                .where(model.id > last_id)
+                .order_by(model.id)
+                .limit(chunk_size)
+            )
+            rows = self.session.execute(statement).all()
+            if len(rows) == 0:
+                return
+            yield rows
+            last_id = rows[-1].id
+
+    def storage_stats(self, chunk_size: int = 1000) -> dict:
+        """
+        Bytes stored for the contents and data of all workflows, against what they'd take as plain text with a copy per
+        workflow. Codecs and formats count stored values, a blob only once.
+        """
+        stats = {
+            'workflows': self.count(),
+            'blobs': 0,
+            'blob_references': 0,
+            'contents_stored': 0,
+            'contents_original': 0,
+            'data_stored': 0,
+            'data_original': 0,
+            'codecs': {},
+            'formats': {}
+        }
+        references = dict(self.session.execute(
+            select(WorkflowModel.blob_id, func.count()).where(WorkflowModel.blob_id > 0).group_by(WorkflowModel.blob_id)
+        ).all())
+
+        for model in [WorkflowModel, BlobModel]:
+            for rows in self._stream_storage(model, chunk_size):
+                for row in rows:
+                    copies = 1
+                    if model is BlobModel:
+                        copies = references.get(row.id, 0)
+                        stats['blobs'] += 1
+                        stats['blob_references'] += copies
+
+                    if row.contents:
+                        codec = Compressor.codec_of(row.contents)
+                        stats['codecs'][codec] = stats['codecs'].get(codec, 0) + 1
+                        stats['contents_stored'] += len(row.contents) if isinstance(row.contents, bytes) else len(row.contents.encode('utf-8'))
+                        stats['contents_original'] += Compressor.original_size(row.contents) * copies
+                    if row.data:
+                        format = DataSerializer.format_of(row.data)
+                        stats['formats'][format] = stats['formats'].get(format, 0) + 1
+                        if isinstance(row.data, bytes):
+                            stats['data_stored'] += len(row.data)
+                            stats['data_original'] += len(DataSerializer.dumps(DataSerializer.loads(row.data), DataSerializer.JSON).encode('utf-8')) * copies
+                        else:
+                            stats['data_stored'] += len(row.data.encode('utf-8'))
+                            stats['data_original'] += len(row.data.encode('utf-8')) * copies
+        return stats
+
+    def recompress(self, codec: str, data_format: str | None = None, chunk_size: int = 1000) -> int:
+        """
+        Rewrites the contents (and the data, when `data_format` is set) of every workflow and blob that isn't stored that
+        way yet. Commits after every chunk, so it can be stopped and started again.
+        """
+        total = 0
+        for model in [WorkflowModel, BlobModel]:
+            for rows in self._stream_storage(model, chunk_size):
+                total += self._recompress_rows(model, rows, codec, data_format)
+                self.session.commit()
+        return total
+
+    def _recompress_rows(self, model: any, rows: list[Row], codec: str, data_format: str | None) -> int:
+        updates = []
+        for row in rows:
+            values = {}
+            if row.contents and Compressor.codec_of(row.contents) != codec:
+                values['contents'] = Compressor.compress(Compressor.decompress(row.contents), codec)
+            if data_format and row.data and DataSerializer.format_of(row.data) != data_format:
+                values['data'] = DataSerializer.dumps(DataSerializer.loads(row.data), data_format)
+            if values:
+                updates.append({'id': row.id, **values})
+
+        # Rows only carry the columns they change, one UPDATE per set of columns.
+        for columns in {tuple(sorted(item)) for item in updates}:
+            self.session.execute(update(model), [item for item in updates if tuple(sorted(item)) == columns])
+        return len(updates)
+
     def count(self) -> int:
         return self.session.query(WorkflowModel).count()
 
+    def all(self, repo_id: int) -> any:
+        return self.session.query(WorkflowModel).filter(WorkflowModel.repo_id == repo_id).all()
+
     def workflowdata_count(self) -> int:
         return self.session.query(WorkflowDataModel).count()
@@ -45,6 +45,15 @@ class WorkflowModel(Base):
     contents = Column(Text)
     data = Column(Text)
     status = Column(Integer, default=0, index=True)
+    blob_id = Column(Integer, default=0, index=True)
+
+class BlobModel(Base):
+    __tablename__ = 'blobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash = Column(String, default='', unique=True, index=True)
+    contents = Column(Text)
+    data = Column(Text)
 
 class WorkflowRelationshipModel(Base):
     __tablename__ = 'workflow_relationships'
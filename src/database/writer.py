@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from loguru import logger
+from src.database.database import Database
+from src.libs.constants import DatabaseCommandType
+
+
+class DatabaseCommand:
+    type: DatabaseCommandType = None
+    function: Callable | None = None
+    args: tuple = None
+    future: Future | None = None
+
+    def __init__(self, type: DatabaseCommandType, function: Callable | None = None, args: tuple = (), future: Future | None = None):
+        self.type = type
+        self.function = function
+        self.args = args
+        self.future = future
+
+
+class DatabaseWriter:
+    """
+    Dedicated thread that owns the database session while it is running.
+
+    Writes are queued with submit() and the caller carries on straight away, reads (or anything that needs a return
+    value) are queued with call() and wait for their result. Commands run in the order they were queued, so a read
+    always sees every write queued before it. Writes are committed in groups of `batch_size`, or on commit().
+    """
+    database: Database = None
+    log: logger = None
+    batch_size: int = 500
+
+    def __init__(self, database: Database, log: logger, batch_size: int | None = None):
+        self.database = database
+        self.log = log
+        self.batch_size = batch_size or self.batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._error = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'writes': 0,
+            'reads': 0,
+            'transactions': 0,
+            'max_queue': 0,
+            'blocked': 0.0,
+        }
+
+    @property
+    def stats(self) -> dict:
+        return self._stats
+
+    def __enter__(self) -> 'DatabaseWriter':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop(raise_error=exc_type is None)
+
+    def start(self) -> 'DatabaseWriter':
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, function: Callable, *args) -> None:
+        self._raise_error()
+        self._put(DatabaseCommand(DatabaseCommandType.WRITE, function, args))
+
+    def call(self, function: Callable, *args) -> any:
+        self._raise_error()
+        command = DatabaseCommand(DatabaseCommandType.READ, function, args, Future())
+        start = time.perf_counter()
+        self._put(command)
+        try:
+            return command.future.result()
+        finally:
+            with self._stats_lock:
+                self._stats['blocked'] += time.perf_counter() - start
+
+    def commit(self) -> None:
+        self._put(DatabaseCommand(DatabaseCommandType.COMMIT))
+
+    def flush(self) -> None:
+        # Wait until everything queued so far has been written and committed.
+        command = DatabaseCommand(DatabaseCommandType.COMMIT, future=Future())
+        self._put(command)
+        command.future.result()
+
+    def stop(self, raise_error: bool = True) -> None:
+        if self._thread is None:
+            return
+
+        self._put(DatabaseCommand(DatabaseCommandType.STOP))
+        self._thread.join()
+        self._thread = None
+
+        self.log.debug(
+            f"Database writer: {self._stats['writes']} writes and {self._stats['reads']} reads in "
+            f"{self._stats['transactions']} transactions, max queue {self._stats['max_queue']}, "
+            f"callers blocked for {self._stats['blocked']:.2f}s"
+        )
+        if raise_error:
+            self._raise_error()
+
+    def _put(self, command: DatabaseCommand) -> None:
+        self._queue.put(command)
+        self._stats['max_queue'] = max(self._stats['max_queue'], self._queue.qsize())
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        pending = 0
+        while True:
+            command = self._queue.get()
+            if command.type == DatabaseCommandType.STOP:
+                if pending > 0 and self._error is None:
+                    self._commit()
+                return
+
+            try:
+                if self._error is not None:
+                    # Something already failed, don't write anything else, and let callers know.
+                    if command.future:
+                        command.future.set_exception(self._error)
+                    continue
+
+                if command.type == DatabaseCommandType.COMMIT:
+                    self._commit()
+                    pending = 0
+                    if command.future:
+                        command.future.set_result(None)
+                elif command.type == DatabaseCommandType.READ:
+                    self._stats['reads'] += 1
+                    command.future.set_result(command.function(*command.args))
+                else:
+                    self._stats['writes'] += 1
+                    command.function(*command.args)
+                    pending += 1
+                    if pending >= self.batch_size:
+                        self._commit()
+                        pending = 0
+            except Exception as e:
+                self._error = e
+                if command.future:
+                    command.future.set_exception(e)
+
+    def _commit(self) -> None:
+        self.database.commit()
+        self._stats['transactions'] += 1
@@ -1,15 +1,21 @@
+from collections.abc import Callable
+from email.utils import parsedate_to_datetime
 from json import JSONDecodeError
-import requests
 import time
 import jwt
 from loguru import logger
 from requests.models import Response
 from src.github.api_helper import GitHubApiHelper
+from src.github.cache import ResponseCache
 from src.github.exceptions import (
     ApiRateLimitExceeded, HttpAccessBlocked, HttpEmptyRepo,
     HttpNotFound, HttpNoCommitFound, HttpInvalidState,
     HttpInvalidRequest, HttpTooManyRequests, HttpUnknownError
 )
+from src.github.limiter import ConcurrencyLimiter
+from src.github.metrics import ApiMetrics
+from src.github.session import HttpSession
+from src.github.token import TokenInstance
 from src.github.token_manager import TokenManager
 
 
@@ -17,14 +23,33 @@ class GitHubApi(GitHubApiHelper):
     _token_manager: TokenManager = None
     _api_endpoint: str = 'https://api.github.com'
     _total_requests: int = 0
+    _cache: ResponseCache = None
+    _limiter: ConcurrencyLimiter = None
+    _metrics: ApiMetrics = None
     log: logger = None
 
     @property
     def token_manager(self) -> TokenManager:
         return self._token_manager
 
-    def __init__(self, access_tokens: list[str], log: logger):
+    @property
+    def cache(self) -> ResponseCache | None:
+        return self._cache
+
+    @property
+    def limiter(self) -> ConcurrencyLimiter:
+        return self._limiter
+
+    @property
+    def metrics(self) -> ApiMetrics:
+        return self._metrics
+
+    def __init__(self, access_tokens: list[str], log: logger, threads: int = 1, cache: ResponseCache | None = None):
         self.log = log
+        self._cache = cache
+        HttpSession.configure(threads)
+        self._limiter = ConcurrencyLimiter(threads)
+        self._metrics = ApiMetrics()
         self._token_manager = TokenManager(access_tokens, log)
         self._load_debug()
 
@@ -40,11 +65,11 @@ class GitHubApi(GitHubApiHelper):
             return url
         return self._api_endpoint.rstrip('/') + '/' + url.lstrip('/')
 
-    def _headers(self, authenticated: bool, additional_headers: dict | None) -> dict[str, str]:
+    def _headers(self, token: TokenInstance | None, additional_headers: dict | None) -> dict[str, str]:
         headers = {}
-        if authenticated:
+        if token:
             headers = {
-                'Authorization': f"token {self.token_manager.instance().access_token}",
+                'Authorization': f"token {token.access_token}",
                 'Accept': 'application/vnd.github.v3+json'
             }
 
@@ -54,26 +79,45 @@ class GitHubApi(GitHubApiHelper):
         return headers
 
     def get(self, url: str, params: dict | None = None, additional_headers: dict | None = None, response_headers: dict | None = None, authenticated: bool = True, is_retry: bool = False, return_raw: bool = False) -> dict | list | str:
-        headers = self._headers(authenticated, additional_headers)
+        token = self.token_manager.instance() if authenticated else None
+        headers = self._headers(token, additional_headers)
         endpoint = self._endpoint(url)
 
-        try:
-            self._increase_request_counter()
-            response = requests.get(endpoint, params=params, headers=headers, timeout=(5, None))
-        except Exception as e:
-            self.log.error(f"Error while getting {url}: {e}")
-            self.log.warning(f"Trying to fetch {url} again")
-            # Try again, could be a random connection error.
-            self._increase_request_counter()
-            response = requests.get(endpoint, params=params, headers=headers, timeout=(5, None))
+        cache_key = None
+        cached = None
+        if self.cache:
+            cache_key = self.cache.key(endpoint, params, headers)
+            cached = self.cache.load(cache_key)
+            if cached:
+                headers.update(self.cache.conditional_headers(cached))
+
+        def send() -> Response:
+            try:
+                self._increase_request_counter()
+                return HttpSession.get(endpoint, params=params, headers=headers, timeout=(5, None))
+            except Exception as e:
+                self.log.error(f"Error while getting {url}: {e}")
+                self.log.warning(f"Trying to fetch {url} again")
+                # Try again, could be a random connection error.
+                self.metrics.record_retry(url)
+                self._increase_request_counter()
+                return HttpSession.get(endpoint, params=params, headers=headers, timeout=(5, None))
+
+        response = self._send(url, send)
 
         self._save_debug(url, params, additional_headers, authenticated, response)
+        self._update_token(token, response)
+
+        if self.cache:
+            if response.status_code == 304 and cached:
+                response = self.cache.hit(cache_key, cached)
+            else:
+                self.cache.store(cache_key, response)
 
         if self._is_api_rate_limit_error(response):
             if is_retry:
                 raise ApiRateLimitExceeded()
-            # Refresh API keys and try again.
-            self.refresh_tokens()
+            # The headers marked the token as exhausted, so the retry goes to another one (or waits for a reset).
             return self.get(url, params, additional_headers, response_headers, authenticated, True)
 
         # Return by reference.
@@ -93,6 +137,94 @@ class GitHubApi(GitHubApiHelper):
         # Error handling.
         self._raise_exception(response)
 
+    def stream(self, url: str) -> Response:
+        # For large downloads (archives), the caller reads and closes the response.
+        token = self.token_manager.instance()
+        headers = self._headers(token, None)
+
+        def send() -> Response:
+            self._increase_request_counter()
+            return HttpSession.get(self._endpoint(url), headers=headers, stream=True, timeout=(5, None))
+
+        response = self._send(url, send)
+        self._update_token(token, response)
+        if response.status_code != 200:
+            # Error bodies are small, reading them also releases the connection.
+            _ = response.content
+            self._raise_exception(response)
+        return response
+
+    def graphql(self, query: str, variables: dict | None = None) -> dict:
+        token = self.token_manager.instance()
+        headers = self._headers(token, None)
+
+        def send() -> Response:
+            self._increase_request_counter()
+            return HttpSession.post(self._endpoint('/graphql'), json={'query': query, 'variables': variables or {}}, headers=headers, timeout=(5, None))
+
+        response = self._send('/graphql', send)
+        self._update_token(token, response)
+
+        if response.status_code != 200:
+            self._raise_exception(response)
+
+        result = response.json()
+        # Partial errors (a repository that doesn't exist, etc) still return data for everything else.
+        if not result.get('data'):
+            raise HttpUnknownError(f"GraphQL query failed with {result.get('errors', response.text)}")
+        return result['data']
+
+    def _send(self, url: str, send: Callable[[], Response]) -> Response:
+        # Throttled requests are retried here instead of raising, so the phase that made them carries on.
+        attempt = 0
+        while True:
+            with self.limiter.slot():
+                started = time.perf_counter()
+                response = send()
+                elapsed = time.perf_counter() - started
+            self._record(url, response, elapsed)
+
+            delay = self._throttle_delay(response, attempt)
+            if delay is None:
+                self.limiter.success()
+                return response
+            if attempt >= self.limiter.max_retries:
+                return response
+
+            # Read the body of streamed responses so their connection goes back to the pool.
+            _ = response.content
+            self.limiter.throttle(delay)
+            self.metrics.record_retry(url, delay)
+            attempt += 1
+            self.log.warning(f"Throttled while getting {url} - retrying in {delay:.0f} seconds with {self.limiter.concurrency} concurrent requests (attempt {attempt} of {self.limiter.max_retries})")
+
+    def _record(self, url: str, response: Response, elapsed: float) -> None:
+        # Bytes on the wire when known, chunked responses fall back to the (decoded) body unless it's streamed.
+        size = response.headers.get('Content-Length')
+        if size is None:
+            content = getattr(response, '_content', None)
+            size = len(content) if isinstance(content, bytes) else 0
+        self.metrics.record(url, response.status_code, int(size), elapsed)
+
+    def _throttle_delay(self, response: Response, attempt: int) -> float | None:
+        if response.status_code not in (403, 429):
+            return None
+
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                try:
+                    return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+                except (TypeError, ValueError):
+                    pass
+        elif response.status_code == 403 and 'secondary rate limit' not in response.text.lower():
+            # Primary rate limits (and any other 403) are handled by the caller.
+            return None
+
+        return self.limiter.backoff(attempt)
+
     def _raise_exception(self, response: Response) -> None:
         handlers = {
             400: {
@@ -131,6 +263,17 @@ class GitHubApi(GitHubApiHelper):
             return False
         return 'api rate limit exceeded' in response.text.lower()
 
+    def _update_token(self, token: TokenInstance | None, response: Response) -> None:
+        # A 401 carries the limits of an anonymous request, not the token's.
+        if token and response.status_code != 401:
+            self.token_manager.update(token, response.headers)
+
+    def metrics_summary(self) -> dict:
+        return self.metrics.summary(self.token_manager.stats)
+
+    def save_metrics(self, path: str | None, prometheus_path: str | None = None) -> None:
+        self.metrics.save(path, prometheus_path, self.token_manager.stats)
+
     def refresh_tokens(self) -> None:
         self.token_manager.refresh_all()
 
@@ -153,13 +296,13 @@ class GitHubApi(GitHubApiHelper):
             'X-GitHub-Api-Version': '2022-11-28'
         }
 
-        response = requests.get(f"{GitHubApi._api_endpoint}/orgs/{org}/installation", headers=headers)
+        response = HttpSession.get(f"{GitHubApi._api_endpoint}/orgs/{org}/installation", headers=headers)
         if response.status_code != 200:
             return None
 
         installation_id = response.json()['id']
 
-        response = requests.post(f"{GitHubApi._api_endpoint}/app/installations/{installation_id}/access_tokens", headers=headers)
+        response = HttpSession.post(f"{GitHubApi._api_endpoint}/app/installations/{installation_id}/access_tokens", headers=headers)
         if response.status_code == 201:
             return response.json()['token']
         return None
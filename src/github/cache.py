@@ -0,0 +1,73 @@
+import json
+import hashlib
+from urllib.parse import urlencode
+from requests.models import Response
+from src.libs.disk_cache import DiskCache
+
+
+class ResponseCache(DiskCache):
+    """
+    On-disk cache of GitHub responses used to send conditional requests.
+
+    Every 200 response carrying an ETag or Last-Modified header is stored under a hash of its URL, parameters and
+    Accept header. The next request for the same key sends If-None-Match / If-Modified-Since and, as GitHub does not
+    count 304 responses against the rate limit, a "Not Modified" reply is served from disk.
+    """
+    extension: str = '.cache'
+
+    _excluded_headers: list = ['set-cookie', 'content-encoding', 'content-length', 'transfer-encoding']
+
+    @staticmethod
+    def key(url: str, params: dict | None, headers: dict | None) -> str:
+        query = urlencode(sorted((params or {}).items()))
+        accept = (headers or {}).get('Accept', '')
+        return hashlib.sha256(f"{url}?{query}|{accept}".encode()).hexdigest()
+
+    def load(self, key: str) -> dict | None:
+        data = self.read(key)
+        if data is None:
+            return None
+
+        header, _, content = data.partition(b"\n")
+        try:
+            meta = json.loads(header)
+        except ValueError:
+            return None
+        meta['content'] = content
+        return meta
+
+    def conditional_headers(self, entry: dict) -> dict:
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def hit(self, key: str, entry: dict) -> Response:
+        self.touch(key)
+
+        response = Response()
+        response.status_code = 200
+        response.url = entry['url']
+        response.encoding = entry['encoding']
+        response.headers.update(entry['headers'])
+        response._content = entry['content']
+        return response
+
+    def store(self, key: str, response: Response) -> None:
+        self.miss()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or (not etag and not last_modified):
+            return
+
+        meta = {
+            'url': response.url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'encoding': response.encoding,
+            'headers': {name: value for name, value in response.headers.items() if name.lower() not in self._excluded_headers}
+        }
+        self.write(key, json.dumps(meta).encode() + b"\n" + response.content)
@@ -1,9 +1,20 @@
 import re
 import base64
+import posixpath
 import time
+import tarfile
+import threading
+import collections
+import concurrent.futures
+from collections.abc import Iterator
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from loguru import logger
 from src.libs.constants import SecretVariableCategory, SecretVariableType
 from src.github.api import GitHubApi
+from src.github.cache import ResponseCache
+from src.github.graphql import WorkflowTreeQuery
+from src.github.ref_cache import RefCache
+from src.libs.blob_store import BlobStore
 from src.github.exceptions import (
     AccountNotFound, UnknownAccountType, HttpNotFound, GitHubException, HttpEmptyRepo, HttpAccessBlocked,
     HttpNoCommitFound, HttpInvalidState, HttpInvalidRequest, RepoNotFound, RefNotFound, ErrorDownloadingFile
@@ -11,15 +22,54 @@ from src.github.exceptions import (
 from src.libs.components.repo import RepoComponent
 from src.libs.components.workflow import WorkflowComponent
 from src.libs.constants import RepoVisibility, GitHubRefType, RepoStatus
+from src.libs.utils import Utils
 
 
 class GitHubClient:
     _api: GitHubApi = None
+    _blobs: BlobStore = None
+    _refs: RefCache = None
+    _graphql: bool = False
+    _prefetched_keys: set = None
+    _prefetched_trees: dict = None
+    _prefetched_files: dict = None
+    _prefetched_commits: dict = None
+    _prefetched_actions: dict = None
+    _repo_sizes: dict = None
+    _prefetch_lock: threading.Lock = None
+    threads: int = 1
+    graphql_batch_size: int = 25
+    workflows_path: str = '.github/workflows'
     log: logger = None
 
-    def __init__(self, access_tokens: list[str], log: logger):
+    _local_uses_pattern: re.Pattern = re.compile(r'''uses:\s*['"]?(\.\.?/[^\s'"#@]*)''')
+
+    @property
+    def blobs(self) -> BlobStore | None:
+        return self._blobs
+
+    @property
+    def refs(self) -> RefCache | None:
+        return self._refs
+
+    @property
+    def graphql(self) -> bool:
+        return self._graphql
+
+    def __init__(self, access_tokens: list[str], log: logger, threads: int = 1, cache: ResponseCache | None = None, blobs: BlobStore | None = None, refs: RefCache | None = None, graphql: bool = False):
         self.log = log
-        self._api = GitHubApi(access_tokens, log)
+        self.threads = max(threads, 1)
+        self._api = GitHubApi(access_tokens, log, threads, cache)
+        self._blobs = blobs
+        self._refs = refs
+        self._graphql = graphql
+        self._prefetched_keys = set()
+        self._prefetched_trees = {}
+        self._prefetched_files = {}
+        self._prefetched_commits = {}
+        self._prefetched_actions = {}
+        self._repo_sizes = {}
+        self._prefetch_lock = threading.Lock()
 
     def get_account_type(self, account_name: str) -> str:
         return self.get_account(account_name).get('type', '').lower()
@@ -40,14 +90,7 @@ class GitHubClient:
         count = 0
         account_type = 'orgs' if account_type == 'organization' else 'users'
         url = f'/{account_type}/{account_name}/repos'
-        while True:
-            response_headers = {}
-            try:
-                page_repos = self._api.get(url, params, None, response_headers)
-            except HttpNotFound:
-                # This shouldn't happen as we're getting the org/account above, but it's happened a couple of times.
-                raise AccountNotFound(account_name)
-
+        for page_repos in self._get_pages(url, params, account_name):
             repos = []
             for repo in page_repos:
                 count += 1
@@ -68,11 +111,52 @@ class GitHubClient:
             if len(repos) > 0:
                 yield repos
 
-            # Invalidate as we'll be using the 'next url' from the headers.
-            params = None
+    def _get_pages(self, url: str, params: dict, account_name: str) -> Iterator[list]:
+        """
+        Yields every page of a listing in order. Once the first response tells how many pages there are (rel="last"),
+        the rest are requested in parallel, keeping up to twice the number of threads in flight, so the caller can
+        work on a page while the following ones are still downloading.
+        """
+        response_headers = {}
+        yield self._get_page(url, params, response_headers, account_name)
+
+        last_url = self._get_link_url(response_headers, 'last')
+        if not last_url:
+            # No page count, follow the links one page at a time.
             url = self._get_next_url(response_headers)
-            if not url:
-                break
+            while url:
+                response_headers = {}
+                yield self._get_page(url, None, response_headers, account_name)
+                url = self._get_next_url(response_headers)
+            return
+
+        parts = urlsplit(last_url)
+        query = parse_qsl(parts.query)
+        last_page = int(dict(query).get('page', 1))
+        page_urls = [
+            urlunsplit(parts._replace(query=urlencode([(name, page if name == 'page' else value) for name, value in query])))
+            for page in range(2, last_page + 1)
+        ]
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads)
+        pending = collections.deque()
+        try:
+            for page_url in page_urls:
+                pending.append(executor.submit(self._get_page, page_url, None, None, account_name))
+                if len(pending) >= self.threads * 2:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _get_page(self, url: str, params: dict | None, response_headers: dict | None, account_name: str) -> list:
+        try:
+            return self._api.get(url, params, None, response_headers)
+        except HttpNotFound:
+            # This shouldn't happen as we're getting the org/account above, but it's happened a couple of times.
+            raise AccountNotFound(account_name)
 
     def _load_repo_component(self, data: dict) -> RepoComponent:
         repo = RepoComponent(data['full_name'])
@@ -86,17 +170,124 @@ class GitHubClient:
         return repo
 
     def _get_next_url(self, headers: dict) -> str | None:
+        return self._get_link_url(headers, 'next')
+
+    def _get_link_url(self, headers: dict, rel: str) -> str | None:
         header = headers.get('Link', headers.get('link', ''))
         if len(header) == 0:
             return None
 
-        pattern = r'(?<=<)([\S]*)(?=>; rel="next")'
+        pattern = rf'(?<=<)([\S]*)(?=>; rel="{rel}")'
         match = re.search(pattern, header, re.IGNORECASE)
         if not match:
             return None
         return match.group(1).strip()
 
+    def prefetch_workflows(self, repos: list[RepoComponent]) -> None:
+        """
+        Loads the workflow listing and files of `repos` with one GraphQL query per `graphql_batch_size` repositories.
+        ls() and download() then serve them from memory, anything that couldn't be prefetched goes through REST.
+        """
+        with self._prefetch_lock:
+            pending = [repo for repo in repos if self._prefetch_key(repo) not in self._prefetched_keys]
+            self._prefetched_keys.update(self._prefetch_key(repo) for repo in pending)
+
+        for index in range(0, len(pending), self.graphql_batch_size):
+            batch = pending[index:index + self.graphql_batch_size]
+            query, variables = WorkflowTreeQuery.build(batch, self.workflows_path)
+            try:
+                data = self._api.graphql(query, variables)
+            except Exception as e:
+                self.log.warning(f"Could not prefetch workflows for {len(batch)} repositories, falling back to REST: {e}")
+                continue
+
+            results = WorkflowTreeQuery.parse(batch, data)
+            self.log.debug(f"Prefetched workflows for {len(results)}/{len(batch)} repositories")
+            with self._prefetch_lock:
+                for repo, listing, files in results:
+                    key = self._prefetch_key(repo)
+                    self._prefetched_trees[key] = listing
+                    for path, contents in files.items():
+                        self._prefetched_files[(key, path)] = contents
+
+    def prefetch_archive(self, repo: RepoComponent) -> int:
+        """
+        Streams the repository's tarball at its ref, keeping the workflow listing, workflows and action files in memory
+        for ls() and download(). Nothing is written to disk. Returns the number of files kept.
+        """
+        key = self._prefetch_key(repo)
+        with self._prefetch_lock:
+            self._prefetched_keys.add(key)
+
+        try:
+            response = self._api.stream(f"/repos/{repo.org.name}/{repo.name}/tarball/{repo.ref}")
+        except GitHubException as e:
+            self.log.warning(f"Could not download the archive of {repo}, falling back to REST: {e}")
+            return 0
+
+        listing = []
+        files = {}
+        commit = None
+        try:
+            with response, tarfile.open(fileobj=response.raw, mode='r|*') as archive:
+                for member in archive:
+                    # Every member is under a "{org}-{repo}-{sha}/" directory.
+                    if commit is None:
+                        commit = member.name.split('/', 1)[0].rpartition('-')[2].lower()
+                    path = member.name.split('/', 1)[1] if '/' in member.name else ''
+                    directory, _, name = path.rpartition('/')
+                    if directory == self.workflows_path:
+                        listing.append(path)
+
+                    if not member.isfile():
+                        continue
+                    elif directory == self.workflows_path and Utils.is_yaml_extension(name):
+                        pass
+                    elif name not in ['action.yml', 'action.yaml']:
+                        continue
+                    files[path] = archive.extractfile(member).read().decode('utf-8', errors='replace')
+        except (tarfile.TarError, OSError) as e:
+            self.log.warning(f"Could not read the archive of {repo}, falling back to REST: {e}")
+            return 0
+
+        with self._prefetch_lock:
+            self._prefetched_trees[key] = listing
+            self._prefetched_commits[key] = commit
+            # Every action file of the ref, so the ones the archive doesn't have aren't asked for again.
+            self._prefetched_actions[key] = {path for path in files if path.rpartition('/')[2] in ['action.yml', 'action.yaml']}
+            for path, contents in files.items():
+                self._prefetched_files[(key, path)] = contents
+        return len(files)
+
+    def repo_size(self, repo: RepoComponent) -> int | None:
+        """
+        Size of the repository in KB as GitHub reports it, the same for all of its refs so it's only asked for once.
+        """
+        key = f"{repo.org.name.lower()}/{repo.name.lower()}"
+        with self._prefetch_lock:
+            if key in self._repo_sizes:
+                return self._repo_sizes[key]
+
+        try:
+            size = self.get_repo(repo, False).get('size')
+        except GitHubException:
+            size = None
+
+        with self._prefetch_lock:
+            self._repo_sizes[key] = size
+        return size
+
+    @staticmethod
+    def _prefetch_key(repo: RepoComponent) -> str:
+        return f"{repo.org.name.lower()}/{repo.name.lower()}@{repo.ref}"
+
     def ls(self, repo: RepoComponent, path: str) -> list[str]:
+        if path == self.workflows_path:
+            with self._prefetch_lock:
+                listing = self._prefetched_trees.pop(self._prefetch_key(repo), None)
+            if listing is not None:
+                return listing
+
         listing = self._get_path_or_file_info(repo, path)
         if not isinstance(listing, list):
             return []
@@ -216,6 +407,28 @@ class GitHubClient:
         return RepoStatus.UNKNOWN
 
     def fulfill_component(self, repo: RepoComponent) -> bool:
+        if not self.refs:
+            return self._fulfill_component(repo)
+
+        # Only successful lookups are cached, anything else raises.
+        if not self.refs.load_repo(repo):
+            self._fulfill_repo(repo)
+            self.refs.store_repo(repo)
+
+        requested_ref = repo.ref
+        if self.refs.load_ref(repo):
+            self.log.trace(f"Loaded {requested_ref} for {repo} from the ref cache")
+            return True
+
+        self._resolve_ref(repo)
+        self.refs.store_ref(repo, requested_ref)
+        return True
+
+    def _fulfill_component(self, repo: RepoComponent) -> bool:
+        self._fulfill_repo(repo)
+        return self._resolve_ref(repo)
+
+    def _fulfill_repo(self, repo: RepoComponent) -> None:
         try:
             data = self.get_repo(repo, False)
             if len(repo.ref) == 0:
@@ -230,6 +443,7 @@ class GitHubClient:
             repo.status = self._get_repo_status_from_exception(e)
             raise RepoNotFound(str(repo))
 
+    def _resolve_ref(self, repo: RepoComponent) -> bool:
         ref_info = self._identify_ref(repo)
         if ref_info['type'] != GitHubRefType.UNKNOWN:
             # This will update the passed object as well.
@@ -266,17 +480,98 @@ class GitHubClient:
         raise RefNotFound(str(repo))
 
     def download(self, workflow: WorkflowComponent, path: str = None) -> str | None:
-        url = workflow.download_url(path)
+        contents = self._local_file(workflow, path or workflow.path)
+        if contents is not None:
+            return contents
+        return self._download(workflow, path)
+
+    def _download(self, workflow: WorkflowComponent, path: str = None) -> str | None:
+        # Files kept in the blob store are downloaded by commit, a branch or tag may have moved since it was resolved.
+        commit = workflow.repo.ref_commit if self.blobs else None
+        url = workflow.download_url(path, commit)
         is_authenticated = workflow.repo.visibility == RepoVisibility.PRIVATE
         try:
             contents = self._api.get(url, authenticated=is_authenticated)
             # If it's via the API the contents will be base64 encoded.
             if is_authenticated:
                 contents = base64.b64decode(contents['content']).decode('utf-8')
-            return contents
         except HttpNotFound:
             raise ErrorDownloadingFile(f"Could not download file for {workflow}")
 
+        if commit and isinstance(contents, str):
+            self.blobs.put(workflow.repo.org.name, workflow.repo.name, commit, path or workflow.path, contents)
+        return contents
+
+    def _local_file(self, workflow: WorkflowComponent, path: str) -> str | None:
+        # Prefetched files (GraphQL or archives) first, then the blob store.
+        key = self._prefetch_key(workflow.repo)
+        with self._prefetch_lock:
+            contents = self._prefetched_files.pop((key, path), None)
+            prefetched_commit = self._prefetched_commits.get(key)
+        if contents is not None:
+            # Prefetched by ref name before the commit was resolved, only stored when the archive was of that commit.
+            # GraphQL prefetches don't say which commit they read.
+            commit = workflow.repo.ref_commit.lower() if workflow.repo.ref_commit else ''
+            if self.blobs and commit and prefetched_commit and commit.startswith(prefetched_commit):
+                self.blobs.put(workflow.repo.org.name, workflow.repo.name, workflow.repo.ref_commit, path, contents)
+            return contents
+
+        # Files are only looked up by commit, as a branch or tag may have moved since they were stored.
+        if not self.blobs or not workflow.repo.ref_commit or not path:
+            return None
+        return self.blobs.get(workflow.repo.org.name, workflow.repo.name, workflow.repo.ref_commit, path)
+
+    def release_prefetched(self, repo: RepoComponent, paths: list[str]) -> None:
+        """
+        Drops the prefetched workflows of `repo` that aren't going to be downloaded, `paths` are the ones that are, and
+        the action files none of them use as a local action (`uses: ./path`). Files skipped by --workflow or for their
+        extension, or the other actions of a monorepo, would otherwise stay in memory for the whole run.
+        """
+        key = self._prefetch_key(repo)
+        with self._prefetch_lock:
+            self._prefetched_trees.pop(key, None)
+            files = {item[1]: contents for item, contents in self._prefetched_files.items() if item[0] == key}
+
+            keep = set()
+            pending = [path for path in paths if path in files]
+            while pending:
+                path = pending.pop()
+                keep.add(path)
+                pending += [action for action in self._local_actions(files[path]) if action in files and action not in keep]
+
+            for path in files:
+                if path not in keep:
+                    del self._prefetched_files[(key, path)]
+
+    def clear_prefetched(self) -> None:
+        # Whatever wasn't downloaded by the end of the run isn't going to be.
+        with self._prefetch_lock:
+            self._prefetched_trees.clear()
+            self._prefetched_files.clear()
+            self._prefetched_commits.clear()
+            self._prefetched_actions.clear()
+
+    def _local_actions(self, contents: str) -> list[str]:
+        actions = []
+        for uses in self._local_uses_pattern.findall(contents):
+            # The same way LocalCheckoutParser expands them, relative to the root of the repository.
+            path = re.sub(r'^(?:\./|\.\./)+', '', posixpath.normpath(uses) + '/').strip('/')
+            directory = f"{path}/" if path and path != '.' else ''
+            actions += [f"{directory}action.yml", f"{directory}action.yaml"]
+        return actions
+
+    def _is_missing(self, workflow: WorkflowComponent, path: str) -> bool:
+        # An action file the archive of the same ref doesn't have, it would only be a 404.
+        if path.rpartition('/')[2] not in ['action.yml', 'action.yaml']:
+            return False
+        with self._prefetch_lock:
+            actions = self._prefetched_actions.get(self._prefetch_key(workflow.repo))
+        return actions is not None and path not in actions
+
+    def is_prefetched(self, workflow: WorkflowComponent) -> bool:
+        with self._prefetch_lock:
+            return (self._prefetch_key(workflow.repo), workflow.path) in self._prefetched_files
+
     def download_workflow(self, workflow: WorkflowComponent) -> str | None:
         contents = None
         try:
@@ -287,13 +582,23 @@ class GitHubClient:
         return contents
 
     def download_action(self, workflow: WorkflowComponent) -> str | None:
+        action_files = ['action.yml', 'action.yaml', 'Dockerfile']
+        paths = {action_file: f"{workflow.path}/{action_file}" if workflow.path else action_file for action_file in action_files}
+
+        # Check every candidate locally first, so a known action.yaml doesn't cost a 404 for action.yml.
+        for action_file, path in paths.items():
+            contents = self._local_file(workflow, path)
+            if contents is not None:
+                workflow.add_action_file_to_path(action_file)
+                workflow.update_workflow_type()
+                return contents
+
         contents = None
-        for action_file in ['action.yml', 'action.yaml', 'Dockerfile']:
+        for action_file, path in paths.items():
+            if self._is_missing(workflow, path):
+                continue
             try:
-                path = action_file
-                if workflow.path:
-                    path = f"{workflow.path}/{action_file}"
-                contents = self.download(workflow, path)
+                contents = self._download(workflow, path)
                 workflow.add_action_file_to_path(action_file)
                 workflow.update_workflow_type()
                 break
@@ -333,6 +638,17 @@ class GitHubClient:
                     return ref['name']
         return None
 
+    def get_branch_commit(self, repo: RepoComponent) -> str | None:
+        branch = self._get_git_ref(repo, f"heads/{repo.ref}")
+        return branch['object']['sha'] if branch else None
+
+    def compare_commits(self, repo: RepoComponent, base: str, head: str) -> dict | None:
+        try:
+            return self._api.get(f"/repos/{repo.org.name}/{repo.name}/compare/{base}...{head}")
+        except GitHubException:
+            # The base commit can disappear, after a force push for instance.
+            return None
+
     def list_tags_or_branches(self, repo: RepoComponent, ref_type: GitHubRefType) -> list[dict]:
         url = f"/repos/{repo.org.name}/{repo.name}/"
         url += 'branches' if ref_type == GitHubRefType.BRANCH else 'tags'
@@ -355,8 +671,11 @@ class GitHubClient:
     def halt_and_continue(self, minutes: int) -> None:
         self._api.refresh_tokens()
         if not self._api.has_valid_token():
-            self.log.info(f"Reached API rate limit - waiting {minutes} minutes")
-            time.sleep(minutes * 60)
+            # Wait for the first token to reset, `minutes` is only used when no reset time is known.
+            seconds = self._api.token_manager.seconds_until_reset()
+            seconds = minutes * 60 if seconds is None else seconds + 1
+            self.log.info(f"Reached API rate limit - waiting {seconds / 60:.1f} minutes")
+            time.sleep(seconds)
             self._api.refresh_tokens()
 
     def get_secrets(self, org: str, category: SecretVariableCategory, type: SecretVariableType, environment: str | None, repo: str | None) -> list[dict]:
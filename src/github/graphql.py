@@ -0,0 +1,65 @@
+from src.libs.components.repo import RepoComponent
+
+
+class WorkflowTreeQuery:
+    """
+    Single GraphQL query returning the files of a directory (and their contents) for many repositories at once.
+
+    Every repository gets its own aliased `repository` field, so one request replaces the REST directory listing plus
+    one download per file for each of them.
+    """
+    _fragment: str = """
+fragment DirectoryFiles on GitObject {
+  ... on Tree {
+    entries {
+      path
+      type
+      object {
+        ... on Blob {
+          text
+          isBinary
+          isTruncated
+        }
+      }
+    }
+  }
+}
+"""
+
+    @staticmethod
+    def build(repos: list[RepoComponent], path: str) -> tuple[str, dict]:
+        definitions = []
+        fields = []
+        variables = {}
+        for index, repo in enumerate(repos):
+            definitions.append(f"$owner{index}: String!, $name{index}: String!, $expression{index}: String!")
+            fields.append(f"  r{index}: repository(owner: $owner{index}, name: $name{index}) {{ object(expression: $expression{index}) {{ ...DirectoryFiles }} }}")
+            variables[f"owner{index}"] = repo.org.name
+            variables[f"name{index}"] = repo.name
+            variables[f"expression{index}"] = f"{repo.ref or 'HEAD'}:{path}"
+
+        query = "query(" + ", ".join(definitions) + ") {\n" + "\n".join(fields) + "\n}\n" + WorkflowTreeQuery._fragment
+        return query, variables
+
+    @staticmethod
+    def parse(repos: list[RepoComponent], data: dict) -> list[tuple[RepoComponent, list[str], dict[str, str]]]:
+        """
+        Returns (repo, listing, files) for every repository that could be read. Repositories missing from `data`
+        (not found, no access, etc) are left out so they go through the REST API instead.
+        """
+        results = []
+        for index, repo in enumerate(repos):
+            node = data.get(f"r{index}")
+            if node is None:
+                continue
+
+            listing = []
+            files = {}
+            # A missing directory has no object, the same as a 404 on the REST API.
+            for entry in (node.get('object') or {}).get('entries', []):
+                listing.append(entry['path'])
+                blob = entry.get('object') or {}
+                if entry['type'] == 'blob' and blob.get('text') is not None and not blob.get('isBinary') and not blob.get('isTruncated'):
+                    files[entry['path']] = blob['text']
+            results.append((repo, listing, files))
+        return results
@@ -0,0 +1,88 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of requests in flight and adapts the cap to how GitHub responds (AIMD).
+
+    Every healthy response adds 1/limit to the limit, so it grows by about one request per round trip, and every
+    throttled one (429, secondary rate limit, Retry-After) halves it. A throttle also pauses all new requests until its
+    delay is over, as secondary rate limits apply to the whole client rather than to the request that hit them.
+    """
+    max_concurrency: int = None
+    min_concurrency: int = 1
+    max_retries: int = 5
+    # GitHub asks to wait at least a minute when a secondary rate limit comes without a Retry-After.
+    backoff_base: float = 60
+    backoff_max: float = 900
+    _limit: float = None
+    _in_flight: int = 0
+    _paused_until: float = 0
+    _throttles: int = 0
+    _waited: float = 0
+    _lock: threading.Condition = None
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(max_concurrency, self.min_concurrency)
+        self._limit = float(self.max_concurrency)
+        self._lock = threading.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return int(self._limit)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'concurrency': int(self._limit),
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'throttle_events': self._throttles,
+                'throttle_wait_seconds': round(self._waited, 1)
+            }
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self) -> None:
+        with self._lock:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause > 0:
+                    self._lock.wait(pause)
+                elif self._in_flight >= int(self._limit):
+                    self._lock.wait()
+                else:
+                    break
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._lock.notify_all()
+
+    def success(self) -> None:
+        with self._lock:
+            if self._limit < self.max_concurrency:
+                self._limit = min(self._limit + 1 / self._limit, float(self.max_concurrency))
+                self._lock.notify_all()
+
+    def throttle(self, delay: float) -> None:
+        with self._lock:
+            self._throttles += 1
+            self._waited += delay
+            self._limit = max(self._limit / 2, float(self.min_concurrency))
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def backoff(self, attempt: int) -> float:
+        # The jitter keeps the threads that were throttled together from coming back together.
+        return random.uniform(0.5, 1) * min(self.backoff_base * 2 ** attempt, self.backoff_max)
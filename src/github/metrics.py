@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import random
+import tempfile
+import threading
+from urllib.parse import urlsplit
+
+
+class ApiMetrics:
+    """
+    Per endpoint statistics of the requests sent to GitHub, shared by every thread of a GitHubApi.
+
+    URLs are grouped by their template (/repos/{owner}/{repo}/contents/{path}, etc) so a scan of thousands of
+    repositories still ends up with a handful of rows. Latency percentiles come from a fixed size random sample of each
+    endpoint, the histogram buckets are exact.
+    """
+    buckets: tuple = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    sample_size: int = 1024
+
+    _endpoints: dict = None
+    _lock: threading.Lock = None
+
+    _templates: list = [
+        (re.compile(r'^/(users|orgs)/[^/]+$'), r'/\1/{account}'),
+        (re.compile(r'^/(users|orgs)/[^/]+/repos$'), r'/\1/{account}/repos'),
+        (re.compile(r'^/orgs/[^/]+/(.+)$'), r'/orgs/{org}/\1'),
+        (re.compile(r'^/repos/[^/]+/[^/]+$'), '/repos/{owner}/{repo}'),
+        (re.compile(r'^/repos/[^/]+/[^/]+/contents(/.*)?$'), '/repos/{owner}/{repo}/contents/{path}'),
+        (re.compile(r'^/repos/[^/]+/[^/]+/git/(ref|refs|tags|trees)/.+$'), r'/repos/{owner}/{repo}/git/\1/{ref}'),
+        (re.compile(r'^/repos/[^/]+/[^/]+/(branches|commits|tarball|compare)/.+?(/branches-where-head)?$'), r'/repos/{owner}/{repo}/\1/{ref}\2'),
+        (re.compile(r'^/repos/[^/]+/[^/]+/environments/[^/]+/(.+)$'), r'/repos/{owner}/{repo}/environments/{environment}/\1'),
+        (re.compile(r'^/repos/[^/]+/[^/]+/(.+)$'), r'/repos/{owner}/{repo}/\1'),
+    ]
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def template(cls, url: str) -> str:
+        parts = urlsplit(url)
+        if parts.netloc and parts.netloc != 'api.github.com':
+            # Raw files (raw.githubusercontent.com/owner/repo/ref/path) and anything else outside of the API.
+            return f"{parts.netloc}/{{path}}"
+
+        path = '/' + parts.path.strip('/')
+        for pattern, replacement in cls._templates:
+            if pattern.match(path):
+                return pattern.sub(replacement, path)
+        return path
+
+    def _endpoint(self, url: str) -> dict:
+        template = self.template(url)
+        endpoint = self._endpoints.get(template)
+        if endpoint is None:
+            endpoint = {
+                'requests': 0,
+                'statuses': {},
+                'bytes': 0,
+                'seconds': 0.0,
+                'buckets': [0] * len(self.buckets),
+                'samples': [],
+                'retries': 0,
+                'throttle_wait_seconds': 0.0
+            }
+            self._endpoints[template] = endpoint
+        return endpoint
+
+    def record(self, url: str, status_code: int, size: int, seconds: float) -> None:
+        with self._lock:
+            endpoint = self._endpoint(url)
+            endpoint['requests'] += 1
+            endpoint['statuses'][status_code] = endpoint['statuses'].get(status_code, 0) + 1
+            endpoint['bytes'] += size
+            endpoint['seconds'] += seconds
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    endpoint['buckets'][index] += 1
+                    break
+
+            # Reservoir sampling, every request has the same chance of being in the sample.
+            if len(endpoint['samples']) < self.sample_size:
+                endpoint['samples'].append(seconds)
+            else:
+                index = random.randrange(endpoint['requests'])
+                if index < self.sample_size:
+                    endpoint['samples'][index] = seconds
+
+    def record_retry(self, url: str, wait: float = 0.0) -> None:
+        with self._lock:
+            endpoint = self._endpoint(url)
+            endpoint['retries'] += 1
+            endpoint['throttle_wait_seconds'] += wait
+
+    @staticmethod
+    def _percentile(samples: list, percentile: float) -> float:
+        if len(samples) == 0:
+            return 0.0
+        return samples[min(int(len(samples) * percentile), len(samples) - 1)]
+
+    def summary(self, tokens: dict | None = None) -> dict:
+        endpoints = {}
+        with self._lock:
+            for template, endpoint in sorted(self._endpoints.items(), key=lambda item: -item[1]['seconds']):
+                samples = sorted(endpoint['samples'])
+                endpoints[template] = {
+                    'requests': endpoint['requests'],
+                    'statuses': {str(status): count for status, count in sorted(endpoint['statuses'].items())},
+                    'bytes': endpoint['bytes'],
+                    'seconds': round(endpoint['seconds'], 3),
+                    'latency': {
+                        'p50': round(self._percentile(samples, 0.5), 3),
+                        'p90': round(self._percentile(samples, 0.9), 3),
+                        'p99': round(self._percentile(samples, 0.99), 3),
+                        'max': round(samples[-1] if samples else 0.0, 3)
+                    },
+                    'retries': endpoint['retries'],
+                    'throttle_wait_seconds': round(endpoint['throttle_wait_seconds'], 1)
+                }
+
+        return {
+            'requests': sum(endpoint['requests'] for endpoint in endpoints.values()),
+            'endpoints': endpoints,
+            'tokens': tokens or {}
+        }
+
+    def prometheus(self, tokens: dict | None = None) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, description: str) -> None:
+            lines.append(f"# HELP github_api_{name} {description}")
+            lines.append(f"# TYPE github_api_{name} {kind}")
+
+        with self._lock:
+            endpoints = {template: {**endpoint, 'statuses': dict(endpoint['statuses']), 'buckets': list(endpoint['buckets'])} for template, endpoint in self._endpoints.items()}
+
+        metric('requests_total', 'counter', 'Requests sent to the GitHub API.')
+        for template, endpoint in endpoints.items():
+            for status, count in sorted(endpoint['statuses'].items()):
+                lines.append(f'github_api_requests_total{{endpoint="{template}",status="{status}"}} {count}')
+
+        metric('response_bytes_total', 'counter', 'Bytes received from the GitHub API.')
+        for template, endpoint in endpoints.items():
+            lines.append(f'github_api_response_bytes_total{{endpoint="{template}"}} {endpoint["bytes"]}')
+
+        metric('request_duration_seconds', 'histogram', 'Latency of requests to the GitHub API.')
+        for template, endpoint in endpoints.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, endpoint['buckets']):
+                cumulative += count
+                lines.append(f'github_api_request_duration_seconds_bucket{{endpoint="{template}",le="{bound}"}} {cumulative}')
+            lines.append(f'github_api_request_duration_seconds_bucket{{endpoint="{template}",le="+Inf"}} {endpoint["requests"]}')
+            lines.append(f'github_api_request_duration_seconds_sum{{endpoint="{template}"}} {endpoint["seconds"]:.6f}')
+            lines.append(f'github_api_request_duration_seconds_count{{endpoint="{template}"}} {endpoint["requests"]}')
+
+        metric('retries_total', 'counter', 'Requests sent again after a connection error or throttling.')
+        for template, endpoint in endpoints.items():
+            lines.append(f'github_api_retries_total{{endpoint="{template}"}} {endpoint["retries"]}')
+
+        metric('throttle_wait_seconds_total', 'counter', 'Seconds waited because of Retry-After or secondary rate limits.')
+        for template, endpoint in endpoints.items():
+            lines.append(f'github_api_throttle_wait_seconds_total{{endpoint="{template}"}} {endpoint["throttle_wait_seconds"]:.1f}')
+
+        tokens = tokens or {}
+        if tokens:
+            metric('token_requests_total', 'counter', 'Requests sent with each access token.')
+            for token in tokens['tokens']:
+                lines.append(f'github_api_token_requests_total{{token="{token["token"]}"}} {token["requests"]}')
+            metric('token_remaining_calls', 'gauge', 'Remaining calls of each access token, as of the last response.')
+            for token in tokens['tokens']:
+                lines.append(f'github_api_token_remaining_calls{{token="{token["token"]}"}} {token["remaining"]}')
+            metric('rate_limit_wait_seconds_total', 'counter', 'Seconds waited for access tokens to reset.')
+            lines.append(f"github_api_rate_limit_wait_seconds_total {tokens['waited_seconds']:.1f}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write(path: str, contents: str) -> None:
+        # Written next to the target and renamed, so collectors never read half a file.
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as f:
+            f.write(contents)
+        os.replace(temp_path, path)
+
+    def save(self, path: str | None, prometheus_path: str | None = None, tokens: dict | None = None) -> None:
+        if path:
+            self._write(path, json.dumps(self.summary(tokens), indent=2))
+        if prometheus_path:
+            self._write(prometheus_path, self.prometheus(tokens))
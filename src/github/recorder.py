@@ -0,0 +1,108 @@
+import gzip
+import json
+import queue
+import atexit
+import random
+import threading
+import time
+from requests.models import Response
+
+
+class ApiRecorder:
+    """
+    Records the requests sent to GitHub and their responses to a gzipped JSON lines file, for mock responses and replay
+    benchmarks.
+
+    Requests only put a tuple on a bounded queue, a single background thread serialises, compresses and writes them.
+    When the writer falls behind records are dropped (and counted) rather than slowing the requests down. Only a
+    `sample_bodies` share of successful response bodies are kept, errors always keep theirs as they are small and are
+    what tests usually need.
+    """
+    path: str = None
+    sample_bodies: float = 1.0
+    queue_size: int = 10000
+    # Most records written between two flushes, a flush also happens whenever the queue runs dry.
+    flush_every: int = 1000
+
+    _queue: queue.Queue = None
+    _thread: threading.Thread = None
+    _stats: dict = None
+    _lock: threading.Lock = None
+    _stop: object = object()
+
+    _instances: dict = {}
+    _instances_lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str, sample_bodies: float = 1.0) -> 'ApiRecorder':
+        # Every client recording to the same file shares its writer.
+        with cls._instances_lock:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path, sample_bodies)
+            return cls._instances[path]
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def __init__(self, path: str, sample_bodies: float = 1.0):
+        self.path = path
+        self.sample_bodies = min(max(sample_bodies, 0.0), 1.0)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, url: str, params: dict | None, additional_headers: dict | None, authenticated: bool, response: Response) -> None:
+        body = None
+        if response.status_code >= 400 or random.random() < self.sample_bodies:
+            body = response.text
+
+        item = (time.time(), url, params, additional_headers, authenticated, response.status_code, dict(response.headers), body)
+        try:
+            self._queue.put_nowait(item)
+            key = 'recorded'
+        except queue.Full:
+            key = 'dropped'
+        with self._lock:
+            self._stats[key] += 1
+
+    def _run(self) -> None:
+        # Appending adds a new gzip member, which gzip readers handle as one stream.
+        with gzip.open(self.path, 'at', encoding='utf-8') as f:
+            pending = 0
+            while True:
+                item = self._queue.get()
+                if item is self._stop:
+                    break
+
+                timestamp, url, params, headers, authenticated, status, response_headers, body = item
+                f.write(json.dumps({
+                    'time': timestamp,
+                    'request_url': url,
+                    'request_params': params,
+                    'request_headers': headers,
+                    'authenticated': authenticated,
+                    'response_status': status,
+                    'response_headers': response_headers,
+                    'response_body': body
+                }) + "\n")
+                pending += 1
+                with self._lock:
+                    self._stats['written'] += 1
+                if pending >= self.flush_every or self._queue.empty():
+                    f.flush()
+                    pending = 0
+
+    def close(self) -> None:
+        if not self._thread.is_alive():
+            return
+        # Blocks until there's room, everything recorded before this point gets written.
+        self._queue.put(self._stop)
+        self._thread.join()
+        with self._instances_lock:
+            if self._instances.get(self.path) is self:
+                del self._instances[self.path]
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from src.libs.components.repo import RepoComponent
+from src.libs.constants import GitHubRefType, RepoVisibility, RepoStatus
+
+
+class RefCache:
+    """
+    Resolved repository references, shared by every thread of the process and optionally saved to `path`.
+
+    Maps (org/repo, ref) to the outcome of GitHubClient.fulfill_component(), so the chain of up to 6 API calls needed
+    to tell whether a ref is a commit, branch or tag only runs once per `ttl` seconds. Full commit hashes can't move, so
+    their resolution doesn't expire, only the `max_commits` most recently used ones are saved. The repository itself
+    (visibility, stars, archived, ...) can change at any time and is kept separately under org/repo, always for `ttl`
+    seconds.
+    """
+    ttl: int = None
+    path: str = None
+    max_commits: int = 50000
+
+    # Least recently used first.
+    _entries: dict = None
+    _lock: threading.Lock = None
+    _stats: dict = None
+
+    _repo_fields: list = ['default_branch', 'visibility', 'stars', 'fork', 'archive']
+    _ref_fields: list = ['ref', 'ref_type', 'ref_commit', 'ref_old_name', 'resolved_ref', 'resolved_ref_type']
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    @property
+    def hit_rate(self) -> float:
+        stats = self.stats
+        lookups = stats['hits'] + stats['misses']
+        return 0.0 if lookups == 0 else stats['hits'] / lookups * 100
+
+    def __init__(self, ttl: int, path: str | None = None):
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+        self._entries = {}
+
+        if self.path and os.path.isfile(self.path):
+            with open(self.path, 'r') as f:
+                try:
+                    self._entries = json.load(f)
+                except ValueError:
+                    self._entries = {}
+
+    @staticmethod
+    def _key(repo: RepoComponent, ref: str | None = None) -> str:
+        key = f"{repo.org.name.lower()}/{repo.name.lower()}"
+        return key if ref is None else f"{key}@{ref}"
+
+    def _get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['expires'] is not None and entry['expires'] < time.time():
+                del self._entries[key]
+                entry = None
+            elif entry:
+                self._entries[key] = self._entries.pop(key)
+            self._stats['hits' if entry else 'misses'] += 1
+        return entry['data'] if entry else None
+
+    def _put(self, key: str, data: dict, expires: float | None) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {'expires': expires, 'data': data}
+
+    def load_repo(self, repo: RepoComponent) -> bool:
+        data = self._get(self._key(repo))
+        if not data:
+            return False
+
+        for name in self._repo_fields:
+            setattr(repo, name, data[name])
+        repo.visibility = RepoVisibility(data['visibility'])
+        if len(repo.ref) == 0:
+            repo.ref = repo.default_branch
+        repo.status = RepoStatus.OK
+        return True
+
+    def store_repo(self, repo: RepoComponent) -> None:
+        self._put(self._key(repo), {name: getattr(repo, name) for name in self._repo_fields}, time.time() + self.ttl)
+
+    def load_ref(self, repo: RepoComponent) -> bool:
+        data = self._get(self._key(repo, repo.ref))
+        if not data:
+            return False
+
+        for name in self._ref_fields:
+            setattr(repo, name, data[name])
+        repo.ref_type = GitHubRefType(data['ref_type'])
+        repo.resolved_ref_type = GitHubRefType(data['resolved_ref_type'])
+        return True
+
+    def store_ref(self, repo: RepoComponent, ref: str) -> None:
+        is_commit = len(ref) == 40 and repo.ref_type == GitHubRefType.COMMIT
+        data = {name: getattr(repo, name) for name in self._ref_fields}
+        self._put(self._key(repo, ref), data, None if is_commit else time.time() + self.ttl)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        with self._lock:
+            now = time.time()
+            commits = [key for key, entry in self._entries.items() if entry['expires'] is None]
+            # Commits never expire, so drop the least recently used ones rather than let the file grow forever.
+            for key in commits[:max(0, len(commits) - self.max_commits)]:
+                del self._entries[key]
+            entries = {key: entry for key, entry in self._entries.items() if entry['expires'] is None or entry['expires'] >= now}
+            data = json.dumps(entries)
+
+        # Write to a temporary file first, so an interrupted run doesn't leave a broken cache behind.
+        handle, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.realpath(self.path)), suffix='.tmp')
+        with os.fdopen(handle, 'w') as f:
+            f.write(data)
+        os.replace(temp_file, self.path)
@@ -0,0 +1,66 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+
+
+class HttpSession:
+    """
+    Process-wide pool of keep-alive connections to GitHub.
+
+    A single requests.Session is shared by every thread, its adapters hold up to `pool_size` open connections per
+    host (api.github.com, raw.githubusercontent.com, etc.) so TCP/TLS handshakes are only paid once per connection.
+    """
+    _session: requests.Session = None
+    _pool_size: int = 10
+    _pool_hosts: int = 4
+    _lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, pool_size: int) -> None:
+        # Only ever grow the pool, as there may already be other clients using it. The session is kept and only gets a
+        # larger adapter, requests in flight finish on the connections of the old one.
+        with cls._lock:
+            if cls._session is not None and pool_size <= cls._pool_size:
+                return
+            cls._pool_size = max(pool_size, cls._pool_size)
+            if cls._session is None:
+                cls._session = cls._create_session(cls._pool_size)
+            else:
+                cls._mount(cls._session, cls._pool_size)
+
+    @classmethod
+    def session(cls) -> requests.Session:
+        if cls._session is None:
+            with cls._lock:
+                if cls._session is None:
+                    cls._session = cls._create_session(cls._pool_size)
+        return cls._session
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            if cls._session is not None:
+                cls._session.close()
+            cls._session = None
+
+    @classmethod
+    def _create_session(cls, pool_size: int) -> requests.Session:
+        session = requests.Session()
+        cls._mount(session, pool_size)
+        return session
+
+    @classmethod
+    def _mount(cls, session: requests.Session, pool_size: int) -> None:
+        # Retries are handled by GitHubApi.get() itself.
+        adapter = HTTPAdapter(pool_connections=cls._pool_hosts, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    @classmethod
+    def get(cls, url: str, **kwargs) -> Response:
+        return cls.session().get(url, **kwargs)
+
+    @classmethod
+    def post(cls, url: str, **kwargs) -> Response:
+        return cls.session().post(url, **kwargs)
@@ -1,6 +1,6 @@
-import requests
 import json
 from datetime import datetime
+from src.github.session import HttpSession
 
 
 class TokenInstance:
@@ -8,7 +8,6 @@ class TokenInstance:
     _valid: bool = None
     _usage: int = None
     _rate_limit: tuple[int, datetime] = None
-    _refresh_token_every: int = 10
 
     @property
     def access_token(self) -> str:
@@ -21,7 +20,8 @@ class TokenInstance:
 
     @property
     def valid(self) -> bool:
-        return self._valid or False
+        # Requests still in flight may have used the last calls, the token is of no use until it resets.
+        return (self._valid or False) and (self._rate_limit is None or self._rate_limit[0] > 0)
 
     @property
     def remaining_calls(self) -> int:
@@ -46,7 +46,7 @@ class TokenInstance:
         return False
 
     def _get_rate_limit(self) -> tuple[int, datetime]:
-        response = requests.get(
+        response = HttpSession.get(
             'https://api.github.com/rate_limit',
             headers={
                 'Authorization': f"token {self.access_token}",
@@ -67,7 +67,30 @@ class TokenInstance:
             self._valid = False
 
     def increase_usage(self) -> int:
+        # Until the response arrives, count the request against the remaining calls.
         self._usage += 1
-        if self._usage % self._refresh_token_every == 0:
-            self.refresh()
+        if self._rate_limit is not None:
+            self._rate_limit = (max(self._rate_limit[0] - 1, 0), self._rate_limit[1])
         return self._usage
+
+    def update(self, headers: dict) -> bool:
+        """
+        Takes the rate limit from the headers of a response, so /rate_limit doesn't have to be polled. Only the core
+        limit is tracked, GraphQL and search have their own.
+        """
+        if headers.get('X-RateLimit-Resource', 'core') != 'core':
+            return False
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return False
+
+        rate_limit = (int(remaining), datetime.fromtimestamp(int(reset)))
+        # Responses of parallel requests arrive out of order, within a window the remaining calls only go down.
+        if self._rate_limit is not None and self._rate_limit[1] == rate_limit[1] and self._rate_limit[0] < rate_limit[0]:
+            return False
+
+        self._rate_limit = rate_limit
+        self._valid = self.remaining_calls > 0
+        return True
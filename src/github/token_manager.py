@@ -1,10 +1,26 @@
+import heapq
+import threading
+import time
+from datetime import datetime
 from loguru import logger
 from src.github.exceptions import NoValidAccessToken, ApiRateLimitExceeded
 from src.github.token import TokenInstance
 
 
 class TokenManager:
+    """
+    Hands out the token with the most remaining calls.
+
+    Tokens sit in a max-heap keyed by their remaining calls, which are kept current from the rate limit headers of every
+    response (see update()). Entries are never updated in place: every change pushes a new one and the outdated ones are
+    skipped when they reach the top. When all tokens are exhausted, instance() sleeps until the earliest reset.
+    """
     _tokens: list[TokenInstance] = None
+    _heap: list = None
+    _latest: dict = None
+    _sequence: int = 0
+    _lock: threading.Condition = None
+    _waited: float = 0
     log: logger = None
     _is_loaded: bool = None
 
@@ -12,6 +28,9 @@ class TokenManager:
         self.log = log
         self._tokens = [TokenInstance(access_tokens) for access_tokens in access_tokens]
         self._is_loaded = False
+        self._lock = threading.Condition()
+        self._latest = {}
+        self._rebuild()
 
     def _load(self) -> None:
         has_valid = False
@@ -26,59 +45,104 @@ class TokenManager:
                 self.log.error(f"API Limit reached for access token: {instance.access_token_masked}. Token resets at {instance.resets_at}")
             else:
                 self.log.error(f"Invalid access token: {instance.access_token_masked}")
+        self._rebuild()
         if not has_valid:
             raise NoValidAccessToken("No valid access token passed")
 
+    def _rebuild(self) -> None:
+        self._heap = []
+        for index in range(len(self._tokens)):
+            self._push(index)
+
+    def _push(self, index: int) -> None:
+        # The sequence breaks ties, so tokens with the same budget take turns.
+        self._sequence += 1
+        self._latest[index] = self._sequence
+        heapq.heappush(self._heap, (-self._tokens[index].remaining_calls, self._sequence, index))
+        if len(self._heap) > 4 * len(self._tokens) + 16:
+            self._rebuild()
+
+    def _best(self) -> int | None:
+        while self._heap:
+            _, sequence, index = self._heap[0]
+            if self._latest[index] != sequence:
+                heapq.heappop(self._heap)
+                continue
+            # The top has the most remaining calls, if it can't be used none of them can.
+            return index if self._tokens[index].valid else None
+        return None
+
     def has_valid_token(self) -> bool:
         return any(instance.valid for instance in self._tokens)
 
     def refresh_all(self) -> None:
-        for instance in self._tokens:
-            instance.refresh()
+        with self._lock:
+            for instance in self._tokens:
+                instance.refresh()
+            self._rebuild()
+
+    def update(self, instance: TokenInstance, headers: dict) -> None:
+        with self._lock:
+            if instance.update(headers):
+                self._push(self._tokens.index(instance))
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'tokens': [
+                    {
+                        'token': instance.access_token_masked,
+                        'requests': instance.usage,
+                        'remaining': instance.remaining_calls,
+                        'resets_at': instance.resets_at.isoformat() if isinstance(instance.resets_at, datetime) else None
+                    } for instance in self._tokens
+                ],
+                'waited_seconds': round(self._waited, 1)
+            }
+
+    def seconds_until_reset(self) -> float | None:
+        now = datetime.now()
+        resets = [instance.resets_at for instance in self._tokens if isinstance(instance.resets_at, datetime) and instance.resets_at > now]
+        if len(resets) == 0:
+            return None
+        return (min(resets) - now).total_seconds()
 
     def instance(self) -> TokenInstance:
-        """
-        If there is only one instance:
-            1. Check if it's valid.
-            2. If it isn't, refresh.
-            3. If it still isn't valid, throw exception.
-            4. If it is valid, return.
-
-        If there are more than one instances:
-            1. Find the first valid instance that is _after_ the current instance index (to ensure rolling usage).
-            2. Return that instance.
-            3. If there are no other valid instances, refresh them all.
-            4. If there are still no valid instances, throw exception.
-            5. Otherwise, return the first valid one.
-        """
-        if not self._is_loaded:
-            self._load()
-            self._is_loaded = True
-
-        if len(self._tokens) == 1:
-            if not self._tokens[0].valid:
-                self._tokens[0].refresh()
-                if not self._tokens[0].valid:
+        with self._lock:
+            if not self._is_loaded:
+                self._load()
+                self._is_loaded = True
+
+            while True:
+                index = self._best()
+                if index is not None:
+                    self._tokens[index].increase_usage()
+                    self._push(index)
+                    return self._tokens[index]
+
+                # Tokens past their reset have their calls back, anything else is waited for.
+                now = datetime.now()
+                due = [index for index, instance in enumerate(self._tokens) if isinstance(instance.resets_at, datetime) and instance.resets_at <= now]
+                if len(due) > 0:
+                    for index in due:
+                        self._tokens[index].refresh()
+                    self._rebuild()
+                    if self._best() is not None:
+                        continue
+
+                wait = self.seconds_until_reset()
+                if not wait:
                     self._show_instance_reset_times()
                     raise ApiRateLimitExceeded("All tokens have exceeded their API limits")
-            self._tokens[0].increase_usage()
-            return self._tokens[0]
-
-        next_instance_index = self._find_next_instance()
-        if next_instance_index is None:
-            self.refresh_all()
-            next_instance_index = self._find_next_instance()
-            if next_instance_index is None:
-                self._show_instance_reset_times()
-                raise ApiRateLimitExceeded("All tokens have exceeded their API limits")
 
-        self._tokens[next_instance_index].increase_usage()
-        return self._tokens[next_instance_index]
+                self.log.warning(f"All tokens have exceeded their API limits - waiting {wait:.0f} seconds for the first one to reset")
+                # Releases the lock while sleeping, threads that get here in the meantime wait for the same reset.
+                started = time.monotonic()
+                self._lock.wait(wait + 1)
+                self._waited += time.monotonic() - started
 
     def _show_instance_reset_times(self) -> None:
         for instance in self._tokens:
             instance.refresh()
             self.log.info(f"API token {instance.access_token_masked} resets at {instance.resets_at}")
-
-    def _find_next_instance(self) -> int | None:
-        return next((index for index, instance in enumerate(self._tokens) if instance.valid), None)
@@ -0,0 +1,59 @@
+import asyncio
+import concurrent.futures
+from collections.abc import Callable, Iterable
+from src.libs.worker_pool import WorkerPool
+
+
+class AsyncEngine(WorkerPool):
+    """
+    Continuous work queue driven by an asyncio event loop.
+
+    Items are pulled from `producer` whenever there is room in the queue, at most `threads` of them run `worker`
+    at any time (bounded by a semaphore) and every result is handed to `consumer` on the event loop thread as soon
+    as it completes. As the consumer is the only place writing to the database, writes stay serialised in the order
+    results arrive and no lock is required.
+
+    The HTTP layer (requests) is blocking, so workers are executed in a thread pool owned by the loop.
+    """
+
+    def run(self, producer: Callable | Iterable, worker: Callable, consumer: Callable, commit: Callable | None = None, key: Callable | None = None) -> int:
+        producer = producer if callable(producer) else iter(producer)
+        return asyncio.run(self._run(producer, worker, consumer, commit, key or (lambda item: item.id)))
+
+    async def _run(self, producer: Callable | Iterable, worker: Callable, consumer: Callable, commit: Callable | None, key: Callable) -> int:
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.threads)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads)
+
+        async def execute(item: any) -> any:
+            async with semaphore:
+                return await loop.run_in_executor(executor, worker, item)
+
+        in_flight = {}
+        processed = 0
+        try:
+            while True:
+                free = self.queue_size - len(in_flight)
+                if free > 0:
+                    for item in self._next(producer, free, in_flight.values(), key):
+                        in_flight[asyncio.ensure_future(execute(item))] = item
+
+                if len(in_flight) == 0:
+                    break
+
+                done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    item = in_flight.pop(task)
+                    # Raises the worker's exception, the same way Utils.multithread() does.
+                    consumer(item, task.result())
+                    processed += 1
+                    if commit and processed % self.commit_every == 0:
+                        commit()
+        finally:
+            for task in in_flight.keys():
+                task.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if commit:
+            commit()
+        return processed
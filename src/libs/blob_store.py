@@ -0,0 +1,34 @@
+import os
+import hashlib
+from src.libs.disk_cache import DiskCache
+
+
+class BlobStore(DiskCache):
+    """
+    Content of downloaded files keyed by (org, repo, commit sha, path).
+
+    A file at a given commit never changes, so once stored it can be reused by any run and any database pointing to
+    the same directory without asking GitHub again.
+    """
+    extension: str = '.blob'
+
+    @staticmethod
+    def key(org: str, repo: str, commit: str, path: str) -> str:
+        return hashlib.sha256(f"{org.lower()}/{repo.lower()}@{commit.lower()}:{path.lstrip('/')}".encode()).hexdigest()
+
+    def get(self, org: str, repo: str, commit: str, path: str) -> str | None:
+        key = self.key(org, repo, commit, path)
+        data = self.read(key)
+        if data is None:
+            self.miss()
+            return None
+
+        self.touch(key)
+        return data.decode('utf-8')
+
+    def put(self, org: str, repo: str, commit: str, path: str, contents: str) -> None:
+        self.write(self.key(org, repo, commit, path), contents.encode('utf-8'))
+
+    def _file(self, key: str) -> str:
+        # Spread blobs over sub-directories to keep directory listings short.
+        return os.path.join(self.path, key[:2], f"{key}{self.extension}")
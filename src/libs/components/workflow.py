@@ -1,7 +1,9 @@
 import json
 from src.libs.components.base import BaseComponent
 from src.libs.components.repo import RepoComponent
+from src.libs.compressor import Compressor
 from src.libs.constants import WorkflowType, RepoStatus, RepoVisibility, GitHubRefType
+from src.libs.serializer import DataSerializer
 from src.libs.utils import Utils
 
 
@@ -11,9 +13,10 @@ class WorkflowComponent(BaseComponent):
     _redirect_id: int = None
     _path: str = None
     _type: WorkflowType = None
-    _contents: str = None
+    _contents: str | bytes = None
     _data: dict | list = None
     _status: RepoStatus = None
+    _blob_id: int = None
 
     @property
     def id(self) -> int:
@@ -67,12 +70,23 @@ class WorkflowComponent(BaseComponent):
     def status(self, value: RepoStatus):
         self._status = value
 
+    @property
+    def blob_id(self) -> int:
+        return self._blob_id or 0
+
+    @blob_id.setter
+    def blob_id(self, value: int):
+        self._blob_id = value
+
     @property
     def contents(self) -> str:
+        # Compressed contents are only decompressed when something reads them.
+        if isinstance(self._contents, bytes):
+            self._contents = Compressor.decompress(self._contents)
         return self._contents or ''
 
     @contents.setter
-    def contents(self, value: str):
+    def contents(self, value: str | bytes):
         self._contents = value
 
     @property
@@ -125,7 +139,10 @@ class WorkflowComponent(BaseComponent):
             return None
 
         ref_path = ''
-        if self.repo.ref_type == GitHubRefType.BRANCH:
+        if ref != self.repo.ref:
+            # Anything else asked for, like the commit the ref points to, is used as it is.
+            pass
+        elif self.repo.ref_type == GitHubRefType.BRANCH:
             ref_path = 'refs/heads/'
         elif self.repo.ref_type == GitHubRefType.TAG:
             ref_path = 'refs/tags/'
@@ -172,8 +189,8 @@ class WorkflowComponent(BaseComponent):
         ]
 
         if includes_contents:
+            # The contents are optional, processing only needs the data.
             required_keys.append('workflow_data')
-            required_keys.append('workflow_contents')
 
         missing_keys = [key for key in required_keys if key not in data]
         if missing_keys:
@@ -184,9 +201,11 @@ class WorkflowComponent(BaseComponent):
         instance.redirect_id = data['workflow_redirect_id']
         instance.type = data['workflow_type']
         instance.status = data['workflow_status']
+        instance.blob_id = data.get('workflow_blob_id', 0)
         if includes_contents:
-            instance.data = Utils.load_json(data['workflow_data'], None)
-            instance.content = data['workflow_contents']
+            instance.data = DataSerializer.loads(data['workflow_data'])
+            if 'workflow_contents' in data:
+                instance.contents = data['workflow_contents']
         instance.repo = RepoComponent.from_dict(data)
         instance.repo.ref_type = data['repo_ref_type']
         instance.repo.resolved_ref = data['repo_resolved_ref']
@@ -0,0 +1,96 @@
+import zlib
+import struct
+
+try:
+    # Python 3.14+
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        # Optional, only needed for the zstd codec.
+        zstd = None
+
+
+class Compressor:
+    """
+    Compresses the downloaded workflow files kept in `workflows.contents`.
+
+    Compressed values are stored as bytes starting with a one byte codec tag and the uncompressed size, so size
+    statistics don't need to decompress anything. Uncompressed contents stay text like they always were, a database
+    can hold any mix of both.
+    """
+    NONE: str = 'none'
+    ZLIB: str = 'zlib'
+    ZSTD: str = 'zstd'
+
+    zlib_level: int = 6
+    zstd_level: int = 3
+
+    _header: struct.Struct = struct.Struct('>BI')
+    _codecs: dict = {}
+    _tags: dict = {}
+
+    @classmethod
+    def register(cls, name: str, tag: int, compress: callable, decompress: callable) -> None:
+        cls._codecs[name] = (tag, compress)
+        cls._tags[tag] = (name, decompress)
+
+    @classmethod
+    def codecs(cls) -> list[str]:
+        return [cls.NONE] + list(cls._codecs)
+
+    @classmethod
+    def pack(cls, data: bytes, codec: str) -> bytes:
+        if codec not in cls._codecs:
+            raise ValueError(f"Unknown compression codec: {codec}")
+        tag, compress = cls._codecs[codec]
+        return cls._header.pack(tag, len(data)) + compress(data)
+
+    @classmethod
+    def unpack(cls, value: bytes) -> bytes:
+        tag, _ = cls._header.unpack_from(value)
+        _, decompress = cls._tags[tag]
+        return decompress(value[cls._header.size:])
+
+    @classmethod
+    def compress(cls, text: str | None, codec: str) -> str | bytes | None:
+        if not text or codec == cls.NONE:
+            return text
+        return cls.pack(text.encode('utf-8'), codec)
+
+    @classmethod
+    def decompress(cls, value: str | bytes | None) -> str | None:
+        if value is None or isinstance(value, str):
+            return value
+        return cls.unpack(value).decode('utf-8')
+
+    @classmethod
+    def codec_of(cls, value: str | bytes | None) -> str | None:
+        if not value:
+            return None
+        elif isinstance(value, str):
+            return cls.NONE
+        return cls._tags[value[0]][0] if value[0] in cls._tags else None
+
+    @classmethod
+    def original_size(cls, value: str | bytes | None) -> int:
+        if not value:
+            return 0
+        elif isinstance(value, str):
+            return len(value.encode('utf-8'))
+        return cls._header.unpack_from(value)[1]
+
+
+Compressor.register(
+    Compressor.ZLIB, 1,
+    lambda data: zlib.compress(data, Compressor.zlib_level),
+    zlib.decompress
+)
+
+if zstd:
+    Compressor.register(
+        Compressor.ZSTD, 2,
+        lambda data: zstd.compress(data, Compressor.zstd_level),
+        zstd.decompress
+    )
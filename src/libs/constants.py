@@ -78,3 +78,23 @@ class SecretVariableVisibility(IntEnum):
     ALL = 1
     PRIVATE = 2
     SELECTED = 3
+
+class Engine(IntEnum):
+    THREADS = 1
+    ASYNC = 2
+    PROCESSES = 3
+
+class ArchiveMode(IntEnum):
+    NEVER = 1
+    AUTO = 2
+    ALWAYS = 3
+
+class DatabaseCommandType(IntEnum):
+    WRITE = 1
+    READ = 2
+    COMMIT = 3
+    STOP = 4
+
+class DatabaseProfile(IntEnum):
+    SAFE = 1
+    FAST = 2
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class DiskCache:
+    """
+    Directory of files bounded by size, the least recently used ones are removed first once it grows over `max_size`
+    bytes. Files are written atomically, so the same directory can be shared by several processes.
+    """
+    path: str = None
+    max_size: int = None
+    extension: str = '.cache'
+
+    # Key to size, least recently used first.
+    _entries: OrderedDict = None
+    _size: int = 0
+    _lock: threading.Lock = None
+    _stats: dict = None
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+        os.makedirs(self.path, exist_ok=True)
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(self.extension):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_mtime, name[:-len(self.extension)], stat.st_size))
+                self._size += stat.st_size
+        # Sorted once here, from then on every use moves the entry to the end.
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+
+        with self._lock:
+            self._evict()
+
+    def read(self, key: str) -> bytes | None:
+        try:
+            with open(self._file(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def touch(self, key: str) -> None:
+        with self._lock:
+            self._stats['hits'] += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        try:
+            os.utime(self._file(key))
+        except OSError:
+            pass
+
+    def miss(self) -> None:
+        with self._lock:
+            self._stats['misses'] += 1
+
+    def write(self, key: str, data: bytes) -> bool:
+        if len(data) > self.max_size:
+            return False
+
+        file = self._file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        # Write to a temporary file first so nobody ever reads a partial entry.
+        handle, temp_file = tempfile.mkstemp(dir=os.path.dirname(file), suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, file)
+
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._stats['stored'] += 1
+            self._evict()
+        return True
+
+    def _evict(self) -> None:
+        while self._size > self.max_size and self._entries:
+            key, size = self._entries.popitem(last=False)
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+            self._size -= size
+            self._stats['evicted'] += 1
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}{self.extension}")
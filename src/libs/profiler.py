@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import tempfile
+import threading
+from collections.abc import Callable
+from contextlib import contextmanager
+from datetime import datetime
+from loguru import logger
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is left out of the report.
+    resource = None
+
+
+class Profiler:
+    """
+    Measures the phases of a command and writes them to a JSON run report at `path`.
+
+    Every phase records its wall time, CPU time (of the whole process, so worker threads are included), SQL queries,
+    API calls and the peak RSS of the process so far. With `cpu_profile` each phase also gets a cProfile dump next to
+    the report, covering the thread that runs the phase and every thread started during it.
+    """
+    path: str = None
+    cpu_profile: bool = False
+    log: logger = None
+
+    _command: str = None
+    _started: datetime = None
+    _phases: list = None
+    _counters: dict = None
+    _lock: threading.Lock = None
+
+    def __init__(self, path: str, command: str, log: logger, cpu_profile: bool = False):
+        self.path = path
+        self.cpu_profile = cpu_profile
+        self.log = log
+        self._command = command
+        self._started = datetime.now()
+        self._phases = []
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def track(self, name: str, counter: Callable[[], int]) -> None:
+        # Counters only ever go up, phases report how much they moved.
+        self._counters[name] = counter
+
+    @property
+    def phases(self) -> list[dict]:
+        return list(self._phases)
+
+    @staticmethod
+    def peak_rss_mb() -> float | None:
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes.
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+    @contextmanager
+    def phase(self, name: str):
+        counters = {counter: read() for counter, read in self._counters.items()}
+        profiles = []
+        if self.cpu_profile:
+            profile = cProfile.Profile()
+            threading.setprofile(self._thread_profiler(profiles))
+            profile.enable()
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                'name': name,
+                'wall_seconds': round(time.perf_counter() - wall, 3),
+                'cpu_seconds': round(time.process_time() - cpu, 3)
+            }
+            for counter, read in self._counters.items():
+                record[counter] = read() - counters[counter]
+            record['peak_rss_mb'] = self.peak_rss_mb()
+
+            if self.cpu_profile:
+                profile.disable()
+                threading.setprofile(None)
+                record['pstats'] = self._save_profile(len(self._phases), name, [profile] + profiles)
+
+            self._phases.append(record)
+            self.log.debug(f"Phase {name}: {record['wall_seconds']}s wall, {record['cpu_seconds']}s CPU, " + ", ".join(f"{counter} {record[counter]}" for counter in self._counters))
+            self.save()
+
+    def _thread_profiler(self, profiles: list) -> Callable:
+        def start(frame, event, arg):
+            # Runs on the first call of a new thread, enabling the profile replaces this hook.
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is already active.
+                return
+            with self._lock:
+                profiles.append(profile)
+        return start
+
+    def _save_profile(self, index: int, name: str, profiles: list[cProfile.Profile]) -> str:
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            try:
+                stats.add(profile)
+            except TypeError:
+                # Threads that were started but never ran any Python code.
+                continue
+
+        base, _ = os.path.splitext(self.path)
+        safe_name = re.sub(r'[^\w.-]+', '_', name)
+        path = f"{base}.{index:02d}-{safe_name}.pstats"
+        stats.dump_stats(path)
+        return path
+
+    def report(self) -> dict:
+        phases = self.phases
+        total = {
+            'wall_seconds': round(sum(phase['wall_seconds'] for phase in phases), 3),
+            'cpu_seconds': round(sum(phase['cpu_seconds'] for phase in phases), 3),
+            'peak_rss_mb': self.peak_rss_mb()
+        }
+        for counter in self._counters:
+            total[counter] = sum(phase[counter] for phase in phases)
+
+        return {
+            'command': self._command,
+            'started': self._started.isoformat(),
+            'phases': phases,
+            'total': total
+        }
+
+    def save(self) -> None:
+        # Saved after every phase, so a long run that fails still leaves the phases it finished.
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,94 @@
+import json
+import zlib
+from collections.abc import Callable
+from src.libs.compressor import Compressor
+
+try:
+    import msgpack
+except ImportError:
+    # Optional, only needed for the msgpack format.
+    msgpack = None
+
+
+class DataSerializer:
+    """
+    Encodes the parsed YAML of workflows for the `workflows.data` column.
+
+    Binary formats start with a one byte tag naming the format they were written in, so a database can hold any mix of
+    them and every row is decoded with its own format. Plain JSON is stored as untagged text like it always was, which
+    keeps existing databases readable.
+    """
+    JSON: str = 'json'
+    JSON_ZLIB: str = 'json-zlib'
+    JSON_ZSTD: str = 'json-zstd'
+    MSGPACK: str = 'msgpack'
+
+    default: str = JSON_ZLIB
+
+    _formats: dict = {}
+    _tags: dict = {}
+
+    @classmethod
+    def register(cls, name: str, tag: int, dumps: Callable[[any], bytes], loads: Callable[[bytes], any]) -> None:
+        if tag in cls._tags and cls._tags[tag][0] != name:
+            raise ValueError(f"Tag {tag} is already used by {cls._tags[tag][0]}")
+        cls._formats[name] = (tag, dumps)
+        cls._tags[tag] = (name, loads)
+
+    @classmethod
+    def formats(cls) -> list[str]:
+        return [cls.JSON] + list(cls._formats)
+
+    @classmethod
+    def format_of(cls, value: str | bytes | None) -> str | None:
+        if not value:
+            return None
+        elif isinstance(value, str):
+            return cls.JSON
+        return cls._tags[value[0]][0] if value[0] in cls._tags else None
+
+    @classmethod
+    def dumps(cls, data: any, format: str | None = None) -> str | bytes:
+        format = format or cls.default
+        if format == cls.JSON:
+            return json.dumps(data)
+        elif format not in cls._formats:
+            raise ValueError(f"Unknown data format: {format}")
+
+        tag, dumps = cls._formats[format]
+        return bytes([tag]) + dumps(data)
+
+    @classmethod
+    def loads(cls, value: str | bytes | None, default: any = None) -> any:
+        if not value:
+            return default
+
+        try:
+            if isinstance(value, str):
+                return json.loads(value)
+            _, loads = cls._tags[value[0]]
+            return loads(value[1:])
+        except Exception:
+            return default
+
+
+DataSerializer.register(
+    DataSerializer.JSON_ZLIB, 1,
+    lambda data: zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8')),
+    lambda value: json.loads(zlib.decompress(value))
+)
+
+if Compressor.ZSTD in Compressor.codecs():
+    DataSerializer.register(
+        DataSerializer.JSON_ZSTD, 3,
+        lambda data: Compressor.pack(json.dumps(data, separators=(',', ':')).encode('utf-8'), Compressor.ZSTD),
+        lambda value: json.loads(Compressor.unpack(value))
+    )
+
+if msgpack:
+    # Keys that aren't strings (`3.10:` in a matrix) are kept as they are, JSON turns them into strings.
+    DataSerializer.register(
+        DataSerializer.MSGPACK, 2,
+        msgpack.packb,
+        lambda value: msgpack.unpackb(value, strict_map_key=False)
+    )
@@ -7,11 +7,28 @@ from collections.abc import Callable
 from itertools import islice
 from pathlib import Path
 from loguru import logger
-from yaml.constructor import Constructor
 from src.libs.components.org import OrgComponent
 from src.libs.components.repo import RepoComponent
 from src.libs.thread_executor import ThreadExecutor
 
+# libyaml's parser when PyYAML was built with it, it's several times faster than the pure Python one.
+YamlLoader = yaml.CSafeLoader if yaml.__with_libyaml__ else yaml.SafeLoader
+
+
+class YamlTextLoader(YamlLoader):
+    """
+    Loads booleans and timestamps as the text they were written as, so `on:` stays a key rather than becoming True
+    and values like `yes` or `2024-01-01` are stored unchanged (https://stackoverflow.com/a/36463915).
+
+    The constructors are registered once on this class, the loaders of other libraries aren't affected.
+    """
+    def construct_text(self, node: yaml.ScalarNode) -> str:
+        return self.construct_scalar(node)
+
+
+YamlTextLoader.add_constructor('tag:yaml.org,2002:bool', YamlTextLoader.construct_text)
+YamlTextLoader.add_constructor('tag:yaml.org,2002:timestamp', YamlTextLoader.construct_text)
+
 
 class Utils:
     @staticmethod
@@ -93,6 +110,10 @@ class Utils:
     def md5(data: str) -> str:
         return hashlib.md5(data.encode()).hexdigest()
 
+    @staticmethod
+    def sha256(data: str) -> str:
+        return hashlib.sha256(data.encode()).hexdigest()
+
     @staticmethod
     def split_list(data: list, size: int) -> list | None:
         iterator = iter(data)
@@ -125,7 +146,7 @@ class Utils:
         return name
 
     @staticmethod
-    def multithread(function: Callable, arguments: list[tuple]) -> None:
+    def multithread(function: Callable, arguments: list[tuple]) -> list:
         threads = []
         for args in arguments:
             thread = ThreadExecutor(target=function, args=args)
@@ -133,25 +154,15 @@ class Utils:
             thread.start()
 
         Utils.wait_for_threads(threads, True)
+        # Results are returned in the same order as the arguments.
+        return [thread.result for thread in threads]
 
     @staticmethod
     def load_yaml(text: str, treat_as_text: bool = True, debug: dict = None) -> dict | None:
-        # https://stackoverflow.com/a/36463915
-        def add_bool(self, node):
-            return self.construct_scalar(node)
-
-        # Same, but leaving dates alone.
-        def convert_date(self, node):
-            return self.construct_scalar(node)
-
-        if treat_as_text:
-            Constructor.add_constructor(u'tag:yaml.org,2002:bool', add_bool)
-            Constructor.add_constructor(u'tag:yaml.org,2002:timestamp', convert_date)
-
         try:
-            return yaml.load(text, yaml.loader.Loader)
+            return yaml.load(text, YamlTextLoader if treat_as_text else YamlLoader)
         except Exception as e:
-            if debug:
+            if debug is not None:
                 debug['error'] = str(e)
             return None
 
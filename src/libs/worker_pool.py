@@ -0,0 +1,117 @@
+import queue
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
+from loguru import logger
+
+
+class WorkerPool:
+    """
+    Long-lived pool of worker threads fed by a streaming work queue.
+
+    The calling thread is the only one touching the database: it tops up the work queue from `producer` (prefetching
+    up to `prefetch` items more than there are workers), and hands every completed result to `consumer` as soon as
+    it arrives. Workers never wait on each other, so one slow item no longer holds back a whole batch.
+
+    `producer` is either a callable returning the next pending rows (items stay pending until their result is
+    consumed, so in-flight items are filtered out by `key`), or any iterable of items.
+    """
+    threads: int = None
+    prefetch: int = None
+    commit_every: int = 100
+    log: logger = None
+
+    _stop: object = object()
+
+    def __init__(self, threads: int, log: logger, prefetch: int | None = None):
+        self.threads = max(threads, 1)
+        self.prefetch = self.threads if prefetch is None else max(prefetch, 0)
+        self.log = log
+
+    @property
+    def queue_size(self) -> int:
+        return self.threads + self.prefetch
+
+    def run(self, producer: Callable | Iterable, worker: Callable, consumer: Callable, commit: Callable | None = None, key: Callable | None = None) -> int:
+        key = key or (lambda item: item.id)
+        producer = producer if callable(producer) else iter(producer)
+        tasks = queue.Queue()
+        results = queue.Queue()
+
+        workers = [threading.Thread(target=self._work, args=(worker, tasks, results), daemon=True) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+
+        in_flight = {}
+        processed = 0
+        try:
+            while True:
+                free = self.queue_size - len(in_flight)
+                if free > 0:
+                    for item in self._next(producer, free, in_flight.values(), key):
+                        in_flight[id(item)] = item
+                        tasks.put(item)
+
+                if len(in_flight) == 0:
+                    break
+
+                # Block for the first result, then take whatever else is ready before querying for more work.
+                completed = [results.get()]
+                while True:
+                    try:
+                        completed.append(results.get_nowait())
+                    except queue.Empty:
+                        break
+
+                for item, result, exception in completed:
+                    del in_flight[id(item)]
+                    if exception:
+                        raise exception
+                    consumer(item, result)
+                    processed += 1
+                    if commit and processed % self.commit_every == 0:
+                        commit()
+        finally:
+            self._shutdown(tasks, workers)
+
+        if commit:
+            commit()
+        return processed
+
+    def _work(self, worker: Callable, tasks: queue.Queue, results: queue.Queue) -> None:
+        while True:
+            item = tasks.get()
+            if item is self._stop:
+                return
+
+            try:
+                results.put((item, worker(item), None))
+            except Exception as e:
+                results.put((item, None, e))
+
+    def _shutdown(self, tasks: queue.Queue, workers: list[threading.Thread]) -> None:
+        # Drop anything that hasn't started yet (only happens on errors), and let running items finish.
+        while True:
+            try:
+                tasks.get_nowait()
+            except queue.Empty:
+                break
+
+        for _ in workers:
+            tasks.put(self._stop)
+        for thread in workers:
+            thread.join()
+
+    def _next(self, producer: Callable | Iterator, count: int, in_flight: Iterable, key: Callable) -> list:
+        if not callable(producer):
+            return list(islice(producer, count))
+
+        running = {key(item) for item in in_flight}
+        # Rows stay pending in the database until their result is consumed, so ask for enough to skip those in-flight.
+        batch = producer(count + len(running))
+        if not batch:
+            return []
+        elif not isinstance(batch, list):
+            batch = [batch]
+
+        return [item for item in batch if key(item) not in running][:count]
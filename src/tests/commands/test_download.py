@@ -1,7 +1,20 @@
+import io
+import os
+import json
+import shutil
+import tarfile
+import tempfile
 import pytest
+import requests
+from unittest.mock import patch
+from requests.models import Response
 from src.tests.helpers import _args_download, _get_db_path
+from src.tests.mock_responses import download_vscode
 from src.commands.download.command import CommandDownload
+from src.commands.download.download import ServiceDownload
 from src.database.database import Database
+from src.github.client import GitHubClient
+from src.libs.blob_store import BlobStore
 from src.libs.constants import GitHubRefType, RepoVisibility, PollStatus, RepoStatus, WorkflowType, WorkflowStatus
 
 @pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
@@ -62,13 +75,13 @@ def test_download_vscode(logger, mock_requests_get):
     assert checkout_workflow.id > 0
 
     assert vscode_workflow.type == WorkflowType.WORKFLOW
-    assert vscode_workflow.contents != ''
-    assert vscode_workflow.data != ''
+    assert database.get_full_workflow_from_id(vscode_workflow.id).contents != ''
+    assert database.get_full_workflow_from_id(vscode_workflow.id).data
     assert vscode_workflow.status == WorkflowStatus.DOWNLOADED
 
     assert checkout_workflow.type == WorkflowType.ACTION
-    assert checkout_workflow.contents != ''
-    assert checkout_workflow.data != ''
+    assert database.get_full_workflow_from_id(checkout_workflow.id).contents != ''
+    assert database.get_full_workflow_from_id(checkout_workflow.id).data
     assert checkout_workflow.status == WorkflowStatus.DOWNLOADED
 
 @pytest.mark.parametrize('mock_requests_get', ['missing_org'], indirect=True)
@@ -171,3 +184,274 @@ def test_download_renamed_branch(logger, mock_requests_get):
     assert pr_push.id > 0
     assert pr_push.type == GitHubRefType.TAG
     assert pr_push.status == WorkflowStatus.DOWNLOADED
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_download_vscode_async_engine(logger, mock_requests_get):
+    command = CommandDownload(logger)
+
+    output_database = _get_db_path()
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, very_verbose=True, workflow=['copilot-setup-steps.yml'], engine='async', threads=4)
+    assert command.run(args) == True
+
+    database = Database(output_database)
+
+    assert database.orgs().count() == 2
+    assert database.repos().count() == 4
+    assert database.workflows().count() == 4
+
+    microsoft = database.orgs().find('microsoft')
+    actions = database.orgs().find('actions')
+    vscode = database.repos().find(microsoft.id, 'vscode', 'main')
+    checkout = database.repos().find(actions.id, 'checkout', 'v5')
+
+    assert vscode.ref_commit == '84fed05516884c03062782cd45adf04739c4ea04'
+    assert vscode.poll_status == PollStatus.SCANNED
+    assert checkout.ref_type == GitHubRefType.TAG
+    assert checkout.status == RepoStatus.OK
+
+    vscode_workflow = database.workflows().find(vscode.id, '.github/workflows/copilot-setup-steps.yml')
+    checkout_workflow = database.workflows().find(checkout.id, 'action.yml')
+    assert vscode_workflow.status == WorkflowStatus.DOWNLOADED
+    assert checkout_workflow.status == WorkflowStatus.DOWNLOADED
+
+
+def _by_commit(fixtures: callable) -> callable:
+    responses = download_vscode()
+
+    def _side_effect(url, *args, **kwargs):
+        # With a blob store files are downloaded by the commit their ref points to, the fixtures have them by branch or tag.
+        if url.startswith('https://raw.githubusercontent.com/') and url not in responses:
+            org, repo, commit, path = url.split('/', 6)[3:]
+            assert len(commit) == 40
+            url = next(name for name in responses if name.startswith(f"https://raw.githubusercontent.com/{org}/{repo}/") and name.endswith(f"/{path}"))
+        return fixtures(url, *args, **kwargs)
+    return _side_effect
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_download_vscode_blob_store(logger, mock_requests_get):
+    blob_store = os.path.join(tempfile.gettempdir(), 'butler-tests-blobs')
+    shutil.rmtree(blob_store, ignore_errors=True)
+
+    requests.Session.get.side_effect = _by_commit(requests.Session.get.side_effect)
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=_get_db_path(), very_verbose=True, workflow=['copilot-setup-steps.yml'], blob_store=blob_store)
+    assert command.run(args) == True
+    raw_downloads = [call.args[0] for call in requests.Session.get.call_args_list if 'raw.githubusercontent.com' in call.args[0]]
+    assert len(raw_downloads) > 0
+    assert 'https://raw.githubusercontent.com/microsoft/vscode/84fed05516884c03062782cd45adf04739c4ea04/.github/workflows/copilot-setup-steps.yml' in raw_downloads
+
+    # A second database reuses the files downloaded by the first one.
+    requests.Session.get.reset_mock()
+    output_database = _get_db_path()
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, very_verbose=True, workflow=['copilot-setup-steps.yml'], blob_store=blob_store)
+    assert command.run(args) == True
+    raw_downloads = [call for call in requests.Session.get.call_args_list if 'raw.githubusercontent.com' in call.args[0]]
+    assert len(raw_downloads) == 0
+
+    database = Database(output_database)
+    assert database.workflows().count() == 4
+    vscode = database.repos().find(database.orgs().find('microsoft').id, 'vscode', 'main')
+    vscode_workflow = database.workflows().find(vscode.id, '.github/workflows/copilot-setup-steps.yml')
+    assert vscode_workflow.status == WorkflowStatus.DOWNLOADED
+    assert 'Copilot Setup Steps' in database.get_full_workflow_from_id(vscode_workflow.id).contents
+    shutil.rmtree(blob_store)
+
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_download_vscode_ref_cache(logger, mock_requests_get):
+    ref_cache = os.path.join(tempfile.gettempdir(), 'butler-tests-refs.json')
+    if os.path.isfile(ref_cache):
+        os.remove(ref_cache)
+
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=_get_db_path(), very_verbose=True, workflow=['copilot-setup-steps.yml'], ref_cache=ref_cache)
+    assert command.run(args) == True
+    assert os.path.isfile(ref_cache)
+
+    # The second run loads every ref from the file saved by the first one.
+    requests.Session.get.reset_mock()
+    output_database = _get_db_path()
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, very_verbose=True, workflow=['copilot-setup-steps.yml'], ref_cache=ref_cache)
+    assert command.run(args) == True
+    ref_lookups = [call for call in requests.Session.get.call_args_list if '/git/ref/' in call.args[0] or '/commits/' in call.args[0]]
+    assert len(ref_lookups) == 0
+
+    database = Database(output_database)
+    microsoft = database.orgs().find('microsoft')
+    actions = database.orgs().find('actions')
+    vscode = database.repos().find(microsoft.id, 'vscode', 'main')
+    checkout = database.repos().find(actions.id, 'checkout', 'v5')
+    assert vscode.ref_type == GitHubRefType.BRANCH
+    assert vscode.ref_commit == '84fed05516884c03062782cd45adf04739c4ea04'
+    assert vscode.visibility == RepoVisibility.PUBLIC
+    assert vscode.stars == 177902
+    assert checkout.ref_type == GitHubRefType.TAG
+    assert checkout.ref_commit == '08c6903cd8c0fde910a37f88322edcfb5dd907a8'
+    assert checkout.status == RepoStatus.OK
+    os.remove(ref_cache)
+
+
+def _graphql_response(data: dict | None, status_code: int = 200) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.encoding = 'utf-8'
+    response._content = json.dumps({'data': data}).encode()
+    return response
+
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_download_vscode_graphql(logger, mock_requests_get):
+    responses = download_vscode()
+    listing = responses['/repos/microsoft/vscode/contents/.github/workflows'].response().json()
+    contents = responses['https://raw.githubusercontent.com/microsoft/vscode/refs/heads/main/.github/workflows/copilot-setup-steps.yml'].response().text
+
+    def _graphql(url, *args, **kwargs):
+        assert url == 'https://api.github.com/graphql'
+        assert kwargs['json']['variables'] == {'owner0': 'microsoft', 'name0': 'vscode', 'expression0': 'main:.github/workflows'}
+        entries = [
+            {
+                'path': file['path'],
+                'type': 'blob' if file['type'] == 'file' else 'tree',
+                'object': {'text': contents if file['name'] == 'copilot-setup-steps.yml' else 'name: Other', 'isBinary': False, 'isTruncated': False}
+            }
+            for file in listing
+        ]
+        return _graphql_response({'r0': {'object': {'entries': entries}}})
+
+    output_database = _get_db_path()
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, very_verbose=True, workflow=['copilot-setup-steps.yml'], graphql=True)
+    with patch('requests.Session.post', side_effect=_graphql) as post, \
+            patch.object(GitHubClient, 'prefetch_workflows', autospec=True, side_effect=GitHubClient.prefetch_workflows) as prefetch:
+        assert command.run(args) == True
+        assert post.call_count == 1
+
+    # Workflows skipped by --workflow aren't kept around.
+    assert prefetch.call_args.args[0]._prefetched_files == {}
+
+    # Neither the listing nor the workflow itself went through REST.
+    urls = [call.args[0] for call in requests.Session.get.call_args_list]
+    assert not any('/contents/.github/workflows' in url for url in urls)
+    assert not any('raw.githubusercontent.com/microsoft/vscode' in url for url in urls)
+
+    database = Database(output_database)
+    assert database.workflows().count() == 4
+    vscode = database.repos().find(database.orgs().find('microsoft').id, 'vscode', 'main')
+    vscode_workflow = database.workflows().find(vscode.id, '.github/workflows/copilot-setup-steps.yml')
+    assert vscode_workflow.status == WorkflowStatus.DOWNLOADED
+    assert database.get_full_workflow_from_id(vscode_workflow.id).contents == contents
+
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_download_vscode_graphql_fallback(logger, mock_requests_get):
+    output_database = _get_db_path()
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, very_verbose=True, workflow=['copilot-setup-steps.yml'], graphql=True)
+    with patch('requests.Session.post', return_value=_graphql_response(None, 502)):
+        assert command.run(args) == True
+
+    database = Database(output_database)
+    assert database.workflows().count() == 4
+    vscode = database.repos().find(database.orgs().find('microsoft').id, 'vscode', 'main')
+    vscode_workflow = database.workflows().find(vscode.id, '.github/workflows/copilot-setup-steps.yml')
+    assert vscode_workflow.status == WorkflowStatus.DOWNLOADED
+
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+@pytest.mark.parametrize('archive_commit', ['84fed05', 'a1b2c3d'])
+def test_download_vscode_archive(logger, mock_requests_get, archive_commit):
+    responses = download_vscode()
+    contents = responses['https://raw.githubusercontent.com/microsoft/vscode/refs/heads/main/.github/workflows/copilot-setup-steps.yml'].response().text
+    blob_store = os.path.join(tempfile.gettempdir(), 'butler-tests-archive-blobs')
+    shutil.rmtree(blob_store, ignore_errors=True)
+
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+        for name, data in {
+            'README.md': 'Visual Studio Code',
+            '.github/workflows/copilot-setup-steps.yml': contents,
+            '.github/workflows/other.yml': 'name: Other',
+            '.github/actions/setup/action.yml': 'name: Setup',
+        }.items():
+            name = f"microsoft-vscode-{archive_commit}/{name}"
+            member = tarfile.TarInfo(name)
+            member.size = len(data.encode())
+            tar.addfile(member, io.BytesIO(data.encode()))
+
+    fixtures = _by_commit(requests.Session.get.side_effect)
+
+    def _side_effect(url, *args, **kwargs):
+        if url == 'https://api.github.com/repos/microsoft/vscode/tarball/main':
+            assert kwargs['stream'] is True
+            response = Response()
+            response.status_code = 200
+            response.raw = io.BytesIO(archive.getvalue())
+            return response
+        return fixtures(url, *args, **kwargs)
+
+    requests.Session.get.side_effect = _side_effect
+    output_database = _get_db_path()
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, very_verbose=True, workflow=['copilot-setup-steps.yml'], archive='always', blob_store=blob_store)
+    assert command.run(args) == True
+
+    # Only kept by commit when the archive is of the commit the branch was resolved to.
+    stored = BlobStore(blob_store, 1024 * 1024).get('microsoft', 'vscode', '84fed05516884c03062782cd45adf04739c4ea04', '.github/workflows/copilot-setup-steps.yml')
+    assert stored == (contents if archive_commit == '84fed05' else None)
+    shutil.rmtree(blob_store)
+
+    # The listing and the workflow came from the archive.
+    urls = [call.args[0] for call in requests.Session.get.call_args_list]
+    assert not any('/contents/.github/workflows' in url for url in urls)
+    assert not any('raw.githubusercontent.com/microsoft/vscode' in url for url in urls)
+
+    database = Database(output_database)
+    assert database.workflows().count() == 4
+    vscode = database.repos().find(database.orgs().find('microsoft').id, 'vscode', 'main')
+    vscode_workflow = database.workflows().find(vscode.id, '.github/workflows/copilot-setup-steps.yml')
+    assert vscode_workflow.status == WorkflowStatus.DOWNLOADED
+    assert database.get_full_workflow_from_id(vscode_workflow.id).contents == contents
+
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_download_vscode_archive_auto_too_large(logger, mock_requests_get, monkeypatch):
+    monkeypatch.setattr(ServiceDownload, 'archive_threshold', 1)
+    output_database = _get_db_path()
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, very_verbose=True, workflow=['copilot-setup-steps.yml'], archive='auto')
+    assert command.run(args) == True
+
+    # vscode is over 1GB, way past --archive-max-size, so everything went through REST.
+    urls = [call.args[0] for call in requests.Session.get.call_args_list]
+    assert not any('/tarball/' in url for url in urls)
+    assert 'https://raw.githubusercontent.com/microsoft/vscode/refs/heads/main/.github/workflows/copilot-setup-steps.yml' in urls
+
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_download_vscode_api_metrics(logger, mock_requests_get):
+    metrics_file = os.path.join(tempfile.gettempdir(), 'butler-tests-metrics.json')
+    prometheus_file = os.path.join(tempfile.gettempdir(), 'butler-tests-metrics.prom')
+
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=_get_db_path(), very_verbose=True, workflow=['copilot-setup-steps.yml'], api_metrics=metrics_file, api_metrics_prometheus=prometheus_file)
+    assert command.run(args) == True
+
+    with open(metrics_file) as f:
+        summary = json.load(f)
+    endpoints = summary['endpoints']
+    # The /rate_limit checks of the token manager don't go through the API client.
+    assert summary['requests'] == len([call for call in requests.Session.get.call_args_list if not call.args[0].endswith('/rate_limit')])
+    assert endpoints['/repos/{owner}/{repo}']['statuses'] == {'200': 5}
+    assert endpoints['/repos/{owner}/{repo}/contents/{path}']['requests'] > 0
+    assert endpoints['raw.githubusercontent.com/{path}']['requests'] > 0
+    # Raw files are downloaded without a token.
+    assert summary['tokens']['tokens'][0]['requests'] == summary['requests'] - endpoints['raw.githubusercontent.com/{path}']['requests']
+
+    with open(prometheus_file) as f:
+        prometheus = f.read()
+    assert 'github_api_requests_total{endpoint="/repos/{owner}/{repo}",status="200"} 5' in prometheus
+    assert 'github_api_request_duration_seconds_bucket{endpoint="/repos/{owner}/{repo}",le="+Inf"} 5' in prometheus
+    os.remove(metrics_file)
+    os.remove(prometheus_file)
@@ -1,8 +1,19 @@
+import os
+import json
+import pstats
+import tempfile
 import pytest
-from src.tests.helpers import _args_download, _args_process, _get_db_path
+import requests
+from requests.models import Response
+from src.tests.helpers import _args_download, _args_process, _args_database, _get_db_path
 from src.commands.download.command import CommandDownload
+from src.commands.database.command import CommandDatabase
 from src.commands.process.command import CommandProcess
+from src.commands.process.process import ServiceProcess
 from src.database.database import Database
+from src.libs.compressor import Compressor
+from src.libs.constants import WorkflowStatus, WorkflowType
+from src.libs.serializer import DataSerializer
 
 @pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
 def test_process_vscode(logger, mock_requests_get):
@@ -95,3 +106,236 @@ def test_process_vscode(logger, mock_requests_get):
         assert result['property'] == data[i]['property']
         assert result['name'] == data[i]['name']
         assert result['value'] == data[i]['value']
+
+def _json_response(data: dict) -> Response:
+    response = Response()
+    response.status_code = 200
+    response._content = json.dumps(data).encode()
+    return response
+
+def _processed_counts(database: Database) -> dict:
+    return {
+        'jobs': database.jobs().count(),
+        'steps': database.steps().count(),
+        'jobdata': database.jobs().jobdata_count(),
+        'stepdata': database.steps().stepdata_count(),
+        'workflowdata': database.workflows().workflowdata_count(),
+        'variables': database.vars().count(),
+        'mappings': database.select("SELECT COUNT(*) AS total FROM variables_value_mapping")[0]['total'],
+    }
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_process_vscode_processes(logger, mock_requests_get):
+    rows = {}
+    for engine in ['threads', 'processes']:
+        output_database = _get_db_path()
+        args = _args_download(repo=["microsoft/vscode"], database=output_database, workflow=['copilot-setup-steps.yml'])
+        assert CommandDownload(logger).run(args) == True
+        assert CommandProcess(logger).run(_args_process(database=output_database, engine=engine, threads=2)) == True
+
+        database = Database(output_database)
+        assert database.select("SELECT COUNT(*) AS total FROM workflows WHERE status != :status", {'status': WorkflowStatus.PROCESSED})[0]['total'] == 0
+        rows[engine] = {
+            'counts': _processed_counts(database),
+            'step_data': database.select("SELECT s.step_number, sd.property, sd.name, sd.value FROM step_data sd JOIN steps s ON s.id = sd.step_id ORDER BY 1, 2, 3, 4"),
+            'variables': database.select("SELECT name FROM variables ORDER BY name"),
+        }
+        database.close()
+
+    # Worker processes write exactly what the threads do.
+    assert rows['processes']['counts']['jobs'] == 4
+    assert rows['processes']['counts']['jobdata'] == 143
+    assert rows['processes'] == rows['threads']
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_process_vscode_data_format(logger, mock_requests_get):
+    counts = {}
+    for data_format in ['json', 'json-zlib']:
+        output_database = _get_db_path()
+        args = _args_download(repo=["microsoft/vscode"], database=output_database, workflow=['copilot-setup-steps.yml'], data_format=data_format)
+        assert CommandDownload(logger).run(args) == True
+
+        database = Database(output_database)
+        rows = database.select("SELECT data FROM blobs WHERE data != ''")
+        assert len(rows) > 0
+        assert all(DataSerializer.format_of(row['data']) == data_format for row in rows)
+        database.close()
+
+        assert CommandProcess(logger).run(_args_process(database=output_database)) == True
+        database = Database(output_database)
+        counts[data_format] = _processed_counts(database)
+        database.close()
+
+    assert counts['json']['jobdata'] == 143
+    assert counts['json-zlib'] == counts['json']
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_process_vscode_compressed(logger, mock_requests_get):
+    output_database = _get_db_path()
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, workflow=['copilot-setup-steps.yml'], compress='zlib')
+    assert CommandDownload(logger).run(args) == True
+
+    database = Database(output_database)
+    rows = database.select("SELECT contents FROM blobs WHERE contents != ''")
+    assert len(rows) > 0
+    assert all(Compressor.codec_of(row['contents']) == 'zlib' for row in rows)
+    compressed = database.workflows().storage_stats()
+    assert compressed['contents_stored'] < compressed['contents_original']
+    database.close()
+
+    # Migrated back to plain text in place, nothing is lost on the way.
+    assert CommandDatabase(logger).run(_args_database(database=output_database, compress='none', data_format='json')) == True
+    database = Database(output_database)
+    plain = database.workflows().storage_stats()
+    assert plain['codecs'] == {'none': len(rows)} and plain['formats'] == {'json': len(rows)}
+    assert plain['contents_stored'] == plain['contents_original'] == compressed['contents_original']
+    assert plain['data_stored'] == plain['data_original'] == compressed['data_original']
+    workflow = database.get_full_workflow_from_id(database.select("SELECT id FROM workflows WHERE blob_id > 0 LIMIT 1")[0]['id'])
+    assert 'runs-on' in workflow.contents or 'runs:' in workflow.contents
+    database.close()
+
+    assert CommandDatabase(logger).run(_args_database(database=output_database, compress='zlib')) == True
+    assert CommandProcess(logger).run(_args_process(database=output_database)) == True
+    database = Database(output_database)
+    assert database.workflows().storage_stats()['codecs'] == {'zlib': len(rows)}
+    assert _processed_counts(database)['jobdata'] == 143
+    database.close()
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_process_vscode_blobs(logger, mock_requests_get, monkeypatch):
+    output_database = _get_db_path()
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, workflow=['copilot-setup-steps.yml'])
+    assert CommandDownload(logger).run(args) == True
+
+    # The same workflow on another branch.
+    database = Database(output_database)
+    vscode = database.repos().find(database.orgs().find('microsoft').id, 'vscode', 'main')
+    vscode_workflow = database.workflows().find(vscode.id, '.github/workflows/copilot-setup-steps.yml')
+    contents = database.get_full_workflow_from_id(vscode_workflow.id).contents
+    database.execute("INSERT INTO repositories (org_id, name, ref, ref_type, status) VALUES (:org_id, 'vscode', 'release', :ref_type, :status)", {'org_id': vscode.org_id, 'ref_type': vscode.ref_type, 'status': vscode.status})
+    database.execute("INSERT INTO workflows (repo_id, path, type, status) SELECT MAX(id), :path, :type, :status FROM repositories", {'path': vscode_workflow.path, 'type': vscode_workflow.type, 'status': WorkflowStatus.DOWNLOADED})
+    copy_id = database.select("SELECT MAX(id) AS id FROM workflows")[0]['id']
+    database.workflows().update_contents(copy_id, contents, {'jobs': {}})
+    database.commit()
+
+    assert database.workflows().blob_count() == 4
+    assert database.select("SELECT blob_id FROM workflows WHERE id = :id", {'id': copy_id}) == database.select("SELECT blob_id FROM workflows WHERE id = :id", {'id': vscode_workflow.id})
+    stats = database.workflows().storage_stats()
+    assert stats['workflows'] == 5 and stats['blobs'] == 4 and stats['blob_references'] == 5
+    assert stats['contents_original'] == stats['contents_stored'] + len(contents.encode('utf-8'))
+    database.close()
+
+    parsed = []
+    workflow_rows = ServiceProcess._workflow_rows
+    monkeypatch.setattr(ServiceProcess, '_workflow_rows', lambda self, *args: parsed.append(args[0]) or workflow_rows(self, *args))
+    assert CommandProcess(logger).run(_args_process(database=output_database)) == True
+    assert parsed.count(WorkflowType.WORKFLOW) == 1
+
+    # Both copies still have their own rows, so queries joining them to their workflow are unchanged.
+    database = Database(output_database)
+    job_data = "SELECT j.shortname, jd.property, jd.name, jd.value FROM job_data jd JOIN jobs j ON j.id = jd.job_id WHERE j.workflow_id = :id ORDER BY 1, 2, 3, 4"
+    rows = database.select(job_data, {'id': vscode_workflow.id})
+    assert len(rows) > 0
+    assert database.select(job_data, {'id': copy_id}) == rows
+    assert _processed_counts(database)['variables'] > 0
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_process_vscode_incremental(logger, mock_requests_get):
+    output_database = _get_db_path()
+    download_args = _args_download(repo=["microsoft/vscode"], database=output_database, workflow=['copilot-setup-steps.yml'], incremental=True)
+    assert CommandDownload(logger).run(download_args) == True
+    assert CommandProcess(logger).run(_args_process(database=output_database)) == True
+
+    database = Database(output_database)
+    processed = _processed_counts(database)
+    database.close()
+
+    # Nothing moved, only the branch is checked.
+    requests.Session.get.reset_mock()
+    assert CommandDownload(logger).run(download_args) == True
+    urls = [call.args[0] for call in requests.Session.get.call_args_list]
+    assert 'https://api.github.com/repos/microsoft/vscode/git/ref/heads/main' in urls
+    assert not any('raw.githubusercontent.com' in url for url in urls)
+
+    head = 'a' * 40
+    fixtures = requests.Session.get.side_effect
+
+    def _side_effect(url, *args, **kwargs):
+        if url == 'https://api.github.com/repos/microsoft/vscode/git/ref/heads/main':
+            return _json_response({'ref': 'refs/heads/main', 'object': {'sha': head, 'type': 'commit'}})
+        elif url == f"https://api.github.com/repos/microsoft/vscode/compare/84fed05516884c03062782cd45adf04739c4ea04...{head}":
+            return _json_response({
+                'status': 'ahead',
+                'files': [
+                    {'filename': '.github/workflows/copilot-setup-steps.yml', 'status': 'modified'},
+                    # Filtered out by --workflow.
+                    {'filename': '.github/workflows/other.yml', 'status': 'added'},
+                    {'filename': 'src/main.ts', 'status': 'modified'},
+                ]
+            })
+        return fixtures(url, *args, **kwargs)
+
+    requests.Session.get.side_effect = _side_effect
+    requests.Session.get.reset_mock()
+    assert CommandDownload(logger).run(download_args) == True
+
+    # Only the changed workflow was downloaded again.
+    urls = [call.args[0] for call in requests.Session.get.call_args_list]
+    assert [url for url in urls if 'raw.githubusercontent.com' in url] == [
+        'https://raw.githubusercontent.com/microsoft/vscode/refs/heads/main/.github/workflows/copilot-setup-steps.yml'
+    ]
+
+    database = Database(output_database)
+    microsoft = database.orgs().find('microsoft')
+    vscode = database.repos().find(microsoft.id, 'vscode', 'main')
+    assert vscode.ref_commit == head
+    assert database.workflows().count() == 4
+
+    vscode_workflow = database.workflows().find(vscode.id, '.github/workflows/copilot-setup-steps.yml')
+    assert vscode_workflow.status == WorkflowStatus.DOWNLOADED
+    assert len(database.select("SELECT * FROM jobs WHERE workflow_id = :id", {'id': vscode_workflow.id})) == 0
+    actions = [workflow for workflow in database.select("SELECT * FROM workflows WHERE id != :id", {'id': vscode_workflow.id})]
+    assert all(workflow['status'] == WorkflowStatus.PROCESSED for workflow in actions)
+    database.close()
+
+    # Processing again only rebuilds the changed workflow.
+    assert CommandProcess(logger).run(_args_process(database=output_database)) == True
+    database = Database(output_database)
+    assert _processed_counts(database) == processed
+
+
+@pytest.mark.parametrize('mock_requests_get', ['download_vscode'], indirect=True)
+def test_process_vscode_profile(logger, mock_requests_get):
+    profile_path = os.path.join(tempfile.gettempdir(), 'butler-tests-profile.json')
+    output_database = _get_db_path()
+    command = CommandDownload(logger)
+    args = _args_download(repo=["microsoft/vscode"], database=output_database, very_verbose=True, workflow=['copilot-setup-steps.yml'], profile=profile_path)
+    assert command.run(args) == True
+
+    with open(profile_path) as f:
+        report = json.load(f)
+    assert report['command'] == 'download'
+    assert [phase['name'] for phase in report['phases']] == ['collect_targets', 'scan_workflows', 'load_repository_details', 'download_workflows', 'resolve_commits']
+    assert report['total']['api_calls'] == sum(phase['api_calls'] for phase in report['phases']) > 0
+    assert report['total']['sql_queries'] > 0
+
+    command = CommandProcess(logger)
+    args = _args_process(database=output_database, profile=profile_path, profile_cpu=True)
+    assert command.run(args) == True
+
+    with open(profile_path) as f:
+        report = json.load(f)
+    assert report['command'] == 'process'
+    assert [phase['name'] for phase in report['phases']] == ['process_workflows', 'extract_variables', 'populate_variable_value_mappings']
+    assert 'api_calls' not in report['total']
+    for phase in report['phases']:
+        assert phase['sql_queries'] > 0
+        assert phase['wall_seconds'] >= 0 and phase['cpu_seconds'] >= 0
+        assert os.path.isfile(phase['pstats'])
+
+    # Workflows are parsed by the worker threads, which are profiled too.
+    functions = [function for _, _, function in pstats.Stats(report['phases'][0]['pstats']).stats]
+    assert '_parse_workflow' in functions
+    for phase in report['phases']:
+        os.remove(phase['pstats'])
+    os.remove(profile_path)
@@ -31,7 +31,7 @@ def mock_requests_get(request):
             raise ValueError(f"Unmocked URL: {url}")
         return responses[url].response()
 
-    with patch('requests.get', side_effect=_side_effect):
+    with patch('requests.Session.get', side_effect=_side_effect):
         yield
 
 @pytest.fixture
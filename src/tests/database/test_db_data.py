@@ -0,0 +1,43 @@
+from src.database.database import Database
+
+
+def test_db_data_bulk(database: Database) -> None:
+    # Without bulk mode rows are written straight away.
+    database.workflows().set_data(1, 'name', 'Build')
+    assert database.workflows().workflowdata_count() == 1
+
+    database.set_bulk_mode(True)
+    database.workflows().set_data(1, 'env', {'FOO': 'bar', 'TOKEN': '${{ secrets.TOKEN }}'})
+    database.workflows().set_data(1, 'on', ['push', 'pull_request'])
+    database.jobs().set_data(1, 'runs-on', 'ubuntu-latest')
+    assert database.workflows().workflowdata_count() == 1
+    assert database.jobs().jobdata_count() == 0
+
+    assert database.flush_bulk() == 5
+    assert database.workflows().workflowdata_count() == 5
+    assert database.jobs().jobdata_count() == 1
+    assert database.flush_bulk() == 0
+
+    rows = database.workflows().find_next_data(0, 10)
+    assert [(row.property, row.name, row.value) for row in rows] == [
+        ('env', 'FOO', 'bar'),
+        ('env', 'TOKEN', '${{ secrets.TOKEN }}')
+    ]
+
+    # Turning bulk mode off writes anything still pending.
+    database.steps().set_data(1, 'uses', 'actions/checkout@v4')
+    database.set_bulk_mode(False)
+    assert database.steps().stepdata_count() == 1
+
+
+def test_db_data_stream(database: Database) -> None:
+    database.steps().set_data(1, 'run', 'echo ${{ github.ref }}')
+    database.steps().set_data(1, 'uses', 'actions/checkout@v4')
+    database.steps().set_data(1, 'env', {'A': '1', 'B': '${{ vars.B }}'})
+    database.steps().set_data(2, 'with', {'token': '${{ secrets.TOKEN }}'})
+
+    chunks = list(database.steps().stream_data(2))
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert [row.value for chunk in chunks for row in chunk] == [
+        'echo ${{ github.ref }}', '1', '${{ vars.B }}', '${{ secrets.TOKEN }}'
+    ]
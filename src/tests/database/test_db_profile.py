@@ -0,0 +1,24 @@
+import os
+import tempfile
+from src.database.database import Database
+from src.libs.constants import DatabaseProfile
+
+
+def test_db_profile() -> None:
+    db_file = os.path.join(tempfile.gettempdir(), 'tests-profile.db')
+    if os.path.isfile(db_file):
+        os.unlink(db_file)
+
+    database = Database(db_file)
+    assert database.select("PRAGMA journal_mode")[0]['journal_mode'] == 'wal'
+    assert database.select("PRAGMA synchronous")[0]['synchronous'] == 1
+    assert database.select("PRAGMA temp_store")[0]['temp_store'] == 2
+    database.close()
+
+    database = Database(db_file, profile=DatabaseProfile.SAFE)
+    assert database.select("PRAGMA journal_mode")[0]['journal_mode'] == 'delete'
+    assert database.select("PRAGMA synchronous")[0]['synchronous'] == 2
+    assert database.select("PRAGMA cache_size")[0]['cache_size'] == -2000
+    database.close()
+
+    os.remove(db_file)
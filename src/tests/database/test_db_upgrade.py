@@ -0,0 +1,29 @@
+import os
+import tempfile
+from src.database.database import Database
+
+
+def test_db_upgrade() -> None:
+    db_file = os.path.join(tempfile.gettempdir(), 'tests-upgrade.db')
+    if os.path.isfile(db_file):
+        os.unlink(db_file)
+
+    # Turned back into a 2.0.0 database, from before workflow files were kept in blobs.
+    database = Database(db_file)
+    database.execute("INSERT INTO workflows (repo_id, path, contents, data) VALUES (1, 'action.yml', 'name: test', '{\"name\": \"test\"}')")
+    database.execute("DROP INDEX ix_workflows_blob_id")
+    database.execute("ALTER TABLE workflows DROP COLUMN blob_id")
+    database.execute("DROP TABLE blobs")
+    database.execute("UPDATE config SET value = '2.0.0' WHERE name = 'db_version'")
+    database.commit()
+    database.close()
+
+    database = Database(db_file)
+    assert database.config().get('db_version') == Database.__VERSION__
+    assert 'blobs' in database.get_tables()
+    assert database.workflows().blob_count() == 0
+    workflow = database.select("SELECT id, blob_id FROM workflows")[0]
+    assert workflow['blob_id'] == 0
+    database.close()
+
+    os.remove(db_file)
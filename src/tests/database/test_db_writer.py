@@ -0,0 +1,43 @@
+import threading
+from src.database.database import Database
+from src.database.writer import DatabaseWriter
+from src.libs.components.org import OrgComponent
+
+
+def test_db_writer(database: Database, logger) -> None:
+    writer_threads = set()
+
+    def create(name: str) -> None:
+        writer_threads.add(threading.get_ident())
+        database.orgs().create(OrgComponent(name))
+
+    with DatabaseWriter(database, logger, batch_size=3) as writer:
+        for index in range(10):
+            writer.submit(create, f"org-{index}")
+        # Reads run after every write queued before them.
+        assert writer.call(database.orgs().count) == 10
+
+    assert writer_threads and threading.get_ident() not in writer_threads
+    assert writer.stats['writes'] == 10
+    assert writer.stats['reads'] == 1
+    # 3 full batches plus the remaining write when stopping.
+    assert writer.stats['transactions'] == 4
+
+
+def test_db_writer_errors(database: Database, logger) -> None:
+    def fail() -> None:
+        raise ValueError("Failed")
+
+    writer = DatabaseWriter(database, logger).start()
+    writer.submit(fail)
+    try:
+        writer.call(database.orgs().count)
+        assert False
+    except ValueError:
+        assert True
+
+    try:
+        writer.stop()
+        assert False
+    except ValueError:
+        assert True
@@ -1,4 +1,11 @@
+import os
+import json
+import time
 import pytest
+from unittest.mock import patch
+from requests.models import Response
+from src.github.client import GitHubClient
+from src.tests.mock_responses import default
 
 
 @pytest.mark.parametrize('mock_requests_get', ['default'], indirect=True)
@@ -31,3 +38,40 @@ def test_get_org_repos(client, mock_requests_get):
                 no_archive_fork_repos.remove(repo.name)
 
     assert len(no_archive_fork_repos) == 0
+
+
+def _page(names: list[str], headers: dict | None = None) -> Response:
+    repos = [{'full_name': f"microsoft/{name}", 'private': False, 'default_branch': 'main', 'stargazers_count': 0, 'fork': False, 'archived': False} for name in names]
+    response = Response()
+    response.status_code = 200
+    response.headers.update(headers or {})
+    response._content = json.dumps(repos).encode()
+    return response
+
+
+def test_get_org_repos_concurrent_pages(logger):
+    pages_url = 'https://api.github.com/organizations/6154722/repos?per_page=100&sort=full_name&page='
+    first_page_headers = {'Link': f'<{pages_url}2>; rel="next", <{pages_url}6>; rel="last"'}
+    requested = []
+
+    def _side_effect(url, *args, **kwargs):
+        if url.endswith('/rate_limit'):
+            return default()['/rate_limit'].response()
+        elif url.endswith('/users/microsoft'):
+            return default()['/users/microsoft'].response()
+        elif url.endswith('/orgs/microsoft/repos'):
+            return _page(['repo-1'], first_page_headers)
+
+        page = int(url.rsplit('=', 1)[1])
+        requested.append(page)
+        # Earlier pages take longer, so they complete out of order.
+        time.sleep((7 - page) * 0.02)
+        return _page([f"repo-{page}"])
+
+    with patch('requests.Session.get', side_effect=_side_effect):
+        client = GitHubClient([os.getenv('GITHUB_TOKEN', '')], logger, threads=4)
+        names = [repo.name for batch in client.get_org_repos('microsoft', False, False) for repo in batch]
+
+    # Every page was requested once, straight from rel="last", and they're still returned in order.
+    assert sorted(requested) == [2, 3, 4, 5, 6]
+    assert names == ['repo-1', 'repo-2', 'repo-3', 'repo-4', 'repo-5', 'repo-6']
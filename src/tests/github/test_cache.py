@@ -0,0 +1,93 @@
+import os
+import json
+import shutil
+import tempfile
+from unittest.mock import patch
+from requests.models import Response
+from src.github.api import GitHubApi
+from src.github.cache import ResponseCache
+from src.tests.mock_responses import default
+
+
+def _response(status_code: int, body: dict | None = None, headers: dict | None = None) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.url = 'https://api.github.com/orgs/microsoft/repos'
+    response.encoding = 'utf-8'
+    response.headers.update(headers or {})
+    response._content = json.dumps(body).encode() if body is not None else b''
+    return response
+
+
+def test_cache_conditional_requests(logger) -> None:
+    path = os.path.join(tempfile.gettempdir(), 'butler-tests-cache')
+    shutil.rmtree(path, ignore_errors=True)
+    cache = ResponseCache(path, 1024 * 1024)
+    sent_headers = []
+
+    def _side_effect(url, *args, **kwargs):
+        if url.endswith('/rate_limit'):
+            return default()['/rate_limit'].response()
+
+        sent_headers.append(kwargs['headers'])
+        if kwargs['headers'].get('If-None-Match') == '"abc"':
+            return _response(304)
+        return _response(200, [{'name': 'vscode'}], {'ETag': '"abc"', 'Link': '<next>; rel="next"'})
+
+    with patch('requests.Session.get', side_effect=_side_effect):
+        api = GitHubApi([os.getenv('GITHUB_TOKEN', '')], logger, cache=cache)
+
+        headers = {}
+        assert api.get('/orgs/microsoft/repos', {'page': 1}, None, headers) == [{'name': 'vscode'}]
+        assert 'If-None-Match' not in sent_headers[0]
+
+        headers = {}
+        assert api.get('/orgs/microsoft/repos', {'page': 1}, None, headers) == [{'name': 'vscode'}]
+        assert sent_headers[1]['If-None-Match'] == '"abc"'
+        assert headers['Link'] == '<next>; rel="next"'
+
+        # Different parameters are a different entry.
+        api.get('/orgs/microsoft/repos', {'page': 2})
+        assert 'If-None-Match' not in sent_headers[2]
+
+    assert cache.stats['hits'] == 1
+    assert cache.stats['stored'] == 2
+
+    # Entries survive restarts.
+    assert ResponseCache(path, 1024 * 1024).size == cache.size
+    shutil.rmtree(path)
+
+
+def test_cache_eviction() -> None:
+    path = os.path.join(tempfile.gettempdir(), 'butler-tests-cache')
+    shutil.rmtree(path, ignore_errors=True)
+    cache = ResponseCache(path, 1000)
+
+    body = {'data': 'x' * 300}
+    for index in range(5):
+        cache.store(f"key-{index}", _response(200, body, {'ETag': f'"{index}"'}))
+
+    assert cache.size <= 1000
+    assert cache.stats['evicted'] > 0
+    # Oldest entries are removed first.
+    assert cache.load('key-0') is None
+    assert cache.load('key-4') is not None
+    shutil.rmtree(path)
+
+
+def test_cache_eviction_keeps_used_entries() -> None:
+    path = os.path.join(tempfile.gettempdir(), 'butler-tests-cache')
+    shutil.rmtree(path, ignore_errors=True)
+    cache = ResponseCache(path, 1000)
+
+    body = {'data': 'x' * 300}
+    for index in range(2):
+        cache.store(f"key-{index}", _response(200, body, {'ETag': f'"{index}"'}))
+    # Serving key-0 makes key-1 the least recently used.
+    cache.hit('key-0', cache.load('key-0'))
+    cache.store('key-2', _response(200, body, {'ETag': '"2"'}))
+
+    assert cache.load('key-0') is not None
+    assert cache.load('key-1') is None
+    assert cache.load('key-2') is not None
+    shutil.rmtree(path)
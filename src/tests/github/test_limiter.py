@@ -0,0 +1,70 @@
+import json
+import time
+from unittest.mock import patch
+from requests.models import Response
+from src.github.api import GitHubApi
+from src.github.limiter import ConcurrencyLimiter
+
+
+def _response(status_code: int, body: dict, headers: dict | None = None) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode()
+    response.headers.update(headers or {})
+    return response
+
+
+def test_limiter_aimd():
+    limiter = ConcurrencyLimiter(8)
+    assert limiter.concurrency == 8
+
+    limiter.throttle(0)
+    limiter.throttle(0)
+    assert limiter.concurrency == 2
+
+    # Additive increase, about one more request per round of healthy responses.
+    for _ in range(3):
+        limiter.success()
+    assert limiter.concurrency == 3
+    for _ in range(100):
+        limiter.success()
+    assert limiter.concurrency == 8
+
+    for _ in range(10):
+        limiter.throttle(0)
+    assert limiter.concurrency == 1
+    assert limiter.stats['throttle_events'] == 12
+
+    for attempt in range(10):
+        assert 0.5 * min(60 * 2 ** attempt, 900) <= limiter.backoff(attempt) <= min(60 * 2 ** attempt, 900)
+
+
+def test_limiter_retry_after(logger):
+    reset = int(time.time()) + 3600
+    responses = [
+        _response(429, {'message': 'Too Many Requests'}, {'Retry-After': '1'}),
+        _response(403, {'message': 'You have exceeded a secondary rate limit'}),
+        _response(200, {'name': 'vscode'})
+    ]
+    calls = []
+
+    def _side_effect(url, *args, **kwargs):
+        if url.endswith('/rate_limit'):
+            return _response(200, {'resources': {'core': {'remaining': 5000, 'reset': reset}}})
+        calls.append(time.monotonic())
+        return responses.pop(0)
+
+    with patch('requests.Session.get', side_effect=_side_effect):
+        api = GitHubApi(['ghp_test'], logger, threads=4)
+        api.limiter.backoff_base = 0.1
+
+        assert api.get('/repos/microsoft/vscode') == {'name': 'vscode'}
+
+    # Retried in place, after honouring the Retry-After of the first response.
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 1
+    stats = api.limiter.stats
+    assert stats['throttle_events'] == 2
+    # Halved twice, then the healthy response started bringing it back.
+    assert stats['concurrency'] == 2
+    assert stats['in_flight'] == 0
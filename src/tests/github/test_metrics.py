@@ -0,0 +1,36 @@
+from src.github.metrics import ApiMetrics
+
+
+def test_metrics_templates():
+    assert ApiMetrics.template('/users/microsoft') == '/users/{account}'
+    assert ApiMetrics.template('/orgs/microsoft/repos') == '/orgs/{account}/repos'
+    assert ApiMetrics.template('https://api.github.com/orgs/microsoft/repos?page=2') == '/orgs/{account}/repos'
+    assert ApiMetrics.template('/repos/microsoft/vscode') == '/repos/{owner}/{repo}'
+    assert ApiMetrics.template('/repos/microsoft/vscode/contents/.github/workflows') == '/repos/{owner}/{repo}/contents/{path}'
+    assert ApiMetrics.template('/repos/actions/checkout/git/ref/tags/v5') == '/repos/{owner}/{repo}/git/ref/{ref}'
+    assert ApiMetrics.template('/repos/microsoft/vscode/commits/84fed05/branches-where-head') == '/repos/{owner}/{repo}/commits/{ref}/branches-where-head'
+    assert ApiMetrics.template('/repos/microsoft/vscode/compare/abc...def') == '/repos/{owner}/{repo}/compare/{ref}'
+    assert ApiMetrics.template('/repos/microsoft/vscode/branches') == '/repos/{owner}/{repo}/branches'
+    assert ApiMetrics.template('https://raw.githubusercontent.com/microsoft/vscode/refs/heads/main/action.yml') == 'raw.githubusercontent.com/{path}'
+
+
+def test_metrics_summary():
+    metrics = ApiMetrics()
+    metrics.sample_size = 10
+    for index in range(100):
+        metrics.record('/repos/microsoft/vscode', 200, 10, index / 100)
+    metrics.record('/repos/microsoft/missing', 404, 5, 0.5)
+    metrics.record_retry('/repos/microsoft/vscode', 30)
+
+    endpoint = metrics.summary()['endpoints']['/repos/{owner}/{repo}']
+    assert endpoint['requests'] == 101
+    assert endpoint['statuses'] == {'200': 100, '404': 1}
+    assert endpoint['bytes'] == 1005
+    assert endpoint['retries'] == 1
+    assert endpoint['throttle_wait_seconds'] == 30
+    # Percentiles come from the sample, which stays within its size.
+    assert 0 <= endpoint['latency']['p50'] <= endpoint['latency']['p99'] <= endpoint['latency']['max'] <= 0.99
+
+    prometheus = metrics.prometheus()
+    assert 'github_api_request_duration_seconds_bucket{endpoint="/repos/{owner}/{repo}",le="0.05"} 6' in prometheus
+    assert 'github_api_request_duration_seconds_bucket{endpoint="/repos/{owner}/{repo}",le="+Inf"} 101' in prometheus
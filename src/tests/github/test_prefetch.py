@@ -0,0 +1,42 @@
+from unittest.mock import patch
+from src.github.client import GitHubClient
+from src.github.exceptions import ErrorDownloadingFile
+from src.libs.components.repo import RepoComponent
+from src.libs.components.workflow import WorkflowComponent
+
+
+def test_release_prefetched_keeps_used_actions(logger) -> None:
+    client = GitHubClient(['ghp_test'], logger)
+    repo = RepoComponent('microsoft/vscode@main')
+    key = client._prefetch_key(repo)
+    client._prefetched_files = {
+        (key, '.github/workflows/build.yml'): 'jobs:\n  build:\n    steps:\n      - uses: ./.github/actions/setup\n',
+        (key, '.github/workflows/other.yml'): 'jobs:\n  other:\n    steps:\n      - uses: ./.github/actions/other\n',
+        (key, '.github/actions/setup/action.yml'): "runs:\n  steps:\n    - uses: './build/node'\n",
+        (key, 'build/node/action.yaml'): 'runs:\n  using: node20\n',
+        (key, '.github/actions/other/action.yml'): 'name: Other',
+        (key, 'extensions/unused/action.yml'): 'name: Unused',
+        ('microsoft/vscode@release', 'extensions/unused/action.yml'): 'name: Unused',
+    }
+
+    client.release_prefetched(repo, ['.github/workflows/build.yml'])
+    assert sorted(client._prefetched_files) == [
+        (key, '.github/actions/setup/action.yml'),
+        (key, '.github/workflows/build.yml'),
+        (key, 'build/node/action.yaml'),
+        ('microsoft/vscode@release', 'extensions/unused/action.yml'),
+    ]
+
+    client.clear_prefetched()
+    assert client._prefetched_files == {}
+
+
+def test_download_action_skips_files_missing_from_archive(logger) -> None:
+    client = GitHubClient(['ghp_test'], logger)
+    workflow = WorkflowComponent('microsoft/vscode/.github/actions/setup@main')
+    client._prefetched_actions = {client._prefetch_key(workflow.repo): {'.github/actions/other/action.yml'}}
+
+    with patch.object(client, '_download', side_effect=ErrorDownloadingFile('Not found')) as download:
+        assert client.download_action(workflow) is None
+    # Only the Dockerfile, the archive would have had either action file.
+    assert [call.args[1] for call in download.call_args_list] == ['.github/actions/setup/Dockerfile']
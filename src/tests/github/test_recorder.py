@@ -0,0 +1,51 @@
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import concurrent.futures
+from requests.models import Response
+from src.github.recorder import ApiRecorder
+from src.tests.scripts.mock_response_from_log import convert
+
+
+def _response(status_code: int, body: str) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.encoding = 'utf-8'
+    response._content = body.encode()
+    response.headers['Content-Type'] = 'application/json'
+    return response
+
+
+def test_recorder_threads_and_sampling():
+    path = os.path.join(tempfile.gettempdir(), 'butler-tests-recorder.jsonl.gz')
+    if os.path.isfile(path):
+        os.remove(path)
+
+    recorder = ApiRecorder.open(path, sample_bodies=0)
+    assert ApiRecorder.open(path) is recorder
+
+    def _record(index: int) -> None:
+        status_code = 404 if index % 10 == 0 else 200
+        recorder.record(f"/repos/org/repo-{index}", {'ref': 'main'}, None, True, _response(status_code, json.dumps({'index': index})))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(_record, range(500)))
+    recorder.close()
+
+    with gzip.open(path, 'rt') as f:
+        rows = [json.loads(line) for line in f]
+    assert len(rows) == recorder.stats['written'] == 500
+    assert sorted(row['request_url'] for row in rows) == sorted(f"/repos/org/repo-{index}" for index in range(500))
+    # Only the errors kept their body.
+    assert all((row['response_body'] is not None) == (row['response_status'] == 404) for row in rows)
+
+    # The log turns into mock responses, leaving out the rows without a body.
+    assets = tempfile.mkdtemp(prefix='butler-tests-assets-')
+    os.makedirs(os.path.join(assets, 'recorded'))
+    lines = convert(path, 'recorded', assets).split(",\n")
+    assert len(lines) == 50
+    assert lines[0].startswith("'/repos/org/repo-") and ", 404, is_json_contents=True)" in lines[0]
+    os.remove(path)
+    shutil.rmtree(assets)
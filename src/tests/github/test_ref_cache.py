@@ -0,0 +1,55 @@
+import os
+import time
+import tempfile
+from unittest.mock import patch
+from src.github.ref_cache import RefCache
+from src.libs.components.repo import RepoComponent
+from src.libs.constants import GitHubRefType, RepoVisibility
+
+
+def test_ref_cache_commit_outlives_repo() -> None:
+    sha = '08c6903cd8c0fde910a37f88322edcfb5dd907a8'
+    cache = RefCache(60)
+
+    repo = RepoComponent(f"actions/checkout@{sha}")
+    repo.default_branch = 'main'
+    repo.visibility = RepoVisibility.PUBLIC
+    repo.stars = 10
+    repo.ref_type = GitHubRefType.COMMIT
+    repo.ref_commit = sha
+    cache.store_repo(repo)
+    cache.store_ref(repo, sha)
+
+    cached = RepoComponent(f"actions/checkout@{sha}")
+    assert cache.load_repo(cached) and cache.load_ref(cached)
+    assert cached.stars == 10 and cached.ref_commit == sha
+
+    # The repository may have been archived or made private since, only the commit is still known.
+    with patch.object(time, 'time', return_value=time.time() + 120):
+        cached = RepoComponent(f"actions/checkout@{sha}")
+        assert cache.load_repo(cached) is False
+        assert cache.load_ref(cached) is True
+        assert cached.ref_type == GitHubRefType.COMMIT and cached.ref_commit == sha
+
+
+def test_ref_cache_keeps_recently_used_commits() -> None:
+    path = os.path.join(tempfile.gettempdir(), 'butler-tests-ref-cache.json')
+    cache = RefCache(60, path)
+    cache.max_commits = 2
+
+    repos = []
+    for index in range(3):
+        sha = f"{index}" * 40
+        repo = RepoComponent(f"actions/checkout@{sha}")
+        repo.ref_type = GitHubRefType.COMMIT
+        repo.resolved_ref_type = GitHubRefType.COMMIT
+        repo.ref_commit = sha
+        cache.store_ref(repo, sha)
+        repos.append(repo)
+    # Using the first one makes the second the least recently used.
+    assert cache.load_ref(RepoComponent(f"actions/checkout@{repos[0].ref}"))
+    cache.save()
+
+    saved = RefCache(60, path)
+    assert [saved.load_ref(RepoComponent(f"actions/checkout@{repo.ref}")) for repo in repos] == [True, False, True]
+    os.remove(path)
@@ -0,0 +1,19 @@
+from src.github.session import HttpSession
+
+
+def test_session_is_shared_and_grows():
+    HttpSession.close()
+    session = HttpSession.session()
+    assert HttpSession.session() is session
+
+    # Smaller or equal pools keep the existing session.
+    HttpSession.configure(1)
+    assert HttpSession.session() is session
+
+    # Larger pools are mounted on the same session, clients holding it keep working.
+    adapter = session.get_adapter('https://api.github.com')
+    HttpSession.configure(HttpSession._pool_size + 5)
+    assert HttpSession.session() is session
+    assert session.get_adapter('https://api.github.com') is not adapter
+    assert session.get_adapter('https://api.github.com')._pool_maxsize == HttpSession._pool_size
+    HttpSession.close()
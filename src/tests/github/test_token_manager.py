@@ -0,0 +1,110 @@
+import json
+import time
+import concurrent.futures
+from unittest.mock import patch
+from requests.models import Response
+from src.github.token_manager import TokenManager
+
+
+def _rate_limit(remaining: int, reset: int) -> Response:
+    response = Response()
+    response.status_code = 200
+    response._content = json.dumps({'resources': {'core': {'remaining': remaining, 'reset': reset}}}).encode()
+    return response
+
+
+def _headers(remaining: int, reset: int) -> dict:
+    return {'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset': str(reset), 'X-RateLimit-Resource': 'core'}
+
+
+def test_token_manager_most_remaining(logger):
+    reset = int(time.time()) + 3600
+    budgets = {'token ghp_first': 100, 'token ghp_second': 50}
+    calls = []
+
+    def _side_effect(url, *args, **kwargs):
+        calls.append(url)
+        return _rate_limit(budgets[kwargs['headers']['Authorization']], reset)
+
+    with patch('requests.Session.get', side_effect=_side_effect):
+        manager = TokenManager(['ghp_first', 'ghp_second'], logger)
+        first = manager.instance()
+        assert first.access_token == 'ghp_first'
+
+        # The responses say the first token is nearly used up.
+        manager.update(first, _headers(10, reset))
+        second = manager.instance()
+        assert second.access_token == 'ghp_second'
+        assert second.remaining_calls == 49
+
+        # A late response from before the last request doesn't give calls back.
+        manager.update(second, _headers(60, reset))
+        assert second.remaining_calls == 49
+
+        # Other limits are tracked separately by GitHub.
+        manager.update(second, {**_headers(5000, reset), 'X-RateLimit-Resource': 'graphql'})
+        assert second.remaining_calls == 49
+
+        # The second token is used until both have the same budget, then they take turns.
+        used = [manager.instance().access_token for _ in range(45)]
+        assert used[:39] == ['ghp_second'] * 39
+        assert used[39:].count('ghp_first') == 3
+        assert (first.remaining_calls, second.remaining_calls) == (7, 7)
+
+    # Only the initial check, everything else came from response headers.
+    assert len(calls) == 2
+
+
+def test_token_manager_waits_for_reset(logger):
+    reset = int(time.time()) + 1
+    refreshed = {'count': 0}
+
+    def _side_effect(url, *args, **kwargs):
+        refreshed['count'] += 1
+        if refreshed['count'] <= 2:
+            return _rate_limit(100, reset)
+        return _rate_limit(5000, reset + 3600)
+
+    with patch('requests.Session.get', side_effect=_side_effect):
+        manager = TokenManager(['ghp_first', 'ghp_second'], logger)
+        token = manager.instance()
+        manager.update(token, _headers(0, reset))
+        token = manager.instance()
+        manager.update(token, _headers(0, reset))
+
+        assert not manager.has_valid_token()
+        assert 0 < manager.seconds_until_reset() <= 1
+
+        started = time.time()
+        token = manager.instance()
+        assert time.time() >= reset
+        assert time.time() - started < 3
+        assert token.remaining_calls == 4999
+
+
+def test_token_manager_exhausted_in_flight(logger):
+    reset = int(time.time()) + 1
+    refreshed = {'count': 0}
+
+    def _side_effect(url, *args, **kwargs):
+        refreshed['count'] += 1
+        if refreshed['count'] == 1:
+            return _rate_limit(2, reset)
+        return _rate_limit(5000, reset + 3600)
+
+    with patch('requests.Session.get', side_effect=_side_effect):
+        manager = TokenManager(['ghp_first'], logger)
+        # Both calls are taken by requests whose responses haven't arrived yet.
+        started = time.time()
+        threads = concurrent.futures.ThreadPoolExecutor(3)
+        tokens = list(threads.map(lambda _: manager.instance(), range(2)))
+        assert all(token.access_token == 'ghp_first' for token in tokens)
+        assert tokens[0].remaining_calls == 0
+        assert not manager.has_valid_token()
+
+        # The next request waits for the reset instead of being sent with no calls left.
+        token = threads.submit(manager.instance).result()
+        threads.shutdown()
+        assert time.time() >= reset
+        assert time.time() - started < 3
+        assert token.remaining_calls == 4999
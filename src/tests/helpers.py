@@ -11,6 +11,7 @@ def _args_download(**overrides) -> argparse.Namespace:
         'token': [],
         'db_debug': False,
         'db_debug_auto_commit': False,
+        'db_profile': 'fast',
 
         # Per Command
         'repo': [],
@@ -23,6 +24,21 @@ def _args_download(**overrides) -> argparse.Namespace:
         'include_archived': False,
         'all_repos': False,
         'threads': 1,
+        'engine': 'threads',
+        'http_cache': '',
+        'http_cache_size': 512,
+        'blob_store': '',
+        'blob_store_size': 1024,
+        'ref_cache': '',
+        'ref_cache_ttl': 3600,
+        'graphql': False,
+        'archive': 'auto',
+        'archive_max_size': 100,
+        'data_format': 'json-zlib',
+        'compress': 'none',
+        'incremental': False,
+        'api_metrics': '',
+        'api_metrics_prometheus': '',
     }
 
     data = {**defaults, **overrides}
@@ -36,10 +52,34 @@ def _args_process(**overrides) -> argparse.Namespace:
         'token': [],
         'db_debug': False,
         'db_debug_auto_commit': False,
+        'db_profile': 'fast',
 
         # Per Command
         'database': 'database.db',
         'threads': 1,
+        'engine': 'threads',
+    }
+
+    data = {**defaults, **overrides}
+    return argparse.Namespace(**data)
+
+def _args_database(**overrides) -> argparse.Namespace:
+    defaults = {
+        # Shared
+        'verbose': False,
+        'very_verbose': False,
+        'token': [],
+        'db_debug': False,
+        'db_debug_auto_commit': False,
+        'db_profile': 'fast',
+
+        # Per Command
+        'database': 'database.db',
+        'purge': False,
+        'reprocess': False,
+        'list_orgs': False,
+        'compress': None,
+        'data_format': None,
     }
 
     data = {**defaults, **overrides}
@@ -0,0 +1,50 @@
+import threading
+from src.libs.async_engine import AsyncEngine
+
+
+class _Item:
+    def __init__(self, id: int):
+        self.id = id
+
+
+def test_async_engine_consumes_everything(logger):
+    pending = {index: _Item(index) for index in range(1, 21)}
+    consumed = []
+    consumer_threads = set()
+    commits = []
+
+    def producer(count: int) -> list:
+        return [pending[key] for key in sorted(pending.keys())][:count]
+
+    def worker(item: _Item) -> int:
+        return item.id * 2
+
+    def consumer(item: _Item, result: int) -> None:
+        consumer_threads.add(threading.get_ident())
+        assert result == item.id * 2
+        consumed.append(item.id)
+        del pending[item.id]
+        # Consumers can queue more work, like child workflows during downloads.
+        if item.id == 5:
+            pending[100] = _Item(100)
+
+    engine = AsyncEngine(4, logger)
+    engine.commit_every = 5
+    assert engine.run(producer, worker, consumer, lambda: commits.append(True)) == 21
+
+    assert sorted(consumed) == list(range(1, 21)) + [100]
+    assert len(pending) == 0
+    # Writes all happen on the event loop thread.
+    assert consumer_threads == {threading.get_ident()}
+    assert len(commits) == 5
+
+
+def test_async_engine_raises_worker_errors(logger):
+    def worker(item: _Item) -> None:
+        raise ValueError(f"Failed {item.id}")
+
+    try:
+        AsyncEngine(2, logger).run(lambda count: [_Item(1)], worker, lambda item, result: None)
+        assert False
+    except ValueError:
+        assert True
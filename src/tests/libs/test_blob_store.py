@@ -0,0 +1,24 @@
+import os
+import shutil
+import tempfile
+from src.libs.blob_store import BlobStore
+
+
+def test_blob_store() -> None:
+    path = os.path.join(tempfile.gettempdir(), 'butler-tests-blob-store')
+    shutil.rmtree(path, ignore_errors=True)
+
+    store = BlobStore(path, 1000)
+    assert store.get('actions', 'checkout', 'abc123', 'action.yml') is None
+    store.put('actions', 'checkout', 'abc123', 'action.yml', 'name: Checkout')
+    assert store.get('Actions', 'Checkout', 'ABC123', '/action.yml') == 'name: Checkout'
+    assert store.get('actions', 'checkout', 'def456', 'action.yml') is None
+    assert store.stats['hits'] == 1 and store.stats['misses'] == 2
+
+    # Least recently used blobs are evicted once over the limit, and the index is rebuilt from disk.
+    for index in range(5):
+        store.put('org', 'repo', 'abc123', f"file-{index}.yml", 'x' * 300)
+    assert store.size <= 1000
+    assert store.get('actions', 'checkout', 'abc123', 'action.yml') is None
+    assert BlobStore(path, 1000).size == store.size
+    shutil.rmtree(path)
@@ -0,0 +1,21 @@
+import pytest
+from src.libs.compressor import Compressor
+
+
+def test_compressor_codecs():
+    text = "name: Build\non: [push]\njobs:\n  build:\n    runs-on: ubuntu-latest\n    steps:\n      - run: echo ✓\n" * 20
+
+    assert Compressor.compress(text, Compressor.NONE) == text
+    assert Compressor.decompress(text) == text
+    assert Compressor.compress('', Compressor.ZLIB) == ''
+    assert Compressor.decompress(None) is None
+
+    for codec in Compressor.codecs()[1:]:
+        value = Compressor.compress(text, codec)
+        assert isinstance(value, bytes) and len(value) < len(text)
+        assert Compressor.codec_of(value) == codec
+        assert Compressor.original_size(value) == len(text.encode('utf-8'))
+        assert Compressor.decompress(value) == text
+
+    with pytest.raises(ValueError):
+        Compressor.compress(text, 'lz4')
@@ -0,0 +1,23 @@
+import json
+from src.libs.serializer import DataSerializer
+
+
+def test_serializer_formats():
+    data = {'on': {'push': {'branches': ['main']}}, 'jobs': {'build': {'runs-on': 'ubuntu-latest', 'steps': [{'run': 'make'}]}}}
+
+    # Plain JSON stays text, so databases written before the formats existed are read unchanged.
+    assert DataSerializer.dumps(data, DataSerializer.JSON) == json.dumps(data)
+    assert DataSerializer.loads(json.dumps(data)) == data
+    assert DataSerializer.format_of(json.dumps(data)) == DataSerializer.JSON
+
+    for format in DataSerializer.formats():
+        value = DataSerializer.dumps(data, format)
+        assert DataSerializer.format_of(value) == format
+        assert DataSerializer.loads(value) == data
+
+    value = DataSerializer.dumps(data, DataSerializer.JSON_ZLIB)
+    assert isinstance(value, bytes) and len(value) < len(json.dumps(data))
+
+    assert DataSerializer.loads(None, {}) == {}
+    assert DataSerializer.loads(b'\xffjunk', {}) == {}
+    assert DataSerializer.loads('{"broken"', None) is None
@@ -0,0 +1,18 @@
+import yaml
+from src.libs.utils import Utils
+
+
+def test_load_yaml_text():
+    data = Utils.load_yaml("on:\n  push:\n    branches: [main]\nenv:\n  ENABLED: yes\n  DEBUG: false\n  SINCE: 2024-01-01\n  COUNT: 3\n")
+    assert data == {'on': {'push': {'branches': ['main']}}, 'env': {'ENABLED': 'yes', 'DEBUG': 'false', 'SINCE': '2024-01-01', 'COUNT': 3}}
+
+    # Only load_yaml keeps them as text, other loaders are left alone.
+    assert Utils.load_yaml("enabled: true", treat_as_text=False) == {'enabled': True}
+    assert yaml.safe_load("on: true") == {True: True}
+
+    debug = {}
+    assert Utils.load_yaml("jobs: [", debug=debug) is None
+    assert 'error' in debug
+
+    # Python objects are never constructed.
+    assert Utils.load_yaml("value: !!python/object/apply:os.getcwd []") is None
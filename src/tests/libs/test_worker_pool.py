@@ -0,0 +1,48 @@
+import threading
+import time
+from src.libs.worker_pool import WorkerPool
+
+
+class _Item:
+    def __init__(self, id: int):
+        self.id = id
+
+
+def test_worker_pool_streams_past_slow_items(logger):
+    pending = {index: _Item(index) for index in range(1, 31)}
+    consumed = []
+    consumer_threads = set()
+
+    def producer(count: int) -> list:
+        return [pending[key] for key in sorted(pending.keys())][:count]
+
+    def worker(item: _Item) -> int:
+        # The first item is slow, everything else should carry on around it.
+        time.sleep(0.5 if item.id == 1 else 0.01)
+        return item.id
+
+    def consumer(item: _Item, result: int) -> None:
+        consumer_threads.add(threading.get_ident())
+        consumed.append(result)
+        del pending[item.id]
+
+    assert WorkerPool(4, logger).run(producer, worker, consumer) == 30
+    assert sorted(consumed) == list(range(1, 31))
+    assert consumed[-1] == 1
+    assert consumer_threads == {threading.get_ident()}
+
+
+def test_worker_pool_iterable_and_errors(logger):
+    results = []
+    assert WorkerPool(3, logger).run(range(10), lambda item: item * item, lambda item, result: results.append(result), key=lambda item: item) == 10
+    assert sorted(results) == [item * item for item in range(10)]
+
+    def worker(item: int) -> None:
+        if item == 5:
+            raise ValueError("Failed")
+
+    try:
+        WorkerPool(3, logger).run(range(10), worker, lambda item, result: None, key=lambda item: item)
+        assert False
+    except ValueError:
+        assert True
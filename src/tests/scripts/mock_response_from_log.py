@@ -1,31 +1,51 @@
 import os
 import sys
 import csv
+import gzip
+import json
 import hashlib
+from collections.abc import Iterator
 from src.libs.utils import Utils
 
 
+def read_log(http_log: str) -> Iterator[dict]:
+    # Logs are gzipped JSON lines, older ones were CSV files.
+    if not http_log.endswith('.csv'):
+        with gzip.open(http_log, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    row['response_headers'] = json.dumps(row['response_headers'])
+                    yield row
+        return
+
+    with open(http_log, 'r') as f:
+        yield from csv.DictReader(f)
+
+
 def convert(http_log: str, asset_parent_folder: str, asset_path: str) -> str:
     lines = []
-    with open(http_log, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            filename = hashlib.md5(row['request_url'].encode()).hexdigest()
-            headers_file = f"{asset_parent_folder}/{filename}.headers.json"
-            contents_file = f"{asset_parent_folder}/{filename}.contents.json"
+    for row in read_log(http_log):
+        if row['response_body'] is None:
+            print(f"Skipping {row['request_url']}, its body was not sampled", file=sys.stderr)
+            continue
+
+        filename = hashlib.md5(row['request_url'].encode()).hexdigest()
+        headers_file = f"{asset_parent_folder}/{filename}.headers.json"
+        contents_file = f"{asset_parent_folder}/{filename}.contents.json"
 
-            if not Utils.write_file(os.path.join(asset_path, headers_file), row['response_headers']):
-                print(f"Could not write {os.path.join(asset_path, headers_file)}")
-                exit(1)
-            if not Utils.write_file(os.path.join(asset_path, contents_file), row['response_body']):
-                print(f"Could not write {os.path.join(asset_path, contents_file)}")
-                exit(1)
+        if not Utils.write_file(os.path.join(asset_path, headers_file), row['response_headers']):
+            print(f"Could not write {os.path.join(asset_path, headers_file)}")
+            exit(1)
+        if not Utils.write_file(os.path.join(asset_path, contents_file), row['response_body']):
+            print(f"Could not write {os.path.join(asset_path, contents_file)}")
+            exit(1)
 
-            is_json = 'True' if (row['response_body'].startswith('{') or row['response_body'].startswith('[')) else 'False'
+        is_json = 'True' if (row['response_body'].startswith('{') or row['response_body'].startswith('[')) else 'False'
 
-            line = f"'{row['request_url']}': MockResponse('{contents_file}', '{headers_file}', {row['response_status']}, is_json_contents={is_json})"
+        line = f"'{row['request_url']}': MockResponse('{contents_file}', '{headers_file}', {row['response_status']}, is_json_contents={is_json})"
 
-            lines.append(line)
+        lines.append(line)
 
     return ",\n".join(lines)
 